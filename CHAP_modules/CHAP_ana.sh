@@ -1560,7 +1560,7 @@ AnalysisList
 			if (( $count_data_in == 0 )) ; then
 				echo -e "auto mode,$automode\nplot type,${plot_type}" > CHAP_kde_dataset_list.dat
 				if [[ "$bin_number_range" != '' ]] ; then
-					echo -e "bin_number_range,${bin_number_range}" >> CHAP_kde_dataset_list.dat
+					echo -e "bin_number_range,${bin_number_range},${kde_opt_mode},${kde_opt_topk}" >> CHAP_kde_dataset_list.dat
 				fi
 				echo -e "\nData for ${filenm}" >> CHAP_kde_dataset_list.dat
 				count_data_in=$(( count_data_in + 1 ))				
@@ -1689,11 +1689,11 @@ askDataExist
 		# echo -e "\nauto mode,$automode" >> CHAP_kde_dataset_list.dat
 
 		if [[ "$bin_number_range" != '' ]] ; then
-			python3 ${CHAPERONg_PATH}/CHAP_utilities/CHAP_generate_kde_hist_optimize.py || \
-			python ${CHAPERONg_PATH}/CHAP_utilities/CHAP_generate_kde_hist_optimize.py			
+			python3 ${CHAPERONg_PATH}/CHAP_utilities/CHAP_generate_kde_hist_optimize.py -nw "$nt" || \
+			python ${CHAPERONg_PATH}/CHAP_utilities/CHAP_generate_kde_hist_optimize.py -nw "$nt"			
 		elif [[ "$bin_number_range" == '' ]] ; then
-			python3 ${CHAPERONg_PATH}/CHAP_utilities/CHAP_generate_kde.py || \
-			python ${CHAPERONg_PATH}/CHAP_utilities/CHAP_generate_kde.py
+			python3 ${CHAPERONg_PATH}/CHAP_utilities/CHAP_generate_kde.py -nw "$nt" --parallel || \
+			python ${CHAPERONg_PATH}/CHAP_utilities/CHAP_generate_kde.py -nw "$nt" --parallel
 		fi
 
 	elif [[ "$plot_number" == 2 ]] ; then plot_type="multi-data plot"
@@ -1829,8 +1829,8 @@ askDataExist
 				read -p $'\n Enter a response here (yes/no): ' more_data_prompt
 			done
 
-			python3 ${CHAPERONg_PATH}/CHAP_utilities/CHAP_generate_kde.py || \
-			python ${CHAPERONg_PATH}/CHAP_utilities/CHAP_generate_kde.py
+			python3 ${CHAPERONg_PATH}/CHAP_utilities/CHAP_generate_kde.py -nw "$nt" || \
+			python ${CHAPERONg_PATH}/CHAP_utilities/CHAP_generate_kde.py -nw "$nt"
 		done
 
 	fi
@@ -3145,40 +3145,14 @@ extractMoreStructs
 
 				echo "${demA}"$' Collecting approximate simulation entries for mapped data points...\n'
 				sleep 2
-				echo $' Sorting and pre-processing FES data points...\n'
-				cd ./collect_mappings_extra
-				dataRec_counter=0
-				for dataRec in DataPt_*.txt
-				do
-					dataRec_counter=$(( dataRec_counter + 1 ))
-					if (( "$dataRec_counter" == 1 )) ; then
-						tail -n +2 "${dataRec}" | sort -k2,2n -k3,3n > sorted_"${dataRec}"
-						mapped_fes_Data=$(head -n 2 "${dataRec}" | tail -n 1)
-						echo "$dataRec"$'\t'"$mapped_fes_Data" > mapped_dataPt.txt
-						rm "${dataRec}"
-					elif (( "$dataRec_counter" > 1 )) ; then
-						tail -n +2 "${dataRec}" | sort -k2,2n -k3,3n >> sorted_"${dataRec}"
-						mapped_fes_Data=$(head -n 2 "${dataRec}" | tail -n 1)
-						echo "$dataRec"$'\t'"$mapped_fes_Data" >> mapped_dataPt.txt
-						rm "${dataRec}"
-					fi
-				done
-				cd ../
 				echo $' Generating approximated simulation times mapped with free energy...\n'
 				python3 ${CHAPERONg_PATH}/CHAP_utilities/CHAP_approx_dataPoint_simTime_for_freeEn.py || \
 				python ${CHAPERONg_PATH}/CHAP_utilities/CHAP_approx_dataPoint_simTime_for_freeEn.py
 
-				(head -n 1 ./collect_mappings_extra/mappedFESdataPoints_timed.dat && tail -n +2 \
-				./collect_mappings_extra/mappedFESdataPoints_timed.dat | sort -k1,1n -k4,4n) > \
-				./collect_mappings_extra/time-sorted_mappedFESdataPoints_timed.dat
-				
-				(head -n 1 ./collect_mappings_extra/mappedFESdataPoints_timed.dat && tail -n +2 \
-				./collect_mappings_extra/mappedFESdataPoints_timed.dat | sort -k4,4n -k2,2n) > \
-				./collect_mappings_extra/energy-sorted_mappedFESdataPoints_timed.dat
-				
 				mv ./collect_mappings_extra/mappedFESdataPoints_timed.dat ./"$results_folder"/collect_mappings/
 				mv ./collect_mappings_extra/time-sorted_mappedFESdataPoints_timed.dat ./"$results_folder"/collect_mappings/
 				mv ./collect_mappings_extra/energy-sorted_mappedFESdataPoints_timed.dat ./"$results_folder"/collect_mappings/
+				mv ./collect_mappings_extra/mapped_FES_frames.npz ./"$results_folder"/collect_mappings/
 				rm -r ./collect_mappings_extra SimTime_OrderParameters1_2.dat OrderParameters1_2_dG_nogap-sorted.dat
 
 				echo $'\n Collect approximate simulation entries for mapped data points...DONE\n'"${demB}"
@@ -3187,6 +3161,8 @@ extractMoreStructs
 				$'\n (sorted by time or energy) all containing the mapped simulation time, order'\
 				$'\n parameters and the corresponding free energy have been generated and saved'\
 				$'\n into the folder '"$results_folder""/collect_mappings."\
+				$'\n\n The mapping of every frame to its FES bin (simulation time, order parameters,'\
+				$'\n bin number and free energy) is stored in mapped_FES_frames.npz in the same folder.'\
 				$'\n\n *You may use this file to identify the simulation time(s) of the structure(s)'\
 				$'\n you may want to extract from the 2D representation of the free energy'\
 				$'\n landscape.'"${demB}"
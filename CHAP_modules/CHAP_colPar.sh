@@ -114,7 +114,17 @@ Optional (int=integer; str=string):
                      (enter 1 for all, 2 for 2nd half, 3 for last 3rd, etc.)
 --kde_opt <int>      Range (above and below the estimate) to test for the  
                      optimization of histogram number of bins for KDE
+--kde_opt_mode <str> How to choose among the --kde_opt numbers of bins: sweep
+                     (default; plot all), shimazaki or cv (rank by cost)
+--kde_opt_topk <int> Number of best-ranked histograms to plot with the
+                     shimazaki or cv --kde_opt_mode (default: 1)
+--headless           Run the python utilities without pauses or prompts;
+                     a question left unanswered stops them with an error
+--batch_config<str>  "key,value" file answering the prompts of headless
+                     runs (e.g. proceed,yes)
 --path_av_plot<str>  Path to input files for average of replica plots
+--wham <str>         Solver of the umbrella sampling PMF: gmx (default; gmx
+                     wham), wham or mbar (python, with bootstrap errors)
 --dist <float>       Solute-box distance (distance to box edge; default: 1.0)
 --bg                 Run production mdrun in the background with "nohup"
 --ter <prompt>       Interactively choose the N- & C-termini protonation 
@@ -137,7 +147,10 @@ mmGMX='' ; mmGMXpath='' ; coordinates_raw=''
 parfilename='' ; frame_b=0 ; frame_e=0
 method_clust='gromos' ; cut_cl='0.1'
 bin_number_range='' ; customNDXask=''
+kde_opt_mode='sweep' ; kde_opt_topk=1
+headless='' ; batch_config=''
 mmpb_begin='' ; path_av='' ; data_label=''
+wham_solver='gmx'
 #gmxV=''
 
 # check if the paraFile flag is used and then read the provided parameter file
@@ -176,8 +189,14 @@ read_paraFile()
 			elif [[ "$par" == "clustr_cut" ]]; then cut_cl="$par_input"
 			elif [[ "$par" == "dt" ]]; then dt="$par_input"
 			elif [[ "$par" == "auto_mode" ]]; then automode="$par_input"
+			elif [[ "$par" == "kde_opt" ]]; then bin_number_range="$par_input"
+			elif [[ "$par" == "kde_opt_mode" ]]; then kde_opt_mode="$par_input"
+			elif [[ "$par" == "kde_opt_topk" ]]; then kde_opt_topk="$par_input"
+			elif [[ "$par" == "headless" && "$par_input" == "yes" ]]; then headless=1
+			elif [[ "$par" == "batch_config" ]]; then batch_config="$par_input"
 			elif [[ "$par" == "path_av_plot" ]]; then path_av="$part_input"
 			elif [[ "$par" == "data_label" ]]; then data_label="$part_input"
+			elif [[ "$par" == "wham" ]]; then wham_solver="$par_input"
 			fi
 		done < "$parfilename"
 	fi
@@ -210,6 +229,10 @@ while [ "$1" != "" ]; do
 	-i | --input) shift; coordinates_raw="$1";;
 	--inputtraj) shift; PBCcorrectType="$1";;
 	--kde_opt) shift; bin_number_range="$1";;
+	--kde_opt_mode) shift; kde_opt_mode="$1";;
+	--kde_opt_topk) shift; kde_opt_topk="$1";;
+	--headless) headless=1;;
+	--batch_config) shift; batch_config="$1";;
 	--ntomp) shift; ntomp="$1" ;;
 	--movieFrame) shift; customframeNo="$1" ;;
 	-M | --mmgpath) shift; mmGMXpath="$1"; mmGMX="1";;
@@ -223,6 +246,7 @@ while [ "$1" != "" ]; do
 	-t | --temp) shift; Temp="$1";;
 	--ter) termini=1;;
 	--trFrac) shift; trajFraction="$1";;
+	--wham) shift; wham_solver="$1";;
 	-v | --version) echo "$demA"$' CHAPERON version: '"$CHAPERONg_version"; Credit; echo $''; exit 0 ;;
 	-W | --maxwarn) shift; WarnMax="$1";;
 	*) echo "Invalid option: $1"; Help; echo $''; exit 1;;
@@ -230,6 +254,12 @@ while [ "$1" != "" ]; do
 	shift
 done
 
+# Settings read by the python utilities (see CHAP_utilities/CHAP_batch.py)
+if [[ "$headless" == 1 ]] ; then export CHAPERONg_HEADLESS=1 ; fi
+if [[ "$batch_config" != '' ]] ; then
+	export CHAPERONg_BATCH_CONFIG="$(cd "$(dirname "$batch_config")" && pwd)/$(basename "$batch_config")"
+fi
+
 pattern="^[0-9]+(\.[0-9]+)?$"
 
 if ! [[ "$edgeDist" =~ $pattern ]]; then
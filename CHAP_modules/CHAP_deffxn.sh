@@ -2745,7 +2745,11 @@ umbre_s14_xtractFrames()
 	elif [[ ! -d "$currentcoords_SMDdir" ]]; then mkdir coordinates_SMD
 	fi
 	# mv coordinate*.gro ./coordinates_SMD || true
-	echo 0 | eval $gmx_exe_path trjconv -s pull.tpr -f pull.xtc -o ./coordinates_SMD/coordinate.gro -sep
+	# keep all frames in one archive; coordinate<N>.gro files are written out
+	# later only for the frames used as umbrella windows
+	echo 0 | eval $gmx_exe_path trjconv -s pull.tpr -f pull.xtc -o ./coordinates_SMD/coordinates.gro
+	python3 ${CHAPERONg_PATH}/CHAP_utilities/CHAP_frame_archive.py || \
+	python ${CHAPERONg_PATH}/CHAP_utilities/CHAP_frame_archive.py
 	echo -e "${demA}\033[92m Extract frames from the steered MDS trajectory...DONE\033[m${demB}"
 	sleep 2
 }
@@ -2817,8 +2821,24 @@ umbre_s15_calcCOMdist()
 
 	currentcoords_SMDdir="$(pwd)""/coordinates_SMD"
 	if [[ -d "$currentcoords_SMDdir" ]]; then
+		# calculate the distances of all frames at once with CHAP_calc_SMD_COM_dist.py
+		# and only fall back to one gmx distance run per frame if that fails
+		if python3 ${CHAPERONg_PATH}/CHAP_utilities/CHAP_calc_SMD_COM_dist.py -gmx "$gmx_exe_path" -nw "$nt" || \
+			python ${CHAPERONg_PATH}/CHAP_utilities/CHAP_calc_SMD_COM_dist.py -gmx "$gmx_exe_path" -nw "$nt"
+		then
+			rm -r distances_SMD
+			echo -e "${demA}\033[92m Calculate COM distances...DONE\033[m${demB}"
+			sleep 2
+			return 0
+		fi
+		echo "${demA}"" Calculating the COM distances with gmx distance instead...""${demB}"
+		sleep 2
+		if [[ -f ./coordinates_SMD/coordinates.gro ]]; then
+			python3 ${CHAPERONg_PATH}/CHAP_utilities/CHAP_frame_archive.py --all || \
+			python ${CHAPERONg_PATH}/CHAP_utilities/CHAP_frame_archive.py --all
+		fi
 		multiError=0
-		for Structure in ./coordinates_SMD/"coordinate"*".gro" ; do
+		for Structure in ./coordinates_SMD/"coordinate"[0-9]*".gro" ; do
 			if [[ $multiError == 0 ]] ; then
 				# calculate distance between the groups
 				CalcDist || multiError=1
@@ -2896,15 +2916,38 @@ umbre_s16_findIniConf()
 	python3 ${CHAPERONg_PATH}/CHAP_utilities/CHAP_set_US_starting_configs.py || \
 	python ${CHAPERONg_PATH}/CHAP_utilities/CHAP_set_US_starting_configs.py
 
+	# write out the selected frames from the SMD frame archive
+	if [[ -f ./coordinates_SMD/coordinates.gro ]]; then
+		python3 ${CHAPERONg_PATH}/CHAP_utilities/CHAP_frame_archive.py -l configuratns_list.txt || \
+		python ${CHAPERONg_PATH}/CHAP_utilities/CHAP_frame_archive.py -l configuratns_list.txt
+	fi
+
+	# predict the overlap of the windows and propose extra frames for any gaps
+	if [[ -f md_umbrella.mdp ]]; then
+		echo $" Predicting the overlap of the umbrella sampling windows..."
+		python3 ${CHAPERONg_PATH}/CHAP_utilities/CHAP_plan_US_windows.py || \
+		python ${CHAPERONg_PATH}/CHAP_utilities/CHAP_plan_US_windows.py || true
+	fi
+
 	echo -e "\n\033[92m Identify initial configurations for umbrella sampling...DONE\033[m${demB}"
 	sleep 2
 }
 
+SMD_frame_file()
+{
+	# write out the coordinate file of the frame from the SMD frame archive if needed
+	if [[ ! -f ./coordinates_SMD/coordinate"$us_frame".gro && -f ./coordinates_SMD/coordinates.gro ]]; then
+		python3 ${CHAPERONg_PATH}/CHAP_utilities/CHAP_frame_archive.py -fr "$us_frame" || \
+		python ${CHAPERONg_PATH}/CHAP_utilities/CHAP_frame_archive.py -fr "$us_frame"
+	fi
+}
+
 US_fxn()
 {
 	us_frame=$(echo "$line" | awk '{print $1}')
 	echo "${demA}"" Now running NPT equilibration for configuration $us_frame"
 	sleep 1
+	SMD_frame_file
 
 	eval $gmx_exe_path grompp -f npt_umbrella.mdp -c ./coordinates_SMD/coordinate"$us_frame".gro \
 	-p topol.top -r ./coordinates_SMD/coordinate"$us_frame".gro -n index.ndx -o \
@@ -2982,67 +3025,32 @@ umbre_s18_WHAM()
 	echo "${demA} Extracting the PMF and plotting the umbrella histograms...""${demB}"
 	sleep 2
 	
-	eval $gmx_exe_path wham -it tpr_files.dat -if pullf_files.dat -o \
-	PMF_profile.xvg -hist umbrella_sampling_histograms0.xvg -unit kCal
-	rm umbrella_sampling_histograms0.xvg || true
+	if [[ "$wham_solver" == "wham" || "$wham_solver" == "mbar" ]]; then
+		# solve WHAM/MBAR in python: both zero points and bootstrap errors in one run
+		python3 ${CHAPERONg_PATH}/CHAP_utilities/CHAP_wham.py -method "$wham_solver" -nBootstrap 100 -nw "$nt" || \
+		python ${CHAPERONg_PATH}/CHAP_utilities/CHAP_wham.py -method "$wham_solver" -nBootstrap 100 -nw "$nt"
+	else
+		eval $gmx_exe_path wham -it tpr_files.dat -if pullf_files.dat -o \
+		PMF_profile.xvg -hist umbrella_sampling_histograms0.xvg -unit kCal
+		rm umbrella_sampling_histograms0.xvg || true
+	fi
 	sleep 2
 
-	# minPMFdG=$(grep -v "^[@#]" PMF_profile.xvg | sort -gk 2,2 | head -1 | awk '{print $2}')
-	# maxPMFdG=$(grep -v "^[@#]" PMF_profile.xvg | sort -gk 2,2 | tail -1 | awk '{print $2}')
-	# displacentATdGmin=$(grep -v "^[@#]" PMF_profile.xvg | sort -gk 2,2 | head -1 | awk '{print $1}')
-
-	## The above method works, but sometimes, for some reason,
-	##  the script terminates after the minPMFdG line
-	## So I splitted the long command into bits. Why? This is the 2nd time I experienced this with
-	##  the sort command. And that was what solved the problem the 1st time (or so I believed)
-	
-	grep -Ev "^[@#]|^$" PMF_profile.xvg > tempPMF
-	sort -gk 2,2 -o tempPMF tempPMF
-	head -n 1 tempPMF > tempPMFmin
-	tail -n 1 tempPMF > tempPMFmax
-	minPMFdG=$(grep "[0-9]" tempPMFmin | awk '{print $2}')
-	maxPMFdG=$(grep "[0-9]" tempPMFmax | awk '{print $2}')
-	displacentATdGmin=$(grep "[0-9]" tempPMFmin | awk '{print $1}')
-	rm tempPMF tempPMFmin tempPMFmax
-	
-	# gromacs .xvg outputs often contain decimals in scientific notations and 
-	# sort command with the -g flag handles that.
-	# LC_ALL=C is necessary for users whose locales use a comma instead of a period to indicate
-	# decimals, in which case the sort -g command would fail to sort dot decimals properly
-
-	eval $gmx_exe_path wham -it tpr_files.dat -if pullf_files.dat -o PMF_profile_YminAdjusted.xvg \
-	-hist umbrella_sampling_histograms.xvg -unit kCal -zprof0 $displacentATdGmin
-
-	# shift the PMF plot so that the displacement (x-axis) starts at 1 nm
-	# write out the XVG comments and headers
-	grep "^[@#]" PMF_profile_YminAdjusted.xvg > PMF_profile_XminYminAdjusted.xvg
-	count_data=0
-	while IFS= read -r line; do
-		# skip comments and headers
-		[[ "$line" =~ ^[#@] ]] && continue
-		displacement=$(echo "$line" | awk '{print $1}')
-		gibbsEnergy=$(echo "$line" | awk '{print $2}')
-		count_data=$(( count_data + 1 ))
-		if [[ "$count_data" == 1 ]] ; then startingDisplacement="$displacement" ; fi
-		# adjustedDisplacement=$(awk "BEGIN {print "$displacement" - "$startingDisplacement" + 1}")
-		adjustedDisplacement=$(awk "BEGIN {print "$displacement" - "$startingDisplacement"}")
-		echo -e "${adjustedDisplacement}\t${gibbsEnergy}" >> PMF_profile_XminYminAdjusted.xvg
-	done < PMF_profile_YminAdjusted.xvg
+	# displacement at the minimum of the PMF, where the second profile is set to zero
+	displacentATdGmin=$(python3 ${CHAPERONg_PATH}/CHAP_utilities/CHAP_process_PMF.py -z || \
+	python ${CHAPERONg_PATH}/CHAP_utilities/CHAP_process_PMF.py -z)
 
+	if [[ "$wham_solver" != "wham" && "$wham_solver" != "mbar" ]]; then
+		eval $gmx_exe_path wham -it tpr_files.dat -if pullf_files.dat -o PMF_profile_YminAdjusted.xvg \
+		-hist umbrella_sampling_histograms.xvg -unit kCal -zprof0 $displacentATdGmin
+	fi
 
+	# shift the PMF plot so that the displacement (x-axis) starts at zero,
+	# write out the dG and generate the figures of the WHAM results
 	echo "${demA}"$' Generating finished figures of key results of WHAM analysis...'"${demB}"
 	sleep 2
-	gracebat -nxy umbrella_sampling_histograms.xvg -hdevice PNG -autoscale xy -printfile \
-	umbrella_sampling_histograms.png -fixed 7500 4000 || true
-	gracebat PMF_profile.xvg -hdevice PNG -autoscale xy -printfile PMF_profile.png \
-	-fixed 7500 4000 -legend load || true
-	gracebat PMF_profile_YminAdjusted.xvg -hdevice PNG -autoscale xy -printfile \
-	PMF_profile_YminAdjusted.png -fixed 7500 4000 -legend load || true
-	dG_PMF=$(awk "BEGIN {print $minPMFdG - $maxPMFdG}")
-	echo $'Binding Free Energy (dG) = '"$dG_PMF"$' kCal/mol' > summary_dG.dat
-
-	gracebat PMF_profile_XminYminAdjusted.xvg -hdevice PNG -autoscale xy -printfile \
-	PMF_profile_XminYminAdjusted.png -fixed 7500 4000 -legend load || true
+	python3 ${CHAPERONg_PATH}/CHAP_utilities/CHAP_process_PMF.py || \
+	python ${CHAPERONg_PATH}/CHAP_utilities/CHAP_process_PMF.py || true
 
 
 	AnaName="Data_Analysis_PMF"
@@ -3067,6 +3075,7 @@ umbre_s18_WHAM()
 	PMF_profile_YminAdjusted.xvg PMF_profile_XminYminAdjusted.xvg ./$AnaName || true
 	mv umbrella_sampling_histograms.png PMF_profile.png PMF_profile_YminAdjusted.png \
 	PMF_profile_XminYminAdjusted.png summary_dG.dat ./$AnaName || true
+	if [[ -f bsResult.xvg ]]; then mv bsResult.xvg ./$AnaName; fi
 	
 	echo "${demA}"$' Generate finished figures of results of WHAM analysis...DONE'
 	sleep 2
@@ -3078,13 +3087,39 @@ umbre_s19_MoreWin()
 {
 	repeatUSmore="yes"
 
+	# frames proposed by CHAP_plan_US_windows.py to close the gaps between windows,
+	# less those already run (listed in tpr_files.dat as umbrella_win*_conf<frame>.tpr)
+	planned_frames=()
+	if [[ -f US_extra_frames.txt ]]; then
+		touch tpr_files.dat
+		planned_frames=($(awk 'FILENAME == "tpr_files.dat" {if (match($0, /_conf[0-9]+\.tpr/)) done[substr($0, RSTART + 5, RLENGTH - 9)] = 1; next}
+			FNR > 1 && !($1 in done) {print $1}' tpr_files.dat US_extra_frames.txt))
+	fi
+	if (( ${#planned_frames[@]} > 0 )); then
+		echo "${demA}"" Frames proposed in US_extra_frames.txt to close the gaps between windows: ${planned_frames[*]}"
+		read -p ' Do you want to run umbrella sampling for these frames? (yes/no): ' usePlanned
+		while [[ ! " ${valid_YesNo_response[@]} " =~ " ${usePlanned} " ]]; do
+			echo $' Please enter the appropriate response ("yes"/"y" or "no"/"n")!!\n'
+			read -p ' Do you want to run umbrella sampling for these frames? (y/n): ' usePlanned
+		done
+		if [[ "$usePlanned" != "yes" && "$usePlanned" != "y" && \
+			"$usePlanned" != '"yes"' && "$usePlanned" != '"y"' ]]; then planned_frames=()
+		fi
+	fi
+
 	while [[ "$repeatUSmore" == "yes" || "$repeatUSmore" == "y" || \
 		"$repeatUSmore" == '"yes"' || "$repeatUSmore" == '"y"' ]]
 	do
 		echo "${demA} Running umbrella sampling for an additional window...""${demB}"
 		sleep 2
-		read -p ' Enter the frame number of the SMD configuration to use: ' us_frame
-		echo $'\n You entered: '"$us_frame"
+		if (( ${#planned_frames[@]} > 0 )); then
+			us_frame="${planned_frames[0]}"
+			planned_frames=("${planned_frames[@]:1}")
+			echo $'\n Using the proposed frame: '"$us_frame"
+		else
+			read -p ' Enter the frame number of the SMD configuration to use: ' us_frame
+			echo $'\n You entered: '"$us_frame"
+		fi
 		sleep 2
 
 		window=0
@@ -3094,6 +3129,7 @@ umbre_s19_MoreWin()
 			
 		echo "${demA} Now running NPT equilibration for configuration $us_frame"
 		sleep 1
+		SMD_frame_file
 		eval $gmx_exe_path grompp -f npt_umbrella.mdp -c ./coordinates_SMD/coordinate"$us_frame".gro -p topol.top -r \
 		./coordinates_SMD/coordinate"$us_frame".gro -n index.ndx -o npt_win"$window"_conf"$us_frame".tpr -maxwarn $WarnMax
 
@@ -3125,6 +3161,7 @@ umbre_s19_MoreWin()
 		$' tpr_files.dat, pullf_files.dat and pullx_files.dat, respectively...'"${demB}"
 		sleep 2
 
+		if (( ${#planned_frames[@]} > 0 )); then continue; fi
 		read -p ' Do you want to run umbrella sampling for more windows? (yes/no): ' repeatUSmore
 
 		# while [[ "$repeatUSmore" != "yes" && "$repeatUSmore" != "no" && \
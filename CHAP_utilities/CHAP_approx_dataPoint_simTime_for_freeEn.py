@@ -1,4 +1,3 @@
-
 #################################################################################
 #  CHAP_approx_dataPoint_simTime_for_freeEn.py -- A python script to get the    #
 #    approx. data point for the all mapped fes simulation time and free energy  #
@@ -12,105 +11,67 @@
 __author__  = 'Abeeb A. Yekeen'
 __email__   = 'contact@abeebyekeen.com'
 __date__    = '2022.10.19'
-__version__ = '1.0'
+__version__ = '1.1'
 __status__  = 'Production'
 
 
 import os
+import numpy as np
+
+headertxt = "Time(ns)"+"\t"+"Order_Para1"+"\t\t"+"Order_Para2"+"\t"+"Energy"+"\n"
+
+# Write a view of the mapped data points in one bulk call, with the values
+# as they were written in the input files
+def write_mapped_view(out_file, text_rows):
+    with open(out_file, "w") as mappedfestimed:
+        mappedfestimed.write(headertxt)
+        mappedfestimed.write("".join("\t\t".join(row) + "\n" for row in text_rows.tolist()))
+
+# For every mapped FES point, pick the frame closest to the centre of its bin
+def approx_dataPoint_per_FES_point(store):
+    bin_id = store["bin_id"]
+    fes_bin_id = store["fes_bin_id"]
+    widths = np.array([store["x_edges"][1] - store["x_edges"][0],
+                       store["y_edges"][1] - store["y_edges"][0]])
+    centres = np.full((store["bin_offsets"].size - 1, 2), np.nan)
+    centres[fes_bin_id] = np.column_stack((store["fes_par1"], store["fes_par2"]))
+
+    # Squared distance of every frame to the centre of its own bin, in bin widths
+    valid = np.flatnonzero(bin_id >= 0)
+    frame_pars = np.column_stack((store["order_par1"][valid], store["order_par2"][valid]))
+    distance = np.sum(((frame_pars - centres[bin_id[valid]]) / widths)**2, axis=1)
+    # The closest frame comes first within each bin; keep that first one
+    order = np.lexsort((distance, bin_id[valid]))
+    bins_found, first = np.unique(bin_id[valid][order], return_index=True)
+    closest_in_bin = np.full(centres.shape[0], -1)
+    closest_in_bin[bins_found] = valid[order][first]
+
+    chosen_frame = closest_in_bin[fes_bin_id]
+    # FES points of empty bins mapped to their nearest frame(s) by the KD-tree fallback
+    fallback_point, fallback_frame = store["fallback_point"], store["fallback_frame"]
+    if fallback_point.size:
+        points, first = np.unique(fallback_point, return_index=True)
+        chosen_frame[points] = fallback_frame[first]
+
+    mapped = chosen_frame >= 0
+    frames = chosen_frame[mapped]
+    rows = np.column_stack((store["time"][frames], store["order_par1"][frames],
+                            store["order_par2"][frames], store["fes_dG"][mapped]))
+    text_rows = np.column_stack((store["frame_text"][frames], store["fes_dG_text"][mapped]))
+    return rows, text_rows
 
 os.chdir('collect_mappings_extra')
-with open("mapped_dataPt.txt") as paramet:
-    filecount=0
-    milestone_factor=0
-    WriteCycle = 0
-    allmappedData = paramet.readlines()
-    HitList = []
-    for mappedData in allmappedData:
-        if filecount == 1:
-            print("\n Number of data point processed:    1 "+"of "+str(len(allmappedData)))
-        if filecount%500 == 0 and filecount > 0:
-            milestone_factor+=1
-            milestone_count=milestone_factor*500
-            print(" Number of data points processed: "+str(milestone_count)+" of "+str(len(allmappedData)))
-        if filecount%1000 == 0 and filecount > 0:
-            if WriteCycle == 0:
-                with open("mappedFESdataPoints_timed.dat", "w") as mappedfestimed:
-                    headertxt = "Time(ns)"+"\t"+"Order_Para1"+"\t\t"+"Order_Para2"+"\t"+"Energy"+"\n"
-                    mappedfestimed.write(headertxt)
-                    for FESdata in HitList:
-                        mappedfestimed.write(FESdata+"\n")
-                    WriteCycle+=1
-            elif WriteCycle > 0:
-                with open("mappedFESdataPoints_timed.dat", "a") as mappedfestimed:
-                    for FESdata in HitList:
-                        mappedfestimed.write(FESdata+"\n")
-                    WriteCycle+=1
-            HitList = []
-        mappedDatasplt = mappedData.strip("\n").split("\t")
-        candidatesDataRecord = "sorted_"+str(mappedDatasplt[0])
-        mappedfesData = (str(mappedDatasplt[1])+"\t"+str(mappedDatasplt[2])+"\t"+
-                        str(mappedDatasplt[3])+"\t"+str(mappedDatasplt[4]))
-        with open(candidatesDataRecord , "r") as dataPts:
-            prevdatapt = "nil"
-            FESdata = 0
-            lineno = 0
-            for dataP in dataPts.readlines():
-                lineno+=1
-                dataPstrip = dataP.strip("\n")
-                dataPstripDoubleTab = dataPstrip.replace("\t", "\t\t")
-                dataPstripsplt = dataPstrip.split("\t")
-                if FESdata == 0:
-                    if str(dataPstrip) == str(mappedfesData):
-                        FESdata+=1
-                    elif str(dataPstrip) != str(mappedfesData):
-                        prevdatapt = dataPstrip
-                        prevdataptDoubleTab = dataPstripDoubleTab
-                    continue
-                elif FESdata == 1:
-                    FESdata+=1
-                    if prevdatapt == "nil":
-                        prevdatapt = str("0"+"\t"+"0"+"\t"+"0"+"\t"+"0")
-                    prevdataptsplt = prevdatapt.split("\t")
-                    if (abs(float(prevdataptsplt[2]) - float(mappedDatasplt[3])) < 
-                        abs(float(dataPstripsplt[2]) - float(mappedDatasplt[3]))):
-                        if filecount == 0:
-                            filecount+=1
-                            HitList.append(prevdataptDoubleTab)
-                            # print("\n Number of data point processed:    1 "+"of "+str(len(allmappedData)))
-                        elif filecount > 0:
-                            filecount+=1
-                            HitList.append(prevdataptDoubleTab)
-                    elif (abs(float(prevdataptsplt[2]) - float(mappedDatasplt[3])) > 
-                        abs(float(dataPstripsplt[2]) - float(mappedDatasplt[3]))):
-                        if filecount == 0:
-                            filecount+=1
-                            HitList.append(dataPstripDoubleTab)
-                            # print("\n Number of data point processed:    1 "+"of "+str(len(allmappedData)))                            
-                        elif filecount > 0:
-                            filecount+=1
-                            HitList.append(dataPstripDoubleTab)
-                    break
-            if FESdata == 1:
-                # print("No data point after the FES mapped data")
-                if filecount == 0:
-                    filecount+=1
-                    HitList.append(prevdataptDoubleTab)
-                    # print("\n Number of data point processed:    1 "+"of "+str(len(allmappedData)))
-                if filecount > 0:
-                    filecount+=1
-                    HitList.append(prevdataptDoubleTab)
-    if WriteCycle == 0:
-        with open("mappedFESdataPoints_timed.dat", "w") as mappedfestimed:
-            headertxt = "Time(ns)"+"\t"+"Order_Para1"+"\t\t"+"Order_Para2"+"\t"+"Energy"+"\n"
-            mappedfestimed.write(headertxt)
-            for FESdata in HitList:
-                mappedfestimed.write(FESdata+"\n")
-            WriteCycle+=1
-    elif WriteCycle > 0:
-        with open("mappedFESdataPoints_timed.dat", "a") as mappedfestimed:
-            for FESdata in HitList:
-                mappedfestimed.write(FESdata+"\n")
-            WriteCycle+=1
-    HitList = []
-    print(" Number of data points processed: "+str(len(allmappedData))+" of "+str(len(allmappedData))+"\n")
-os.chdir('../')
\ No newline at end of file
+with np.load("mapped_FES_frames.npz") as store:
+    rows, text_rows = approx_dataPoint_per_FES_point(store)
+    fes_count = store["fes_bin_id"].size
+print("\n Number of data points processed: "+str(fes_count)+" of "+str(fes_count))
+print(" Number of data points mapped:    "+str(len(rows))+"\n")
+
+# FES energy order, then the time-sorted (time, energy) and
+# energy-sorted (energy, order_para1) copies
+write_mapped_view("mappedFESdataPoints_timed.dat", text_rows)
+write_mapped_view("time-sorted_mappedFESdataPoints_timed.dat",
+                  text_rows[np.lexsort((rows[:, 3], rows[:, 0]))])
+write_mapped_view("energy-sorted_mappedFESdataPoints_timed.dat",
+                  text_rows[np.lexsort((rows[:, 1], rows[:, 3]))])
+os.chdir('../')
@@ -10,15 +10,20 @@
 __author__  = 'Abeeb A. Yekeen'
 __email__   = 'contact@abeebyekeen.com'
 __date__    = '2023.06.22'
-__version__ = '1.0'
+__version__ = '1.1'
 __status__  = 'Production'
 
 
+import itertools
 import os
+import shutil
 import sys
-import time
+import tempfile
+import zipfile
 import argparse
 import numpy as np
+from CHAP_batch import pause
+from CHAP_data_loader import map_in_processes
 
 # Create an argument parser
 parser = argparse.ArgumentParser(description="Generate averaged plots and stats for multiple .xvg data")
@@ -26,6 +31,25 @@ parser.add_argument("-d", "--directory",
                     help="Path to the directory containing the input xvg files")
 parser.add_argument("-l", "--label",
                     help="Name/Type of the input files, e.g. RMSD, Rg, SASA, etc.")
+parser.add_argument("-c", "--chunk", type=int, default=100000,
+                    help="Number of data points read from each input file at a time (default: 100000)")
+parser.add_argument("-a", "--align", choices=("none", "intersect", "interpolate"), default="none",
+                    help="Alignment of replicas with different time axes: none (default; the time axes must "
+                    "be identical), intersect (keep the common time points) or interpolate (resample onto "
+                    "a common time grid)")
+parser.add_argument("-nw", "--workers", type=int, default=0,
+                    help="Number of processes parsing the input files with --align (default: 0, i.e. all cores)")
+parser.add_argument("-b", "--bootstrap", type=int, default=0,
+                    help="Number of bootstrap resamples of the replicas for confidence bands of the mean "
+                    "(default: 0, i.e. no bootstrap)")
+parser.add_argument("--ci", type=float, default=95,
+                    help="Confidence level (%%) of the bootstrap bands (default: 95)")
+parser.add_argument("--seed", type=int, default=None,
+                    help="Seed of the bootstrap resampling, for reproducible bands (default: random)")
+parser.add_argument("--block_average", action="store_true",
+                    help="Also estimate the standard error of the time-averaged mean by block averaging")
+parser.add_argument("--npz", action="store_true",
+                    help="Also write the averaged data and the input replicas to a compressed mean_<label>.npz")
 args = parser.parse_args()
 
 # Get label and path to the input files
@@ -38,89 +62,347 @@ if not os.path.isdir(input_directory):
     sys.exit(1)
 
 # Make a list of input files in the directory
-input_files = [file for file in os.listdir(input_directory) if file.endswith(".xvg")]
+# The averaged plot of an earlier run is not one of the replicas
+input_files = [file for file in os.listdir(input_directory)
+               if file.endswith(".xvg") and file != f"mean_{label}.xvg"]
 file_count = len(input_files)
 
 print ("  Files found:\n")
 for file in input_files:
     print (f"    {file}\n")
-    time.sleep(1)
+    pause(1)
 
-# Load data from input files
-print(" Loading data from input files...\n")
-time.sleep(1)
-data = []
-for file_name in input_files:
-    file_path = os.path.join(input_directory, file_name)
+# Read the axis labels, plot type, data set legends and number of data sets
+# (y-columns) from the header of an input file
+def read_xvg_header(file_path):
+    header = {}
+    legends = {}
     with open(file_path, "r") as file:
-        lines = file.readlines()
-        # Grab the labels for x and y axes from the input files
-        for line in lines:
+        for line in file:
+            if line.strip() == "":
+                continue
+            if not (line.startswith("#") or line.startswith("@")):
+                header["set_count"] = len(line.split()) - 1
+                break
+            fields = line.split()
+            if (len(fields) > 2 and fields[1][0] == "s" and fields[1][1:].isdigit()
+                    and fields[2] == "legend" and '"' in line):
+                legends[int(fields[1][1:])] = line.split('"')[1].strip()
             if ("xaxis" in line and "label" in line):
-                xlabel = line
-                xtitle_split = line.split('"')
-                xtitle = xtitle_split[1].strip()
-                if "(" in xtitle: xtitle_no_unit = (xtitle.split("("))[0].strip()
-                elif " " in xtitle: xtitle_no_unit = (xtitle.split())[0].strip()
-                else: xtitle_no_unit = xtitle
+                header["xlabel"] = line
+                header["xtitle"] = line.split('"')[1].strip()
             if ("yaxis" in line and "label" in line):
-                ylabel = line
-                ytitle_split = line.split('"')
-                ytitle = ytitle_split[1].strip()
-                if "(" in ytitle: ytitle_no_unit = (ytitle.split("("))[0].strip()
-                elif " " in ytitle: ytitle_no_unit = (ytitle.split())[0].strip()
-                else: ytitle_no_unit = ytitle
+                header["ylabel"] = line
+                header["ytitle"] = line.split('"')[1].strip()
             if "@TYPE" in line:
-                plot_type = line
-        plot_title = f'@    title "Averaged {label}"\n'
-        plot_legend = f'@ s0 legend "Mean of {file_count} replica plots"\n'
-        # Skip header lines and comments
-        lines = [line for line in lines if not (line.startswith("#") or line.startswith("@"))]
-        # Extract x and y values
-        x = []
-        y = []
-        for line in lines:
-            values = line.strip().split()
-            x.append(float(values[0]))
-            y.append(float(values[1]))
-        data.append((file_name, y))  # Store file name along with y values
-
-# Calculate mean and standard deviation
-print(" Calculating mean and standard deviation...\n")
-time.sleep(1)
-mean_data = np.mean([y for _, y in data], axis=0)
-std_data = np.std([y for _, y in data], axis=0)
-
-# Generate new xvg file with averaged data
-print(f" Generating the {xtitle_no_unit}-averaged {ytitle_no_unit} plot...\n")
-time.sleep(1)
+                header["plot_type"] = line
+    if legends:
+        header["legends"] = legends
+    return header
+
+def title_without_unit(title):
+    if "(" in title: return (title.split("("))[0].strip()
+    elif " " in title: return (title.split())[0].strip()
+    else: return title
+
+# Read the next (up to) row_count data rows of an open xvg file
+def read_data_rows(file, row_count):
+    rows = []
+    while len(rows) < row_count:
+        lines = list(itertools.islice(file, row_count - len(rows)))
+        if not lines:
+            break
+        rows.extend(line for line in lines
+                    if line.strip() != "" and not (line.startswith("#") or line.startswith("@")))
+    if not rows:
+        return np.empty(0), np.empty((0, set_count))
+    values = np.loadtxt(rows, ndmin=2)
+    return values[:, 0], values[:, 1:]
+
+# Welford update of the running mean and sum of squared deviations with one more
+# replica, for all data points of all data sets (rows x columns) at once
+def welford_update(count, mean, m2, y):
+    count += 1
+    delta = y - mean
+    mean = mean + delta / count
+    m2 = m2 + delta * (y - mean)
+    return count, mean, m2
+
+# Bootstrap percentile band of the mean: the means of all resamples are
+# weighted sums of the replicas, so a batch of columns takes one matrix product
+def bootstrap_band(chunk_y, batch_size=2**22):
+    flat = np.reshape(chunk_y, (file_count, -1))
+    band = np.empty((2, flat.shape[1]))
+    columns = max(1, batch_size // args.bootstrap)
+    for first in range(0, flat.shape[1], columns):
+        resample_means = resample_weights @ flat[:, first:first + columns]
+        band[:, first:first + columns] = np.percentile(
+            resample_means, [(100 - args.ci) / 2, (100 + args.ci) / 2], axis=0)
+    return band.reshape((2,) + np.shape(chunk_y)[1:])
+
+# Flyvbjerg-Petersen blocking: standard error of the mean of a time-correlated
+# series for block lengths 1, 2, 4, ... frames
+def block_standard_errors(series):
+    levels = []
+    block_length = 1
+    while series.shape[0] >= 2:
+        block_count = series.shape[0]
+        levels.append((block_length, block_count, np.sqrt(np.var(series, axis=0, ddof=1) / block_count)))
+        series = 0.5 * (series[0:block_count - 1:2] + series[1:block_count:2])
+        block_length *= 2
+    return levels
+
+# Write the rows of a table of columns in large blocks: each block is
+# formatted by a single %-operation on the row format repeated for every row
+def write_table(file, row_format, columns, block_values=2**20):
+    table = np.column_stack(columns)
+    block_rows = max(1, block_values // table.shape[1])
+    for first in range(0, table.shape[0], block_rows):
+        block = table[first:first + block_rows]
+        file.write((row_format * block.shape[0]) % tuple(block.ravel().tolist()))
+
+class NpzWriter:
+    # Compressed .npz archive written chunk by chunk: the rows of each array are
+    # spooled to a temporary file and copied into the archive by close()
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self.spools = {}
+
+    def append(self, name, rows):
+        rows = np.ascontiguousarray(rows, dtype=float)
+        if name not in self.spools:
+            self.spools[name] = [tempfile.TemporaryFile(dir=os.path.dirname(self.file_path)), rows.shape[1:], 0]
+        self.spools[name][0].write(rows.tobytes())
+        self.spools[name][2] += rows.shape[0]
+
+    def close(self, **arrays):
+        with zipfile.ZipFile(self.file_path, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+            for name, (spool, row_shape, row_count) in self.spools.items():
+                with archive.open(f"{name}.npy", "w", force_zip64=True) as member:
+                    np.lib.format.write_array_header_1_0(member, {
+                        "descr": np.lib.format.dtype_to_descr(np.dtype(float)),
+                        "fortran_order": False, "shape": (row_count,) + row_shape})
+                    spool.seek(0)
+                    shutil.copyfileobj(spool, member, 2**20)
+                spool.close()
+            for name, array in arrays.items():
+                with archive.open(f"{name}.npy", "w") as member:
+                    np.lib.format.write_array(member, np.asarray(array), allow_pickle=False)
+
+# Parse a whole replica file into arrays of its x values and y-columns
+def load_replica(file_path):
+    values = np.loadtxt(file_path, comments=('#', '@'), ndmin=2)
+    return values[:, 0], values[:, 1:]
+
+# Bring all replicas onto a common time axis, either the time points found in
+# every replica or an evenly spaced grid over the time range they all cover
+def align_replicas(replicas, align):
+    # Appended or restarted runs repeat time points; keep the last copy of
+    # each time, which also leaves the times in increasing order
+    duplicates = []
+    unique_replicas = []
+    for x, y in replicas:
+        _, last = np.unique(x[::-1], return_index=True)
+        keep = x.size - 1 - last
+        unique_replicas.append((x[keep], y[keep]))
+        duplicates.append(x.size - keep.size)
+    replicas = unique_replicas
+    if align == "intersect":
+        grid = replicas[0][0]
+        for x, _ in replicas[1:]:
+            grid = np.intersect1d(grid, x)
+    else:
+        start = max(x[0] for x, _ in replicas)
+        end = min(x[-1] for x, _ in replicas)
+        # The coarsest sampling interval among the replicas
+        step = max(np.median(np.diff(x)) for x, _ in replicas if x.size > 1)
+        grid = start + step * np.arange(int(np.floor((end - start) / step + 1e-9)) + 1)
+        # Drop the floating-point noise of the multiples of the step
+        grid = np.minimum(np.round(grid, 9), end)
+    if grid.size == 0:
+        print("\n The replica files have no time range in common.")
+        sys.exit(1)
+
+    aligned = []
+    report = []
+    for (x, y), repeated in zip(replicas, duplicates):
+        if align == "intersect":
+            aligned.append(y[np.isin(x, grid)])
+            # Points within the common range that are missing from other replicas
+            changed = np.count_nonzero((x >= grid[0]) & (x <= grid[-1])) - grid.size
+        else:
+            aligned.append(np.column_stack([np.interp(grid, x, column) for column in y.T]))
+            # Grid points that are not time points of this replica
+            changed = grid.size - np.count_nonzero(np.isin(grid, x))
+        step = np.median(np.diff(x)) if x.size > 1 else 0.0
+        report.append((x.size + repeated, x[0], x[-1], step, repeated, np.count_nonzero(x < grid[0]),
+                       np.count_nonzero(x > grid[-1]), changed))
+    return grid, aligned, report
+
+def write_alignment_report(report_file, grid, report):
+    with open(report_file, "w") as file:
+        file.write(f"# Replicas aligned by {args.align}: {grid.size} time points from {grid[0]} to {grid[-1]}\n")
+        file.write("Replica\tPoints\tStart\tEnd\tStep\tDuplicates\tTrimmed_start\tTrimmed_end\t"
+                   + ("Dropped\n" if args.align == "intersect" else "Interpolated\n"))
+        for file_name, (points, start, end, step, repeated, before, after, inner) in zip(input_files, report):
+            file.write(f"{file_name}\t{points}\t{start}\t{end}\t{step:g}\t{repeated}\t{before}\t{after}\t{inner}\n")
+            if repeated or before or after or inner:
+                print(f"  {file_name}: {repeated} repeated time point(s) dropped,"
+                      f" {before} point(s) trimmed at the start, {after} at the end,"
+                      f" {inner} in between " + ("dropped" if args.align == "intersect" else "interpolated"))
+
+# Grab the labels for x and y axes from the input files
+header = {}
+for file_name in input_files:
+    header.update(read_xvg_header(os.path.join(input_directory, file_name)))
+xlabel, ylabel, plot_type = header["xlabel"], header["ylabel"], header["plot_type"]
+xtitle_no_unit = title_without_unit(header["xtitle"])
+ytitle_no_unit = title_without_unit(header["ytitle"]) or label
+plot_title = f'@    title "Averaged {label}"\n'
+
+# Multi-set files (e.g. several energy terms or H-bond counts) are averaged
+# set by set, and each set keeps its legend
+set_count = header.get("set_count", 1)
+for file_name in input_files:
+    if read_xvg_header(os.path.join(input_directory, file_name)).get("set_count", 1) != set_count:
+        print(f"\n The replica file {file_name} does not have the same number of data sets"
+              " as the other input files.")
+        sys.exit(1)
+legends = header.get("legends", {})
+set_legends = [legends.get(n, ytitle_no_unit if set_count == 1 else f"{ytitle_no_unit} {n + 1}")
+               for n in range(set_count)]
+replica_names = [file_name.rstrip(".xvg") for file_name in input_files]
+stats_names = ["Mean", "Std-dev"]
+if args.bootstrap > 0:
+    ci_name = f"{args.ci:g}"
+    stats_names += [f"Boot-CI{ci_name}-low", f"Boot-CI{ci_name}-high"]
+if set_count == 1:
+    plot_legend = f'@ s0 legend "Mean of {file_count} replica plots"\n'
+    stats_columns = stats_names
+    data_columns = replica_names + ["Mean", "Std-dev"]
+else:
+    plot_legend = "@ legend on\n" + "".join(
+        f'@ s{n} legend "{set_legend} (mean of {file_count} replicas)"\n'
+        for n, set_legend in enumerate(set_legends))
+    stats_columns = [f"{set_legend} {stat}" for set_legend in set_legends for stat in stats_names]
+    data_columns = [f"{name}: {set_legend}" for set_legend in set_legends
+                    for name in replica_names + ["Mean", "Std-dev"]]
+
 output_file_mean = os.path.join(input_directory, f"mean_{label}.xvg")
-with open(output_file_mean, "w") as file:
-    file.write(f"# Mean {ytitle_no_unit}\n")
-    file.write(f"{plot_title}{xlabel}{ylabel}{plot_type}{plot_legend}")
-    for i in range(len(x)):
-        file.write(f"{x[i]}\t{mean_data[i]:.8f}\n")
-
-# Generate new file with x-axis, y-axis, and std dev
-print(f" Writing out the {xtitle_no_unit}-averaged {xtitle_no_unit}-stddev lookup file...\n")
-time.sleep(1)
 output_file_stats = os.path.join(input_directory, f"mean_{label}_stats.dat")
-with open(output_file_stats, "w") as file:
-    file.write(f"{xtitle_no_unit}\tMean\tStd-dev\n")
-    for i in range(len(x)):
-        file.write(f"{x[i]}\t{mean_data[i]:.8f}\t{std_data[i]:.8f}\n")
-
-# Generate new file with x-axis, y-axis, mean, and std dev
-print(f" Writing out the {xtitle_no_unit}-{ytitle_no_unit}_values-averaged {ytitle_no_unit}-stddev lookup file...\n")
-time.sleep(1)
 output_file_data = os.path.join(input_directory, f"{label}_input_replicas.dat")
-with open(output_file_data, "w") as file:
-    file.write(f"{xtitle_no_unit}\t")
-    file.write("\t".join([file_name.rstrip(".xvg") for file_name, _ in data]))
-    file.write("\tMean\tStd-dev\n")
-    for i in range(len(x)):
-        file.write(f"{x[i]}\t")
-        file.write("\t\t".join([str(y[i]) for _, y in data]))  # Write y-axis values
-        file.write(f"\t\t{mean_data[i]:.8f}\t\t{std_data[i]:.8f}\n")  # Write mean and std dev values
+output_file_blocks = os.path.join(input_directory, f"mean_{label}_block_average.dat")
+output_file_npz = os.path.join(input_directory, f"mean_{label}.npz")
+
+# Row formats of the output files: x-axis, then the mean of each data set;
+# the mean, std dev (and bootstrap band) of each data set; the y-axis values
+# of every replica, mean and std dev of each data set
+mean_format = "%s\t" + "\t".join(["%.8f"] * set_count) + "\n"
+stats_format = "%s\t" + "\t".join(["%.8f"] * (set_count * len(stats_names))) + "\n"
+data_format = "%s\t" + "\t\t".join(["\t\t".join(["%s"] * file_count + ["%.8f", "%.8f"])] * set_count) + "\n"
+npz_out = NpzWriter(output_file_npz) if args.npz else None
+
+# The same resamples of the replicas are used for every time point. Each
+# resample is drawn as an index array and kept as its replica weights.
+if args.bootstrap > 0:
+    seed = args.seed if args.seed is not None else np.random.SeedSequence().entropy
+    print(f" Bootstrap confidence bands from {args.bootstrap} resamples (seed {seed})\n")
+    resamples = np.random.default_rng(seed).integers(0, file_count, size=(args.bootstrap, file_count))
+    resample_weights = np.zeros((args.bootstrap, file_count))
+    np.add.at(resample_weights, (np.arange(args.bootstrap)[:, None], resamples), 1 / file_count)
+mean_series = []
+
+# Average one chunk of time points over the replicas and write it out
+def write_chunk(x, chunk_y):
+    count, mean_data, m2_data = 0, 0.0, 0.0
+    for y in chunk_y:
+        count, mean_data, m2_data = welford_update(count, mean_data, m2_data, y)
+    std_data = np.sqrt(m2_data / count)
+    stats_data = [mean_data, std_data]
+    if args.bootstrap > 0:
+        stats_data.extend(bootstrap_band(chunk_y))
+    if args.block_average:
+        mean_series.append(mean_data)
+
+    write_table(mean_out, mean_format, [x, mean_data])
+    write_table(stats_out, stats_format, [x, np.stack(stats_data, axis=-1).reshape(len(x), -1)])
+    replica_data = np.stack(chunk_y, axis=1)
+    write_table(data_out, data_format, [x, np.concatenate(
+        (replica_data, mean_data[:, None], std_data[:, None]), axis=1).transpose(0, 2, 1).reshape(len(x), -1)])
+    if npz_out is not None:
+        npz_out.append("x", x)
+        npz_out.append("replicas", replica_data)
+        for name, stat in zip(["mean", "std", "ci_low", "ci_high"], stats_data):
+            npz_out.append(name, stat)
+
+if args.align != "none":
+    # Load the whole replicas in parallel and align their time axes
+    print(f" Loading data from input files with {args.align} alignment...\n")
+    pause(1)
+    grid, aligned, report = align_replicas(
+        map_in_processes(load_replica, [os.path.join(input_directory, file_name) for file_name in input_files], args.workers),
+        args.align)
+    write_alignment_report(os.path.join(input_directory, f"{label}_alignment_report.dat"), grid, report)
+    print(f"\n Alignment report written to {label}_alignment_report.dat\n")
+else:
+    # Read the replicas chunk-wise in lockstep, so that memory is bounded by the chunk size
+    print(" Loading data from input files and calculating mean and standard deviation...\n")
+    pause(1)
+    replica_files = [open(os.path.join(input_directory, file_name), "r") for file_name in input_files]
+
+# Write out each chunk of the averaged data as it is done
+with open(output_file_mean, "w", buffering=2**20) as mean_out, \
+        open(output_file_stats, "w", buffering=2**20) as stats_out, \
+        open(output_file_data, "w", buffering=2**20) as data_out:
+    mean_out.write(f"# Mean {ytitle_no_unit}\n")
+    mean_out.write(f"{plot_title}{xlabel}{ylabel}{plot_type}{plot_legend}")
+    stats_out.write(f"{xtitle_no_unit}\t" + "\t".join(stats_columns) + "\n")
+    data_out.write(f"{xtitle_no_unit}\t" + "\t".join(data_columns) + "\n")
+
+    if args.align != "none":
+        for first in range(0, grid.size, args.chunk):
+            write_chunk(grid[first:first + args.chunk], [y[first:first + args.chunk] for y in aligned])
+    while args.align == "none":
+        chunk = [read_data_rows(file, args.chunk) for file in replica_files]
+        x = chunk[-1][0]
+        for file_name, (x_replica, y) in zip(input_files, chunk):
+            if len(y) != len(x):
+                print(f"\n The replica file {file_name} does not have the same number of data points"
+                      " as the other input files.\n Use --align intersect or --align interpolate"
+                      " to average over the common time range.")
+                sys.exit(1)
+            if not np.array_equal(x_replica, x):
+                print(f"\n The time points of the replica file {file_name} differ from those of the"
+                      " other input files.\n Use --align intersect or --align interpolate to align them.")
+                sys.exit(1)
+        if len(x) == 0:
+            break
+        write_chunk(x, [y for _, y in chunk])
+
+if args.align == "none":
+    for file in replica_files:
+        file.close()
+
+if npz_out is not None:
+    npz_out.close(replica_names=replica_names, data_sets=set_legends)
+    print(f" Wrote out the averaged data and the replicas to mean_{label}.npz\n")
+
+if args.block_average and mean_series:
+    levels = block_standard_errors(np.concatenate(mean_series))
+    with open(output_file_blocks, "w") as file:
+        file.write(f"# Block-averaged standard error of the {xtitle_no_unit}-averaged mean {ytitle_no_unit}\n")
+        file.write("Block_length\tBlocks\t" + "\t".join([f"{set_legend} SE" for set_legend in set_legends]) + "\n")
+        for block_length, block_count, errors in levels:
+            file.write(f"{block_length}\t{block_count}\t" + "\t".join([f"{error:.8f}" for error in errors]) + "\n")
+    # The estimate is taken at the plateau, i.e. the largest error among the
+    # levels that still have enough blocks for a reliable variance
+    reliable = [errors for _, block_count, errors in levels if block_count >= 16] or [levels[0][2]]
+    for set_legend, error in zip(set_legends, np.max(reliable, axis=0)):
+        print(f" Block-averaged standard error of the mean {set_legend}: {error:.8f}\n")
+    print(f" Wrote out the block averaging to mean_{label}_block_average.dat\n")
+
+print(f" Generated the {xtitle_no_unit}-averaged {ytitle_no_unit} plot\n")
+print(f" Wrote out the {xtitle_no_unit}-averaged {xtitle_no_unit}-stddev lookup file\n")
+print(f" Wrote out the {xtitle_no_unit}-{ytitle_no_unit}_values-averaged {ytitle_no_unit}-stddev lookup file\n")
 
 print(" Run successfully completed!!!\n")
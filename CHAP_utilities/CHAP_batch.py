@@ -0,0 +1,94 @@
+##########################################################################
+#  CHAP_batch.py -- Headless (batch) execution of the CHAPERONg          #
+#    utility scripts                                                     #
+#  CHAP_batch.py is part of the CHAPERONg package                        #
+#  The functions are imported by the python scripts in CHAP_utilities    #
+#    that pause between steps or prompt the user                         #
+#  CHAPERONg -- An automation program for GROMACS MD simulations and     #
+#    trajectory analyses                                                 #
+##########################################################################
+
+__author__  = 'Abeeb A. Yekeen'
+__email__   = 'contact@abeebyekeen.com'
+__date__    = '2026.10.17'
+__version__ = '1.0'
+__status__  = 'Production'
+
+import os
+import sys
+import time
+
+# The headless mode is switched on with CHAPERONg_HEADLESS=1 (exported by
+# CHAPERONg with --headless) or with "headless,yes" in the batch configuration
+# file named by CHAPERONg_BATCH_CONFIG. The configuration holds "key,value"
+# lines like the other CHAPERONg parameter files, e.g. "proceed,yes".
+config_variable = 'CHAPERONg_BATCH_CONFIG'
+headless_variable = 'CHAPERONg_HEADLESS'
+
+# Exit status of a headless run that stops at a question it cannot answer
+unanswered_exit_code = 3
+
+true_values = ('1', 'yes', 'y', 'true', 'on')
+false_values = ('2', 'no', 'n', 'false', 'off')
+
+
+def read_batch_config():
+	config = {}
+	config_file = os.environ.get(config_variable, '').strip()
+	if config_file == '':
+		return config
+	try:
+		with open(config_file) as in_par:
+			for parameter in in_par.readlines():
+				parameter = parameter.strip()
+				if parameter == '' or parameter[0] in ';#' or "," not in parameter:
+					continue
+				key, value = parameter.split(",", 1)
+				config[key.strip()] = value.strip()
+	except OSError:
+		print(f" The batch configuration file {config_file} could not be read!\n")
+		sys.exit(unanswered_exit_code)
+	return config
+
+batch_config = read_batch_config()
+headless = (os.environ.get(headless_variable, '').strip().lower() in true_values
+			or batch_config.get('headless', '').lower() in true_values)
+
+
+def batch_setting(key, default=None):
+	# Value of a setting in the batch configuration file
+	return batch_config.get(key, default)
+
+def pause(seconds):
+	# Pacing pause between the steps of an interactive run
+	if not headless:
+		time.sleep(seconds)
+
+def confirm_to_proceed(prmpt, setting='proceed'):
+	# Ask whether to proceed: returns 1 (Yes) or 2 (No). A headless run takes
+	# the answer from the batch configuration and exits with a non-zero status
+	# rather than wait for a response that will never come.
+	if headless:
+		answer = batch_setting(setting, batch_setting('proceed', '')).lower()
+		if answer in true_values:
+			response = 1
+		elif answer in false_values:
+			response = 2
+		else:
+			print(
+				"\n The run is headless and no response has been set for this question."
+				f'\n Add "{setting},yes" (or "{setting},no") to the batch configuration'
+				f'\n file named by {config_variable}.\n'
+				)
+			sys.exit(unanswered_exit_code)
+		print(f'{prmpt}{response} (headless mode)')
+		return response
+
+	response = int(input(prmpt))
+	while response != 1 and response != 2:
+		print(
+			"\n ENTRY REJECTED!"
+			"\n **Please enter the appropriate option (1 or 2)\n"
+			)
+		response = int(input(prmpt))
+	return response
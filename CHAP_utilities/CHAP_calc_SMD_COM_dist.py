@@ -0,0 +1,253 @@
+######################################################################
+#  CHAP_calc_SMD_COM_dist.py -- A python script to calculate the     #
+#    COM distance between the pull groups in the SMD frames          #
+#  CHAP_calc_SMD_COM_dist.py is part of the CHAPERONg package        #
+#  Input parameters are generated by other scripts in CHAPERONg and  #
+#    are read by this script                                         #
+#  CHAPERONg -- An automation program for GROMACS MD simulations and #
+#    trajectory analyses                                             #
+######################################################################
+
+__author__  = 'Abeeb A. Yekeen'
+__email__   = 'contact@abeebyekeen.com'
+__date__    = '2026.10.17'
+__version__ = '1.0'
+__status__  = 'Production'
+
+
+import argparse
+import glob
+import os
+import re
+import shlex
+import subprocess
+import sys
+
+import numpy as np
+from CHAP_data_loader import map_in_processes, read_mdp_value
+from CHAP_frame_archive import FrameArchive, archive_name, frame_file
+
+parser = argparse.ArgumentParser(
+	description="Calculate the COM distance between the two pull groups in every extracted SMD frame")
+parser.add_argument("-f", "--frames", default="coordinates_SMD",
+	help=f"Folder holding the {archive_name} frame archive or the coordinate<N>.gro frames"
+	" (default: coordinates_SMD)")
+parser.add_argument("-n", "--index", default="index.ndx",
+	help="Index file holding the pull groups (default: index.ndx)")
+parser.add_argument("-s", "--tpr", default="pull.tpr",
+	help="Run input file of the SMD holding the atomic masses (default: pull.tpr)")
+parser.add_argument("-gmx", "--gmx", default="gmx",
+	help="GROMACS executable used to read the masses from the tpr file (default: gmx)")
+parser.add_argument("-m", "--mdp", default="md_pull.mdp",
+	help="Parameter file naming the pull groups (default: md_pull.mdp)")
+parser.add_argument("-g1", "--group1", default=None,
+	help="Name or number of the first group (default: pull_group1_name of the mdp file)")
+parser.add_argument("-g2", "--group2", default=None,
+	help="Name or number of the second group (default: pull_group2_name of the mdp file)")
+parser.add_argument("-w", "--weighting", choices=("mass", "geometry"), default="mass",
+	help="Weighting of the centres of the groups (default: mass, as the COM of gmx distance)")
+parser.add_argument("--pull_dim", action="store_true",
+	help="Measure only along the dimensions of pull_coord1_dim (default: full 3D distance)")
+parser.add_argument("-o", "--output", default="distances_summary.txt",
+	help="Output summary of the distance in each frame (default: distances_summary.txt)")
+parser.add_argument("-nw", "--workers", type=int, default=0,
+	help="Number of processes reading the frames (default: 0, i.e. all cores)")
+args = parser.parse_args()
+
+# Atomic masses of the elements found in biomolecular systems, used only when
+# the masses cannot be read from the tpr file; other atoms are taken as carbon
+element_masses = {
+	'H': 1.008, 'C': 12.011, 'N': 14.007, 'O': 15.999, 'S': 32.06, 'P': 30.974,
+	'F': 18.998, 'CL': 35.45, 'BR': 79.904, 'I': 126.904, 'NA': 22.990, 'K': 39.098,
+	'MG': 24.305, 'CA': 40.078, 'ZN': 65.38, 'FE': 55.845, 'MN': 54.938, 'CU': 63.546,
+	'CO': 58.933, 'NI': 58.693, 'LI': 6.94, 'RB': 85.468, 'CS': 132.905, 'SE': 78.971,
+	'BA': 137.327,
+	}
+# Ions of the CHARMM force fields, whose names do not start with their element
+ion_elements = {'SOD': 'NA', 'POT': 'K', 'CLA': 'CL', 'CAL': 'CA', 'CES': 'CS', 'LIT': 'LI',
+	'RUB': 'RB', 'ZN2': 'ZN', 'MG2': 'MG', 'BAR': 'BA'}
+
+
+def read_index_groups(index_file):
+	groups = []
+	with open(index_file) as ndx:
+		for line in ndx:
+			line = line.strip()
+			if line.startswith("["):
+				groups.append((line.strip("[] "), []))
+			elif line and groups:
+				groups[-1][1].extend(int(atom) for atom in line.split())
+	return groups
+
+def select_group(groups, selection):
+	# A group is selected by its number, as in gmx, or by its name
+	if selection is None:
+		print(f"\n The pull groups were not found in {args.mdp}; set them with -g1 and -g2.\n")
+		sys.exit(1)
+	if selection.isdigit():
+		if int(selection) >= len(groups):
+			print(f"\n There is no group {selection} in {args.index}; the groups are numbered"
+				f" from 0 to {len(groups) - 1}!\n")
+			sys.exit(1)
+		return groups[int(selection)]
+	matches = [group for group in groups if group[0] == selection]
+	if not matches:
+		print(f"\n The group {selection} was not found in {args.index}!\n")
+		sys.exit(1)
+	if len(matches) > 1:
+		print(f"\n There are {len(matches)} groups named {selection} in {args.index};"
+			" using the first one.\n Select another one by number with -g1/-g2 if this is wrong.\n")
+	return matches[0]
+
+def frame_number(gro_file):
+	match = re.fullmatch(r"coordinate(\d+)\.gro", os.path.basename(gro_file))
+	return int(match.group(1)) if match else None
+
+def read_frame(frame):
+	# Text of a frame, from the archive if there is one
+	if frame_archive is not None:
+		return frame_archive.read_frame(frame)
+	with open(frame_file(frame, args.frames), "rb") as gro:
+		return gro.read()
+
+def read_tpr_masses(gmx, tpr_file):
+	# Masses of all atoms of the system from gmx dump of the tpr file: the
+	# masses of the atoms of each molecule type, repeated for every molecule
+	# of each molecule block. None if the tpr file cannot be read.
+	if not os.path.isfile(tpr_file):
+		return None
+	try:
+		dump = subprocess.run(shlex.split(gmx) + ["dump", "-s", tpr_file], capture_output=True,
+			text=True).stdout
+	except OSError:
+		return None
+	blocks, moltype_masses, moltype = [], {}, None
+	for line in dump.split("\n"):
+		line = line.strip()
+		if line.startswith("moltype (") and line.endswith("):"):
+			moltype = int(line[len("moltype ("):-2])
+			moltype_masses[moltype] = []
+		elif line.startswith("moltype") and "=" in line and moltype is None:
+			blocks.append([int(line.split("=")[1].split()[0]), 0])
+		elif line.startswith("#molecules") and blocks and moltype is None:
+			blocks[-1][1] = int(line.split("=")[1])
+		elif moltype is not None and line.startswith("atom[") and " m=" in line:
+			moltype_masses[moltype].append(float(line.split(" m=")[1].split(",")[0]))
+	try:
+		masses = np.concatenate([np.tile(moltype_masses[block], count) for block, count in blocks])
+	except (KeyError, ValueError):
+		return None
+	return masses if masses.size else None
+
+def atom_mass(residue_name, atom_name):
+	# Guess of the mass of an atom from its name, and whether it is certain
+	name = atom_name.strip().lstrip("0123456789").upper()
+	residue = residue_name.strip().upper()
+	# Ions are residues named after their atom; two-letter elements are
+	# recognised only for them, since otherwise e.g. CA is an alpha carbon
+	if residue == name:
+		element = ion_elements.get(name, name)
+		if element in element_masses:
+			return element_masses[element], True
+		return element_masses.get(name[:1], element_masses['C']), False
+	return element_masses.get(name[:1], element_masses['C']), name[:1] in element_masses
+
+def read_box(box_line):
+	# Box vectors as rows; a triclinic box line holds
+	# v1(x) v2(y) v3(z) v1(y) v1(z) v2(x) v2(z) v3(x) v3(y)
+	values = [float(value) for value in box_line.split()]
+	box = np.diag(values[:3])
+	if len(values) == 9:
+		box[0, 1], box[0, 2], box[1, 0], box[1, 2], box[2, 0], box[2, 1] = values[3:]
+	return box
+
+def minimum_image(vectors, box):
+	# Shift the vectors by box vectors (the last one first, as GROMACS does
+	# for triclinic boxes) to their shortest periodic image
+	vectors = np.array(vectors, dtype=float)
+	for dim in (2, 1, 0):
+		if box[dim, dim] > 0:
+			vectors -= np.outer(np.round(vectors[..., dim] / box[dim, dim]), box[dim]).reshape(vectors.shape)
+	return vectors
+
+def read_gro_coordinates(frame_text, atoms):
+	# Coordinates of the selected (zero-based) atoms of a .gro frame and its
+	# box. The fixed-width fields are converted in one go; their width is set
+	# by the distance between the decimal points, as GROMACS reads them.
+	lines = frame_text.split(b"\n")
+	atom_count = int(lines[1])
+	first = lines[2][20:]
+	point = first.index(b".")
+	width = first.index(b".", point + 1) - point
+	fields = b"".join([lines[2 + atom][20:20 + 3 * width].ljust(3 * width) for atom in atoms])
+	coordinates = np.frombuffer(fields, dtype=f"S{width}").astype(float).reshape(-1, 3)
+	return coordinates, read_box(lines[2 + atom_count].decode())
+
+def group_centre(coordinates, weights, box):
+	# Make the group whole around its first atom before taking its centre
+	whole = coordinates[0] + minimum_image(coordinates - coordinates[0], box)
+	return weights @ whole
+
+def calculate_distance(frame):
+	coordinates, box = read_gro_coordinates(read_frame(frame), frame_atoms)
+	centre1 = group_centre(coordinates[:group_size1], weights1, box)
+	centre2 = group_centre(coordinates[group_size1:], weights2, box)
+	return np.linalg.norm(minimum_image(centre2 - centre1, box) * pull_dims)
+
+
+# The frames are read from the multi-frame archive or else from the
+# coordinate<N>.gro files of earlier versions
+frame_archive = None
+if os.path.isfile(os.path.join(args.frames, archive_name)):
+	frame_archive = FrameArchive(os.path.join(args.frames, archive_name))
+	frames = list(range(len(frame_archive)))
+else:
+	frames = sorted(frame for frame in map(frame_number, glob.glob(os.path.join(args.frames, "coordinate*.gro")))
+		if frame is not None)
+if not frames:
+	print(" Frames have not yet been extracted from the steered MDS trajectory!")
+	sys.exit(1)
+
+groups = read_index_groups(args.index)
+group1 = select_group(groups, args.group1 or read_mdp_value(args.mdp, "pull_group1_name"))
+group2 = select_group(groups, args.group2 or read_mdp_value(args.mdp, "pull_group2_name"))
+print(f" Calculating the COM distance between {group1[0]} ({len(group1[1])} atoms)"
+	f" and {group2[0]} ({len(group2[1])} atoms) in {len(frames)} frames\n")
+
+pull_dims = np.ones(3)
+if args.pull_dim:
+	pull_dim = (read_mdp_value(args.mdp, "pull_coord1_dim") or "Y Y Y").upper().split()
+	pull_dims = np.array([dim == "Y" for dim in pull_dim], dtype=float)
+
+# The atoms of both groups are read together; index files count from one
+frame_atoms = np.array(group1[1] + group2[1]) - 1
+group_size1 = len(group1[1])
+if args.weighting == "mass":
+	# The masses of the tpr file, as gmx distance uses; .gro files carry no
+	# masses, so without the tpr file they are guessed from the atom names
+	tpr_masses = read_tpr_masses(args.gmx, args.tpr)
+	if tpr_masses is not None and tpr_masses.size > frame_atoms.max():
+		masses = tpr_masses[frame_atoms]
+	else:
+		gro_lines = read_frame(frames[0]).decode().split("\n")
+		guesses = [atom_mass(gro_lines[2 + atom][5:10], gro_lines[2 + atom][10:15]) for atom in frame_atoms]
+		masses = np.array([mass for mass, _ in guesses])
+		uncertain = sorted({gro_lines[2 + atom][10:15].strip()
+			for atom, (_, certain) in zip(frame_atoms, guesses) if not certain})
+		print(f" The masses could not be read from {args.tpr}; they are guessed from the atom names.")
+		if uncertain:
+			print(f" The masses of these atoms are only a rough guess: {' '.join(uncertain)}\n"
+				" Use -s and -gmx to read the masses from the tpr file, or -w geometry.")
+		print("")
+else:
+	masses = np.ones(len(frame_atoms))
+weights1 = masses[:group_size1] / masses[:group_size1].sum()
+weights2 = masses[group_size1:] / masses[group_size1:].sum()
+
+distances = map_in_processes(calculate_distance, frames, args.workers)
+
+# Frame number and distance, as written by gmx distance with three decimals
+with open(args.output, "w") as summary:
+	summary.write("".join(f"{frame}\t{distance:.3f}\n" for frame, distance in zip(frames, distances)))
+
+print(f" Wrote out the COM distances of {len(frames)} frames to {args.output}\n")
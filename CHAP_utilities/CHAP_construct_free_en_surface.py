@@ -21,14 +21,15 @@ import matplotlib
 matplotlib.use('Cairo')
 from matplotlib import pyplot as plt
 import math
-import time
 import numpy as np
 import pandas
 import sys
 from mpl_toolkits.axes_grid1 import make_axes_locatable
+from CHAP_batch import headless, pause, confirm_to_proceed
 
 # Read in parameters for FES calculations
 print (" Reading in parameters for FES calculations"+"\n")
+xbin_custom, ybin_custom = None, None
 with open("CHAP_fes_Par.in") as in_par:
 	for parameter in in_par.readlines():
 		if "minPar1" in parameter:
@@ -67,7 +68,7 @@ with open("CHAP_fes_Par.in") as in_par:
 		elif "y_bin_count" in parameter:
 			para_data = parameter.rstrip('\n').split(",")
 			ybin_custom = int(para_data[1])
-time.sleep(2)
+pause(2)
 
 print (" Reading in data of order parameters"+"\n")
 # Initialize the order parameter lists
@@ -81,11 +82,11 @@ with open("OrderParameterPair.dat") as alldata:
 		data_point = str(line).split(",")
 		order_p1.append(float(data_point[0]))
 		order_p2.append(float(data_point[1]))
-time.sleep(2)
+pause(2)
 
 if "PCA-derived" in plotTitle:
 	print (" Binning and generating a 2D histogram"+"\n")
-	time.sleep(2)
+	pause(2)
 	# Range of data from order parameters
 	para1_range = para1_max - para1_min
 	para2_range = para2_max - para2_min
@@ -98,11 +99,11 @@ if "PCA-derived" in plotTitle:
 	# Create a 2D histogram using the numpy histogram2d function
 	hist, x_edges, y_edges = np.histogram2d(order_p1, order_p2, bins=(xbin, ybin), \
 		range=[[para1_min, para1_max], [para2_min, para2_max]])
-	time.sleep(2)
+	pause(2)
 
 else:
 	print (" Estimating the optimal number of bins"+"\n")
-	time.sleep(2)
+	pause(2)
 	# Determine the number of bins using the Freedman-Diaconis (1981) method
 	dist_p1 = pandas.Series(order_p1)
 	para1_max = dist_p1.max()
@@ -115,14 +116,14 @@ else:
 	bin_count1_p1 = int(np.ceil((para1_range) / bin_width_p1))
 	xbin = bin_count1_p1
 	print(f'  Number of bins deduced using the Freedman-Diaconis (1981) rule')
-	time.sleep(2)
+	pause(2)
 	print(f'\n    bin_count_x = {xbin}')
 
 	# Scott (1979) method
 	stdev1 = dist_p1.std()
 	bin_width_p1_scott = (3.5 * stdev1) / (len(dist_p1) ** (1 / 3))
 	bin_count1_p1_scott = int(np.ceil((para1_range) / bin_width_p1_scott))
-	time.sleep(1)
+	pause(1)
 
 	dist_p2 = pandas.Series(order_p2)
 	para2_max = dist_p2.max()
@@ -139,10 +140,12 @@ else:
 	stdev2 = dist_p2.std()
 	bin_width_p2_scott = (3.5 * stdev2) / (len(dist_p2) ** (1 / 3))
 	bin_count2_p2_scott = int(np.ceil((para2_range) / bin_width_p2_scott))
-	time.sleep(2)
+	pause(2)
 
-	with open("CHAP_fes_Par.in", "a") as in_par:
-		in_par.write(f'x_bin_count,{xbin}\ny_bin_count,{ybin}')
+	# A headless run uses the numbers of bins already set in CHAP_fes_Par.in
+	if not (headless and xbin_custom is not None and ybin_custom is not None):
+		with open("CHAP_fes_Par.in", "a") as in_par:
+			in_par.write(f'x_bin_count,{xbin}\ny_bin_count,{ybin}')
 
 	# Determine the number of bins using the sqrt method
 	num_of_bins_sqrt = int(np.ceil(math.sqrt(len(dist_p1))))
@@ -153,11 +156,7 @@ else:
 		\n\n Do you want to proceed?\n  (1) Yes\n  (2) No\n")
 
 	prmpt = " Enter a response here (1 or 2): "
-	response = int(input(prmpt))
-
-	while response != 1 and response != 2:
-		print("\n ENTRY REJECTED!\n **Please enter the appropriate option (1 or 2)\n")
-		response = int(input(prmpt))
+	response = confirm_to_proceed(prmpt)
 
 	with open("binning_summary.dat", "w") as bin_summary:
 		bin_summary.write(f"Binning Method\t  | Number of bins\n")
@@ -200,7 +199,7 @@ else:
 		# Create a 2D histogram using the numpy histogram2d function
 		hist, x_edges, y_edges = np.histogram2d(order_p1, order_p2, bins=(xbin, ybin), \
 			range=[[para1_min, para1_max], [para2_min, para2_max]])
-		time.sleep(2)
+		pause(2)
 
 print (" Identifying the highest probability bin"+"\n")
 # Flatten the 2D histogram into a 1D array
@@ -208,29 +207,32 @@ Prob = hist.flatten()
 
 # Identify the most populated bin
 max_bin = np.max(Prob)
-time.sleep(2)
+pause(2)
 
 # Constant -> product of kilocal conversion factor, Avogadro's number, Boltzmann constant & temperature
 RT = -0.001 * 6.02214E23 * 3.29763E-24 * Temp
 
 print (" Calculating delta_G values by Boltzmann inversion of the histogram"+"\n")
 
-# Initialize the dG array
-dG = np.zeros((xbin,ybin))
+# Estimate dG values by Boltzmann inversion of the whole histogram at once,
+# masking the empty bins to 10 kcal/mol
+empty_bins = (hist == 0)
+with np.errstate(divide='ignore'):
+	dG = np.where(empty_bins, 10.0, RT*(np.log(hist) - np.log(max_bin)))
+
+# Compute the grid of bin centres once
+x_centres = (2*para1_min+(2*np.arange(xbin)+1)*para1_range/xbin)/2
+y_centres = (2*para2_min+(2*np.arange(ybin)+1)*para2_range/ybin)/2
+x_grid, y_grid = np.meshgrid(x_centres, y_centres, indexing='ij')
 
-# Estimate dG values using Boltzmann inversion
+# Write out all bins in one bulk call, with a blank line after each populated bin
+line_ends = np.where(empty_bins, "\n", "\n\n")
 with open("OrderParameters1_2_dG.dat", "w") as dGoutFile:
-	for x in range(xbin):
-		for y in range(ybin):
-			if hist[x][y] == 0:
-				dG[x][y] = 10
-				dGoutFile.write((f"{(2*para1_min+(2*x+1)*para1_range/xbin)/2}\t{(2*para2_min+(2*y+1)*para2_range/ybin)/2}\t{dG[x][y]}\n"))
-				continue
-			else:
-				dG[x][y] = RT*(np.log(hist[x][y]) - np.log(max_bin))
-				dGoutFile.write((f"{(2*para1_min+(2*x+1)*para1_range/xbin)/2}\t{(2*para2_min+(2*y+1)*para2_range/ybin)/2}\t{dG[x][y]}\n"))
-				dGoutFile.write("\n")
-time.sleep(2)
+	dGoutFile.write("".join(
+		f"{x}\t{y}\t{G}{end}" for x, y, G, end in zip(x_grid.ravel().tolist(),
+		y_grid.ravel().tolist(), dG.ravel().tolist(), line_ends.ravel().tolist())
+		))
+pause(2)
 
 print (" Generating and saving FES plot")
 # Plot figure
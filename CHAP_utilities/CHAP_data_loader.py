@@ -0,0 +1,123 @@
+##########################################################################
+#  CHAP_data_loader.py -- Loading of the data and parameter files read   #
+#    by the analysis scripts of CHAPERONg                                #
+#  CHAP_data_loader.py is part of the CHAPERONg package                  #
+#  The functions are imported by the python scripts in CHAP_utilities    #
+#    that read GROMACS outputs, mdp files or lists of files              #
+#  CHAPERONg -- An automation program for GROMACS MD simulations and     #
+#    trajectory analyses                                                 #
+##########################################################################
+
+__author__  = 'Abeeb A. Yekeen'
+__email__   = 'contact@abeebyekeen.com'
+__date__    = '2026.10.17'
+__version__ = '1.0'
+__status__  = 'Production'
+
+import glob
+import hashlib
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+# Boltzmann constant in kJ mol-1 K-1
+boltzmann = 0.0083144626
+# Axis labels (xmgrace markup) of the energy units of the free energy scripts
+unit_labels = {'kJ': 'kJ mol\\S-1\\N', 'kCal': 'kcal mol\\S-1\\N', 'kT': 'k\\sB\\NT'}
+
+# Arrays already loaded in this run, keyed by their sidecar file
+loaded_data = {}
+
+
+def sidecar_file(data_file):
+	# Binary copy of a text data file, stored next to it. The name carries the
+	# size and a hash of the bytes of the text file, so a file that is written
+	# again with the same data (as CHAP_ana.sh does on every run) still finds
+	# its sidecar, while an edited file is parsed again.
+	digest = hashlib.blake2b(digest_size=8)
+	with open(data_file, 'rb') as text:
+		for block in iter(lambda: text.read(2**20), b''):
+			digest.update(block)
+	folder, name = os.path.split(os.path.abspath(data_file))
+	return os.path.join(folder, f'.{name}.{os.path.getsize(data_file)}-{digest.hexdigest()}.npy')
+
+def load_data(data_file):
+	# Read a numeric text file (one value per line, or the table of an xvg file)
+	# into a NumPy array. The text is parsed only once: later calls in the same
+	# run get the same (read-only) array, and later runs memory-map the .npy sidecar.
+	cache = sidecar_file(data_file)
+	if cache in loaded_data:
+		return loaded_data[cache]
+	data = None
+	if os.path.exists(cache):
+		try:
+			data = np.load(cache, mmap_mode='r')
+		except (OSError, ValueError):
+			data = None
+	if data is None:
+		data = np.loadtxt(data_file, comments=('#', '@'), ndmin=1)
+		data.flags.writeable = False
+		folder = os.path.dirname(cache)
+		for stale in glob.glob(os.path.join(folder, glob.escape(f'.{os.path.basename(data_file)}.') + '*.npy')):
+			try: os.remove(stale)
+			except OSError: pass
+		# A read-only folder only costs the cache
+		try: np.save(cache, data)
+		except OSError: pass
+	loaded_data[cache] = data
+	return data
+
+def read_mdp_value(mdp_file, key):
+	# Value of a key of an mdp file, or None if the key or the file is missing.
+	# mdp keys may be written with dashes or underscores.
+	key = key.replace("-", "_")
+	try:
+		with open(mdp_file) as mdp:
+			for line in mdp:
+				line = line.split(";")[0]
+				if "=" in line:
+					name, value = line.split("=", 1)
+					if name.strip().replace("-", "_") == key:
+						return value.strip() or None
+	except OSError:
+		pass
+	return None
+
+def read_mdp_number(mdp_file, key, default=None):
+	# First number of the value of a key of an mdp file (e.g. the temperature
+	# of the first coupling group of ref_t), or the default
+	value = read_mdp_value(mdp_file, key)
+	return float(value.split()[0]) if value else default
+
+def read_file_list(list_file):
+	# Names listed one per line, as in tpr_files.dat or pullx_files.dat
+	with open(list_file) as files:
+		return [line.strip() for line in files if line.strip()]
+
+def map_in_processes(function, items, workers=0):
+	# Results of function on every item, computed by up to workers processes
+	# (0 for all cores), each taking the items in a few chunks. The scripts run
+	# at the top level, so the workers must be forked, not spawned; where fork
+	# is not available the items are done serially.
+	items = list(items)
+	workers = min(workers if workers > 0 else (os.cpu_count() or 1), len(items))
+	if workers > 1 and 'fork' in multiprocessing.get_all_start_methods():
+		with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('fork')) as pool:
+			return list(pool.map(function, items, chunksize=max(1, len(items) // (4 * workers))))
+	return [function(item) for item in items]
+
+def write_xvg(xvg_file, creator, title, yaxis, columns, legends=()):
+	# Columns against the reaction coordinate as an xvg file, as GROMACS writes
+	# them; rows holding a NaN (e.g. bins without samples) are left out
+	with open(xvg_file, "w") as xvg:
+		xvg.write(f"# This file was created by {creator}\n"
+			f"@    title \"{title}\"\n@    xaxis  label \"\\xx\\f{{}} (nm)\"\n"
+			f"@    yaxis  label \"{yaxis}\"\n@TYPE xy\n")
+		if len(legends):
+			xvg.write("@ legend on\n")
+		xvg.write("".join(f"@ s{number} legend \"{legend}\"\n" for number, legend in enumerate(legends)))
+		rows = np.column_stack(columns)
+		rows = rows[~np.isnan(rows).any(axis=1)]
+		np.savetxt(xvg, rows, fmt="%e", delimiter="\t")
@@ -0,0 +1,147 @@
+######################################################################
+#  CHAP_frame_archive.py -- A python script to index and read the    #
+#    multi-frame .gro archive of the SMD frames                      #
+#  CHAP_frame_archive.py is part of the CHAPERONg package            #
+#  The functions are also imported by CHAP_calc_SMD_COM_dist.py      #
+#  CHAPERONg -- An automation program for GROMACS MD simulations and #
+#    trajectory analyses                                             #
+######################################################################
+
+__author__  = 'Abeeb A. Yekeen'
+__email__   = 'contact@abeebyekeen.com'
+__date__    = '2026.10.17'
+__version__ = '1.0'
+__status__  = 'Production'
+
+
+import argparse
+import os
+import sys
+
+import numpy as np
+
+# All SMD frames are kept in one multi-frame .gro file written by trjconv
+# (without -sep). The byte offset at which every frame starts is stored next
+# to it, so that any frame is read with one seek, and coordinate<N>.gro files
+# are written only for the frames that are actually needed.
+frames_folder = 'coordinates_SMD'
+archive_name = 'coordinates.gro'
+
+
+def offsets_file(archive):
+	return f'{archive}.offsets.npy'
+
+def skip_frame_lines(gro, atom_count):
+	# Skip the atom lines and the box line of a frame. The atom lines of a
+	# frame have the same length, so the box line is checked at the expected
+	# position first; the lines are only read one by one if it is not there.
+	start = gro.tell()
+	first_atom = gro.readline()
+	gro.seek(start + atom_count * len(first_atom))
+	box = gro.readline().split()
+	if len(box) in (3, 9) and all(value.replace(b'.', b'').replace(b'-', b'').isdigit() for value in box):
+		gro.seek(start + atom_count * len(first_atom) - 1)
+		if gro.read(1) == b'\n':
+			gro.readline()
+			return
+	gro.seek(start)
+	for _ in range(atom_count + 1):
+		gro.readline()
+
+def build_offsets(archive):
+	# Offsets of the frames, followed by the size of the archive
+	offsets = []
+	with open(archive, 'rb') as gro:
+		while True:
+			offset = gro.tell()
+			title = gro.readline()
+			if not title.strip():
+				break
+			offsets.append(offset)
+			skip_frame_lines(gro, int(gro.readline()))
+		offsets.append(offset)
+	return np.array(offsets, dtype=np.int64)
+
+def load_offsets(archive):
+	# Reuse the stored offsets unless the archive has changed since
+	index = offsets_file(archive)
+	if (os.path.exists(index) and os.path.getmtime(index) >= os.path.getmtime(archive)):
+		offsets = np.load(index)
+		if offsets.size > 0 and offsets[-1] == os.path.getsize(archive):
+			return offsets
+	offsets = build_offsets(archive)
+	# A read-only folder only costs the stored offsets
+	try: np.save(index, offsets)
+	except OSError: pass
+	return offsets
+
+class FrameArchive:
+	# Random access to the frames of a multi-frame .gro file
+	def __init__(self, archive):
+		self.archive = archive
+		self.offsets = load_offsets(archive)
+
+	def __len__(self):
+		return len(self.offsets) - 1
+
+	def read_frame(self, frame):
+		# Text of one frame, as the bytes of a single-frame .gro file
+		if not 0 <= frame < len(self):
+			raise IndexError(f'{self.archive} has no frame {frame} (frames 0 to {len(self) - 1})')
+		with open(self.archive, 'rb') as gro:
+			gro.seek(self.offsets[frame])
+			return gro.read(self.offsets[frame + 1] - self.offsets[frame])
+
+	def write_frame(self, frame, gro_file):
+		frame_text = self.read_frame(frame)
+		with open(gro_file, 'wb') as gro:
+			gro.write(frame_text)
+
+def frame_file(frame, folder=frames_folder):
+	return os.path.join(folder, f'coordinate{frame}.gro')
+
+def window_frames(config_list):
+	# Frame numbers of the umbrella windows in the first column of configuratns_list.txt
+	frames = []
+	with open(config_list) as configs:
+		for line in configs:
+			fields = line.split()
+			if fields and fields[0].isdigit():
+				frames.append(int(fields[0]))
+	return frames
+
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(
+		description="Index the multi-frame .gro archive of the SMD frames and write out single frames")
+	parser.add_argument("-a", "--archive", default=os.path.join(frames_folder, archive_name),
+		help=f"Multi-frame .gro archive (default: {frames_folder}/{archive_name})")
+	parser.add_argument("-l", "--config_list", default=None,
+		help="Write out the frames listed in this file, e.g. configuratns_list.txt")
+	parser.add_argument("-fr", "--frames", type=int, nargs="*", default=[],
+		help="Write out these frames")
+	parser.add_argument("--all", action="store_true",
+		help="Write out every frame")
+	args = parser.parse_args()
+
+	if not os.path.isfile(args.archive):
+		print(f" The SMD frame archive {args.archive} was not found!\n")
+		sys.exit(1)
+	frame_archive = FrameArchive(args.archive)
+	print(f" Indexed {len(frame_archive)} frames in {args.archive}\n")
+
+	frames = list(args.frames)
+	if args.config_list:
+		frames += window_frames(args.config_list)
+	if args.all:
+		frames = range(len(frame_archive))
+	folder = os.path.dirname(args.archive)
+	missing = sorted(frame for frame in set(frames) if not 0 <= frame < len(frame_archive))
+	if missing:
+		print(f" The archive has no frame(s) {', '.join(map(str, missing))}"
+			f" (frames 0 to {len(frame_archive) - 1})!\n")
+		sys.exit(1)
+	for frame in sorted(set(frames)):
+		frame_archive.write_frame(frame, frame_file(frame, folder))
+	if frames:
+		print(f" Wrote out {len(set(frames))} frame(s) as coordinate<N>.gro in {folder or '.'}\n")
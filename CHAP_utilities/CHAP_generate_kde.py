@@ -14,11 +14,14 @@ __date__    = '2023.01.16'
 __version__ = '1.0'
 __status__  = 'Production'
 
+import argparse
 import math
+import multiprocessing
 import os
 import shutil
 import sys
-import time
+from concurrent.futures import ProcessPoolExecutor
+from importlib.util import find_spec
 
 # def check_and_import_lib
 missingLib = []
@@ -30,7 +33,6 @@ except ModuleNotFoundError:
 else:
 	# Configure the non-interactive backend
 	matplotlib.use('AGG')
-	import matplotlib.pyplot as plt
 try:
 	import numpy as np
 except ModuleNotFoundError:
@@ -41,9 +43,8 @@ try:
 except ModuleNotFoundError:
 	print(" The pandas library has not been installed!\n")
 	missingLib.append("pandas")
-try:
-	import scipy.stats as st
-except ModuleNotFoundError:
+# scipy.stats is only imported by CHAP_kde_engine when a KDE method needs it
+if find_spec("scipy") is None:
 	print(" The scipy library has not been installed!\n")
 	missingLib.append("scipy")
 
@@ -66,6 +67,20 @@ if len(missingLib) >= 1 :
 		)
 	sys.exit(0)
 
+from CHAP_kde_engine import estimate_density, describe_kde_method, kde_methods
+from CHAP_kde_render import FigureRenderer, figure_spec, histogram_layer, render_worker_count
+from CHAP_data_loader import load_data
+from CHAP_batch import headless, pause, confirm_to_proceed
+
+# Create an argument parser
+parser = argparse.ArgumentParser(description="Estimate the PDF of the data with histograms and KDE")
+parser.add_argument("-nw", "--workers", type=int, default=0,
+	help="Number of processes rendering the figures (default: 0, i.e. all cores; 1 renders serially)")
+parser.add_argument("--parallel", action="store_true",
+	help="Process the datasets of a single-data plot in parallel, with the number of processes set by "
+	"--workers (full-auto or headless runs only)")
+args = parser.parse_args()
+
 def detect_specified_plot_type():
 # Read in the data for PDF estimation
 	print (" Detecting the type of plot specified by the user\n")
@@ -95,8 +110,9 @@ def make_dir_for_KDE(motherDir):
 
 # output_dict = {'files_to_move': [], 'files_to_copy': []}
 
-def estimate_PDF_with_KDE_single():
+def estimate_PDF_with_KDE_single(selected_lines=None):
 # Read in the data for PDF estimation
+# selected_lines restricts the run to some dataset lines (used by the parallel mode)
 	print (" Reading in parameters for density estimation\n")
 	with open("CHAP_kde_dataset_list.dat") as in_par:
 		alldatasets = in_par.readlines()
@@ -119,25 +135,21 @@ def estimate_PDF_with_KDE_single():
 				continue	
 			
 			elif int(lineNo) >= 4:
+				# Another process handles this dataset in the parallel mode
+				if selected_lines is not None and lineNo not in selected_lines:
+					continue
 				# input_data_raw = str(line).rstrip("\n")
 				input_data = str(line).rstrip("\n")
 				
-				data_in = []
 				extracted_data = f"{input_data}_Data.dat"
-				with open(extracted_data) as alldata:
-					alldata_lines = alldata.readlines()
-					for line in alldata_lines:
-						data_point = str(line).rstrip("\n")
-						data_in.append(float(data_point))
-
-				# Create a new figure
-				plt.figure()
+				data_in = load_data(extracted_data)
+
 				# Determine the number of bins automatically
 				print (
 					"#=============================================================================#\n"
 					f"\n Estimating the optimal number of histogram bins for {input_data}\n"
 					)
-				time.sleep(2)
+				pause(2)
 				# Determine the number of bins using the Freedman-Diaconis (1981) method
 				dist = pd.Series(data_in)
 				data_max, data_min = dist.max(), dist.min()
@@ -149,12 +161,13 @@ def estimate_PDF_with_KDE_single():
 				
 				bin_count = int(np.ceil((data_range) / bin_width))
 				print(f'  Number of bins deduced using the Freedman-Diaconis (1981) rule')
-				time.sleep(2)
+				pause(2)
 				print(f'\n    bin_count = {bin_count}')
 
 				def writeOut_parameters():
 					in_par.write(f'{input_data}\n'
 								f'bin_count,{bin_count}\n'
+								"kde_method,fft\n"
 								"bandwidth_method,silverman\n\n\n")					
 
 				# if int(lineNo) == 3 :
@@ -165,8 +178,10 @@ def estimate_PDF_with_KDE_single():
 				# 	with open("CHAP_kde_Par.in", "a") as in_par:
 				# 		writeOut_parameters()
 								
-				with open(f'CHAP_kde_Par_{input_data}.in', "w") as in_par:
-					writeOut_parameters()				
+				# A headless run reads the parameters of an existing file as they are
+				if not (headless and os.path.exists(f'CHAP_kde_Par_{input_data}.in')):
+					with open(f'CHAP_kde_Par_{input_data}.in', "w") as in_par:
+						writeOut_parameters()
 
 				output_and_para_files.append(f'CHAP_kde_Par_{input_data}.in')
 
@@ -174,7 +189,7 @@ def estimate_PDF_with_KDE_single():
 				stdev = dist.std()
 				bin_width_scott = (3.5 * stdev) / (len(dist) ** (1 / 3))
 				bin_count_scott = int(np.ceil((data_range) / bin_width_scott))
-				time.sleep(1)
+				pause(1)
 
 				# Determine the number of bins using the sqrt method
 				num_of_bins_sqrt = int(np.ceil(math.sqrt(len(dist))))
@@ -234,11 +249,12 @@ def estimate_PDF_with_KDE_single():
 						"----------------------------------\n\n\n"
 						)
 				
-				if int(lineNo) == 4:
+				# The parallel mode merges the summaries of all datasets at the end
+				if selected_lines is None and int(lineNo) == 4:
 					with open("kde_bins_estimated_summary.dat", "w") as bin_summary:
 						write_binning_parameters()
 
-				elif int(lineNo) > 4:
+				elif selected_lines is None and int(lineNo) > 4:
 					with open("kde_bins_estimated_summary.dat", "a") as bin_summary:
 						write_binning_parameters()
 						
@@ -252,14 +268,7 @@ def estimate_PDF_with_KDE_single():
 						)
 
 					prmpt = "  Enter a response here (1 or 2): "
-					response = int(input(prmpt))
-
-					while response != 1 and response != 2:
-						print(
-							"\n ENTRY REJECTED!"
-							"\n **Please enter the appropriate option (1 or 2)\n"
-							)
-						response = int(input(prmpt))
+					response = confirm_to_proceed(prmpt)
 				
 				elif auto_mode == 'full':
 					response = 1
@@ -269,7 +278,7 @@ def estimate_PDF_with_KDE_single():
 						"\n   To use a different number or estimator, run CHAPERONg in the semi-auto mode."
 						"\n   For details, see https://www.abeebyekeen.com/post-sim-analysis-2/"
 					)
-					time.sleep(2)
+					pause(2)
 
 				with open(f"kde_bins_estimated_{input_data}.dat", "w") as bin_summary:
 					write_binning_parameters()
@@ -280,12 +289,17 @@ def estimate_PDF_with_KDE_single():
 					sys.exit(0)
 				elif response == 1:
 					print ("\n Updating input parameters for density estimation\n")
-					time.sleep(2)
+					pause(2)
+					kde_method = 'fft'
 					with open(f"CHAP_kde_Par_{input_data}.in" , 'r') as in_par:
 						for parameter in in_par.readlines():
 							if "bin_count" in parameter:
 								para_data = parameter.rstrip('\n').split(",")
 								bin_custom = int(para_data[1].strip())
+							elif "kde_method" in parameter:
+								para_data = parameter.rstrip(' \n').split(",")
+								if para_data[1].strip() in kde_methods:
+									kde_method = para_data[1].strip()
 							elif "bandwidth_method" in parameter:
 								para_data = parameter.rstrip(' \n').split(",")
 								bandwt = para_data[1].strip()
@@ -296,7 +310,7 @@ def estimate_PDF_with_KDE_single():
 					bin_set = bin_custom
 
 				print (f" Generating and plotting the histogram of the {input_data}\n")
-				time.sleep(2)
+				pause(2)
 
 				# Generate and plot the histogram of the data
 				out_hist = input_data+"_histogram.xvg"
@@ -313,21 +327,18 @@ def estimate_PDF_with_KDE_single():
 					XaxisLabelXVG = r'SASA (nm\S2\N)'
 					XaxisLabelPNG = 'SASA' + r' ($nm^{2}$)'
 
-				plt.hist(data_in, bins=bin_set, label=input_data, color='#4CE418', alpha=0.9)
-				plt.xlabel(XaxisLabelPNG) # using Latex expression in matplotlib
-				plt.ylabel('Count')
-				plt.title("Histogram of the "+input_data)
+				bin_counts, bin_edges = np.histogram(data_in, bins=bin_set)
 				figname = input_data + "_histogram.png"
-				plt.savefig(figname, dpi=600)
+				renderer.submit(figure_spec(
+					figname,
+					[histogram_layer(bin_edges, bin_counts, label=input_data, color='#4CE418', alpha=0.9)],
+					XaxisLabelPNG, 'Count', "Histogram of the "+input_data, legend=False
+					))
 				
 				output_and_para_files.append(figname)
 
-				# Create a new figure for the KDE
-				plt.figure()
-
-				# Assign histogram to a value
-				a = plt.hist(data_in, density=True, bins=bin_set,
-							label=input_data, color='#4CE418', alpha=0.9)
+				# Histogram normalized to a density for the KDE plot
+				a = np.histogram(data_in, bins=bin_edges, density=True)
 
 				# The first elements are the ys, the second are the xs.
 				# ys = a[0]; xs = a[1]
@@ -338,7 +349,7 @@ def estimate_PDF_with_KDE_single():
 
 				# Get the upper bounds and write out the histogram
 				print (f" Writing out the histogram data of the {input_data}\n")
-				time.sleep(2)
+				pause(2)
 
 				def write_out_plot_files(
 					outfile, Keycontent, title, XaxisLabel, YaxisLabel, graphType, lineSetting
@@ -367,16 +378,18 @@ def estimate_PDF_with_KDE_single():
 				output_and_para_files.append(out_hist)
 
 				print (f" Estimating the probability density function for {input_data}\n")
-				time.sleep(2)
-				kde_xs = np.linspace(min(data_in), max(data_in), 300)
-				kde = st.gaussian_kde(data_in, bw_method=bandwidth)
-				kde_ys = kde.pdf(kde_xs)
+				pause(2)
+				kde_xs = np.linspace(data_in.min(), data_in.max(), 300)
+				kde_ys, kde_error = estimate_density(data_in, bandwidth, kde_xs, kde_method)
+				kde_note = describe_kde_method(kde_method, kde_error)
+				print (f"  Density evaluated with the {kde_note}\n")
 				out_kde = input_data+"_KDEdata.xvg"
 				with open (out_kde, 'w') as out_kde_file:
 					write_out_plot_files(
 						out_kde_file, 'KDE-estimated PDF', 'KDE-estimated Probability Density',
 						XaxisLabelXVG, 'Density', 'xy', ''
-						)					
+						)
+					out_kde_file.write(f'# Density evaluated with the {kde_note}\n')
 					
 				pd.DataFrame({'x':kde_xs, 'y': kde_ys}).to_csv(out_kde,
 								header=False, index=False, sep="\t", mode='a')
@@ -384,13 +397,13 @@ def estimate_PDF_with_KDE_single():
 				output_and_para_files.append(out_kde)
 
 				kdeLabel = input_data + "_PDF"
-				plt.plot(kde_xs, kde.pdf(kde_xs), label=kdeLabel, color='r')
-				plt.legend()
-				plt.ylabel("Density")
-				plt.xlabel(XaxisLabelPNG)
-				plt.title(f'Kernel Density Estimation Plot of the {input_data}')
 				figname = input_data + "_KDE_plot.png"
-				plt.savefig(figname, dpi=600)
+				renderer.submit(figure_spec(
+					figname,
+					[histogram_layer(a[1], a[0], label=input_data, color='#4CE418', alpha=0.9),
+					('plot', (kde_xs, kde_ys), dict(label=kdeLabel, color='r'))],
+					XaxisLabelPNG, "Density", f'Kernel Density Estimation Plot of the {input_data}'
+					))
 
 				output_and_para_files.append(figname)
 
@@ -400,6 +413,8 @@ def estimate_PDF_with_KDE_single():
 			output_and_para_files.append(extracted_data)
 			dataOutPath=f'Kernel_Density_Estimation/{input_data}'
 			# dataOutPath_old=f'{motherDir}/{input_data}'
+			# Figures must be saved before they are moved
+			renderer.wait()
 			make_dir_for_KDE(dataOutPath)
 			for file in output_and_para_files:
 				try: shutil.move(file, dataOutPath)
@@ -408,6 +423,37 @@ def estimate_PDF_with_KDE_single():
 			# 	try: shutil.copy2(file, dataOutPath)
 			# 	except FileNotFoundError: pass				
 
+def datasets_for_parallel_run():
+	# List the (line number, name) of the datasets of a single-data plot, or
+	# return None if the datasets have to be processed one after another
+	with open("CHAP_kde_dataset_list.dat") as in_par:
+		alldatasets = in_par.readlines()
+	if "auto mode" in alldatasets[0] and alldatasets[0].rstrip("\n").split(",")[1] == 'semi' \
+		and not headless:
+		print (" The datasets are processed one after another in the semi-auto mode\n")
+		return None
+	if 'fork' not in multiprocessing.get_all_start_methods():
+		return None
+	return [(lineNo, str(line).rstrip("\n")) for lineNo, line in enumerate(alldatasets)
+			if lineNo >= 4 and str(line).strip() != '']
+
+def estimate_PDF_with_KDE_parallel(datasets, workers):
+	# The datasets are independent: each is processed in its own process and
+	# their binning summaries are merged in the original order at the end
+	workers = min(render_worker_count(workers), len(datasets))
+	print (f" Processing {len(datasets)} datasets in {workers} parallel processes\n")
+	with ProcessPoolExecutor(max_workers=workers,
+							mp_context=multiprocessing.get_context('fork')) as pool:
+		runs = [pool.submit(estimate_PDF_with_KDE_single, {lineNo}) for lineNo, _ in datasets]
+		for run in runs:
+			run.result()
+
+	with open("kde_bins_estimated_summary.dat", "w") as bin_summary:
+		for lineNo, input_data in datasets:
+			dataset_summary = f'Kernel_Density_Estimation/{input_data}/kde_bins_estimated_{input_data}.dat'
+			with open(dataset_summary) as dataset_bins:
+				bin_summary.write(dataset_bins.read())
+
 # Functions for multi-plot kde
 def store_data_label_name():
 	# Read in the data and label
@@ -440,23 +486,20 @@ output_and_para_files = []
 # def estimate_PDF_with_KDE_multiplot():
 def plot_multidata_hist(dataName, input_data_dict):
 	data_count = 1
-	plt.figure() # Create a new figure
+	hist_layers = []
+	# A headless run reads the parameters of an existing file as they are
+	keep_par_file = headless and os.path.exists("CHAP_kde_Par.in")
 	for key, value in input_data_dict.items():
 		dataLabel = key
 		extracted_data = value
-		data_in = []
-		with open(extracted_data) as alldata:
-			alldata_lines = alldata.readlines()
-			for line in alldata_lines:
-				data_point = str(line).rstrip("\n")
-				data_in.append(float(data_point))
+		data_in = load_data(extracted_data)
 
 		# Determine the number of bins automatically
 		print (
 			"#=============================================================================#\n"
 			f"\n Estimating the optimal number of histogram bins for {dataLabel}\n"
 			)
-		time.sleep(2)
+		pause(2)
 		# Determine the number of bins using the Freedman-Diaconis (1981) method
 		dist = pd.Series(data_in)
 		data_max, data_min = dist.max(), dist.min()
@@ -467,22 +510,23 @@ def plot_multidata_hist(dataName, input_data_dict):
 		bin_width = (2 * iqr) / (len(dist) ** (1 / 3))
 		bin_count = int(np.ceil((data_range) / bin_width))
 		print(f'  Number of bins deduced using the Freedman-Diaconis (1981) rule')
-		time.sleep(2)
+		pause(2)
 		print(f'\n    bin_count = {bin_count}')
 
 		def writeOut_parameters():
 			in_par.write(
 				f'{dataLabel}\n'
 				f'bin_count,{bin_count}\n'
+				"kde_method,fft\n"
 				"bandwidth_method,silverman\n\n"
 				)			
 
-		if data_count == 1 :
+		if data_count == 1 and not keep_par_file :
 			with open("CHAP_kde_Par.in", "w") as in_par:
 				in_par.write(f'=>{dataName}\n')
 				writeOut_parameters()
 
-		elif data_count > 1 :
+		elif data_count > 1 and not keep_par_file :
 			with open("CHAP_kde_Par.in", "a") as in_par:
 				writeOut_parameters()				
 
@@ -492,7 +536,7 @@ def plot_multidata_hist(dataName, input_data_dict):
 		stdev = dist.std()
 		bin_width_scott = (3.5 * stdev) / (len(dist) ** (1 / 3))
 		bin_count_scott = int(np.ceil((data_range) / bin_width_scott))
-		time.sleep(1)
+		pause(1)
 
 		# Determine the number of bins using the sqrt method
 		num_of_bins_sqrt = int(np.ceil(math.sqrt(len(dist))))
@@ -530,14 +574,7 @@ def plot_multidata_hist(dataName, input_data_dict):
 				)
 
 			prmpt = "  Enter a response here (1 or 2): "
-			response = int(input(prmpt))
-
-			while response != 1 and response != 2:
-				print(
-					"\n ENTRY REJECTED!"
-					"\n **Please enter the appropriate option (1 or 2)\n"
-					)
-				response = int(input(prmpt))
+			response = confirm_to_proceed(prmpt)
 
 		elif auto_mode == 'full':
 			response = 1
@@ -547,22 +584,25 @@ def plot_multidata_hist(dataName, input_data_dict):
 				"\n   To use a different number or estimator, run CHAPERONg in the semi-auto mode."
 				"\n   For details, see https://www.abeebyekeen.com/post-sim-analysis-2/"
 			)
-			time.sleep(2)
+			pause(2)
 
 		if response == 2:
 			sys.exit(0)
 		elif response == 1:
 			print ("\n Updating input parameters for density estimation\n")
-			time.sleep(2)
+			pause(2)
+			# The bin counts are listed in the order of the datasets; a kept
+			# (headless) file also holds those of the datasets after this one
+			bin_custom = []
 			with open("CHAP_kde_Par.in" , 'r') as in_par:
 				for parameter in in_par.readlines():
 					if "bin_count" in parameter:
 						para_data = parameter.rstrip('\n').split(",")
-						bin_custom = int(para_data[1].strip())
-			bin_set = bin_custom
+						bin_custom.append(int(para_data[1].strip()))
+			bin_set = bin_custom[data_count - 1]
 
 			print (f" Generating and plotting the histogram of the {dataLabel}\n")
-			time.sleep(2)
+			pause(2)
 		
 			if "RMSD" in dataName: 
 				XaxisLabelXVG = r'RMSD (\cE\C)' 
@@ -578,7 +618,10 @@ def plot_multidata_hist(dataName, input_data_dict):
 				XaxisLabelPNG = 'SASA' + r' ($nm^{2}$)'
 
 			# Generate and plot the histogram of the data
-			histo = plt.hist(data_in, bins=bin_set, label=dataLabel, alpha=0.8)
+			histo_counts, histo_edges = np.histogram(data_in, bins=bin_set)
+			# Counts as floats, as returned by plt.hist
+			histo = (histo_counts.astype(float), histo_edges)
+			hist_layers.append(histogram_layer(histo[1], histo[0], label=dataLabel, alpha=0.8))
 
 			# The first elements are the ys, the second are the xs.
 			# ys = histo[0]; xs = histo[1]
@@ -612,14 +655,12 @@ def plot_multidata_hist(dataName, input_data_dict):
 			data_count += 1
 
 	print (f" Generating the combined histogram plots of the {dataName}\n")
-	time.sleep(2)
+	pause(2)
 	
-	plt.xlabel(XaxisLabelPNG) # using Latex expression in matplotlib
-	plt.ylabel('Count')
-	plt.legend()
-	plt.title("Histogram of the " + dataName)
 	figname = dataName + "_histogram_multi_plot.png"
-	plt.savefig(figname, dpi=600)
+	renderer.submit(figure_spec(
+		figname, hist_layers, XaxisLabelPNG, 'Count', "Histogram of the " + dataName
+		))
 		
 	output_and_para_files.append(figname)
 	return dataName, XaxisLabelXVG, XaxisLabelPNG
@@ -628,14 +669,18 @@ def estimate_PDF_with_KDE_multiplot(dataName, XaxisLabelXVG, XaxisLabelPNG):
 	data_count = 1
 	bins_number_dict = {}
 	bandwidth_dict = {}
+	kde_method_dict = {}
 	bins_number_count = 1
 	print (f" Extracting pre-calculated number of bins for plotting histogram\n")
-	time.sleep(2)	
+	pause(2)	
 	with open('CHAP_kde_Par.in', 'r') as in_par:
 		for line in in_par.readlines():
 			if "bin_count" in line:
 				bin_w = line.rstrip("\n").split(",")
 				bins_number_dict[bins_number_count] = bin_w[1]
+			elif "kde_method" in line:
+				kde_m = line.rstrip(" \n").split(",")
+				kde_method_dict[bins_number_count] = kde_m[1].strip()
 			elif "bandwidth_method" in line:
 				band_w = line.rstrip("\n").split(",")
 				bandwidth_dict[bins_number_count] = band_w[1]
@@ -644,36 +689,37 @@ def estimate_PDF_with_KDE_multiplot(dataName, XaxisLabelXVG, XaxisLabelPNG):
 	# Reset bin count
 	bins_number_count2 = 1
 
-	plt.figure() # Create a new figure for KDE
-
+	kde_layers = []
 	for key, value in input_data_dict.items():
 		dataLabel = key
 		extracted_data = value
-		data_in = []
-		with open(extracted_data, 'r') as alldata:
-			alldata_lines = alldata.readlines()
-			for line in alldata_lines:
-				data_point = str(line).rstrip("\n")
-				data_in.append(float(data_point))
+		data_in = load_data(extracted_data)
 
 		bin_set = int(bins_number_dict[bins_number_count2])
 		bandwidth = bandwidth_dict[bins_number_count2]
+		if (bandwidth.strip().isalpha()) == True :
+			bandwidth = bandwidth.strip()
+		elif (bandwidth.strip().isalpha()) == False :
+			bandwidth = float(bandwidth)
+		kde_method = kde_method_dict.get(bins_number_count2, 'fft')
+		if kde_method not in kde_methods : kde_method = 'fft'
 		bins_number_count2 += 1
 		print(f'  Number of bins deduced using the Freedman-Diaconis (1981) rule')
-		time.sleep(2)
+		pause(2)
 		print(f'\n    bin_count = {bin_set}\n    bandwidth = {bandwidth}')
 
 		# Generate and plot the histogram of the data
-		plt.hist(data_in, density=True, bins=bin_set, label=dataLabel, alpha=0.6)
+		histo = np.histogram(data_in, bins=bin_set, density=True)
+		kde_layers.append(histogram_layer(histo[1], histo[0], label=dataLabel, alpha=0.6))
 
 		print (f"\n Estimating the probability density function for {dataLabel}\n")
-		time.sleep(2)
-		kde_xs = np.linspace(min(data_in), max(data_in), 300)
-		kde = st.gaussian_kde(data_in, bw_method=bandwidth)
-		kde_ys = kde.pdf(kde_xs)
+		pause(2)
+		kde_xs = np.linspace(data_in.min(), data_in.max(), 300)
+		kde_ys, kde_error = estimate_density(data_in, bandwidth, kde_xs, kde_method)
+		kde_note = describe_kde_method(kde_method, kde_error)
+		print (f"  Density evaluated with the {kde_note}\n")
 		kdeLabel = dataLabel + "_PDF"
-		plt.plot(kde_xs, kde.pdf(kde_xs), label=kdeLabel)
-		plt.legend()
+		kde_layers.append(('plot', (kde_xs, kde_ys), dict(label=kdeLabel)))
 
 		out_kde = dataLabel + "_KDEdata.xvg"
 		with open (out_kde, 'w') as out_kde_file:
@@ -685,6 +731,7 @@ def estimate_PDF_with_KDE_multiplot(dataName, XaxisLabelXVG, XaxisLabelPNG):
 				'@    yaxis  label "Density"\n'
 				'@TYPE xy\n'
 				f'@ s0 legend "{dataLabel}_PDF"\n'
+				f'# Density evaluated with the {kde_note}\n'
 				)
 			
 		pd.DataFrame({'x':kde_xs, 'y': kde_ys}).to_csv(
@@ -694,14 +741,14 @@ def estimate_PDF_with_KDE_multiplot(dataName, XaxisLabelXVG, XaxisLabelPNG):
 		output_and_para_files.append(out_kde)
 		# Increase counter for additional data
 		data_count += 1
-		plt.ylabel("Density")
-		plt.xlabel(XaxisLabelPNG)
 
 		output_and_para_files.append(value)
 
-	plt.title(f'Kernel Density Estimation Plots of {dataName} Data')
 	figname = dataName + "_KDE_multi_plot.png"
-	plt.savefig(figname, dpi=600)
+	renderer.submit(figure_spec(
+		figname, kde_layers, XaxisLabelPNG, "Density",
+		f'Kernel Density Estimation Plots of {dataName} Data'
+		))
 	
 	output_and_para_files.append(figname)
 
@@ -709,6 +756,8 @@ def estimate_PDF_with_KDE_multiplot(dataName, XaxisLabelXVG, XaxisLabelPNG):
 			"#=============================================================================#\n")
 
 	output_and_para_files.append('CHAP_kde_Par.in')
+	# Figures must be saved before they are moved
+	renderer.wait()
 	for file in output_and_para_files:
 		try: shutil.move(file, './Kernel_Density_Estimation_multi_plot')
 		except: pass
@@ -721,13 +770,21 @@ def sort_data(motherDir):
 
 # Call functions
 detect_specified_plot_type()
+parallel_datasets = None
+if plot_type == "single-data plot" and args.parallel:
+	parallel_datasets = datasets_for_parallel_run()
+# The dataset processes of the parallel mode render their own figures
+renderer = FigureRenderer(1 if parallel_datasets else args.workers)
 
 # motherDir_out = make_dir_for_KDE(motherDir)
 
 if plot_type == "single-data plot" :
 	motherDir='Kernel_Density_Estimation'
 	make_dir_for_KDE(motherDir)
-	estimate_PDF_with_KDE_single()
+	if parallel_datasets:
+		estimate_PDF_with_KDE_parallel(parallel_datasets, args.workers)
+	else:
+		estimate_PDF_with_KDE_single()
 	sort_data(motherDir)
 elif plot_type == "multi-data plot" :
 	motherDir='Kernel_Density_Estimation_multi_plot'
@@ -748,3 +805,5 @@ elif plot_type == "multi-data plot" :
 			shutil.move(outdir, backupDir)
 		os.rename("Kernel_Density_Estimation_multi_plot", outdir)
 	except: pass
+
+renderer.close()
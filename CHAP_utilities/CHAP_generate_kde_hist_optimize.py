@@ -16,11 +16,11 @@ __version__ = '1.0'
 __status__  = 'Production'
 
 
+import argparse
 import math
 import os
 import shutil
 import sys
-import time
 
 # def check_and_import_lib
 missingLib = []
@@ -32,7 +32,6 @@ except ModuleNotFoundError:
 else:
 	# Configure the non-interactive backend
 	matplotlib.use('AGG')
-	import matplotlib.pyplot as plt
 try:
 	import numpy as np
 except ModuleNotFoundError:
@@ -68,6 +67,22 @@ if len(missingLib) >= 1 :
 		)
 	sys.exit(0)
 
+from CHAP_kde_engine import estimate_density, describe_kde_method, histogram_from_sorted, \
+	histogram_bin_costs, kde_methods
+from CHAP_kde_render import FigureRenderer, figure_spec, histogram_layer
+from CHAP_data_loader import load_data
+from CHAP_batch import headless, pause, confirm_to_proceed
+
+# Ways of choosing among the candidate numbers of bins: render them all
+# (sweep) or rank them by the Shimazaki-Shinomoto or cross-validation cost
+bin_selection_modes = ('sweep', 'shimazaki', 'cv')
+
+# Create an argument parser
+parser = argparse.ArgumentParser(description="Optimize the number of histogram bins for PDF and KDE")
+parser.add_argument("-nw", "--workers", type=int, default=0,
+	help="Number of processes rendering the figures (default: 0, i.e. all cores; 1 renders serially)")
+args = parser.parse_args()
+
 def detect_specified_plot_type():
 # Read in the data for PDF estimation
 	print (" Detecting the type of plot specified by the user\n")
@@ -97,9 +112,60 @@ def make_dir_for_KDE(motherDir):
 
 # output_dict = {'files_to_move': [], 'files_to_copy': []}
 
+def rank_bin_counts(sorted_data, candidates, bin_selection, top_k,
+					input_data, dataName, output_and_para_files):
+	# Compute the cost of every candidate number of bins, write out the
+	# cost-vs-bins table and curve, and return the best-ranked numbers of bins
+	if np.any(candidates < 1):
+		print("  The range of test values provided results to a negative number of bins!\n"
+			"  Skipping the non-positive numbers of bins!!\n"
+			)
+		candidates = candidates[candidates >= 1]
+	if len(candidates) == 0:
+		print("  None of the tested numbers of bins is positive!\n"
+			"  Adjust the range of test values and try again!!\n"
+			)
+		sys.exit(1)
+	if bin_selection == 'shimazaki':
+		cost_name = 'Shimazaki-Shinomoto cost'
+	elif bin_selection == 'cv':
+		cost_name = 'Cross-validation risk'
+	print (f" Computing the {cost_name} of {len(candidates)} numbers of bins for {input_data}\n")
+	bin_costs = histogram_bin_costs(sorted_data, candidates, bin_selection)
+	ranked = candidates[np.argsort(bin_costs, kind='stable')]
+	print (f"  Optimal number of bins for {input_data}: {ranked[0]}\n")
+
+	out_cost = f'{input_data}_bin_cost.xvg'
+	with open(out_cost, 'w') as out_cost_file:
+		out_cost_file.write(
+			f'# This file contains the {cost_name} of the histogram of the {input_data}'
+			'\n# data for each tested number of bins, calculated by CHAPERONg\n'
+			f'# Optimal number of bins: {ranked[0]}\n#\n'
+			f'@    title "{cost_name} of the histogram of {input_data}"\n'
+			'@    xaxis  label "Number of bins"\n'
+			f'@    yaxis  label "{cost_name}"\n'
+			'@TYPE xy\n'
+			f'@ s0 legend "{dataName}_{input_data}"\n'
+			)
+		np.savetxt(out_cost_file, np.column_stack((candidates, bin_costs)),
+					fmt=['%d', '%.8g'], delimiter="\t")
+	output_and_para_files.append(out_cost)
+
+	figname = f'{input_data}_bin_cost.png'
+	renderer.submit(figure_spec(
+		figname,
+		[('plot', (candidates, bin_costs), dict(color='#4CE418')),
+		('axvline', (ranked[0],), dict(color='r', linestyle='--', label=f'Optimum: {ranked[0]} bins'))],
+		'Number of bins', cost_name, f'{cost_name} of the histogram of the {input_data}'
+		))
+	output_and_para_files.append(figname)
+
+	return ranked[:top_k]
+
 def estimate_PDF_with_KDE_single():
 # Read in the data for PDF estimation
 	print (" Reading in parameters for density estimation\n")
+	bin_selection, top_k = 'sweep', 1
 	with open("CHAP_kde_dataset_list.dat") as in_par:
 		alldatasets = in_par.readlines()
 		for lineNo, line in enumerate(alldatasets):
@@ -116,9 +182,14 @@ def estimate_PDF_with_KDE_single():
 
 			# Assign the range for hist optimization
 			elif int(lineNo) == 2 and "bin_number_range" in line:
-				bin_number_series = str(line).rstrip("\n").split(",")
-				bin_number_series = math.ceil(float(bin_number_series[1]))
+				bin_number_raw = str(line).rstrip("\n").split(",")
+				bin_number_series = math.ceil(float(bin_number_raw[1]))
 				bin_number_series = int(bin_number_series)
+				# Optional selection mode and number of best-ranked histograms to render
+				if len(bin_number_raw) > 2 and bin_number_raw[2].strip() in bin_selection_modes:
+					bin_selection = bin_number_raw[2].strip()
+				if len(bin_number_raw) > 3 and bin_number_raw[3].strip() != '':
+					top_k = max(int(bin_number_raw[3]), 1)
 				continue
 
 			# Save the name of the input data in a variable
@@ -131,13 +202,8 @@ def estimate_PDF_with_KDE_single():
 				# input_data_raw = str(line).rstrip("\n")
 				input_data = str(line).rstrip("\n")
 				
-				data_in = []
 				extracted_data = f"{input_data}_Data.dat"
-				with open(extracted_data) as alldata:
-					alldata_lines = alldata.readlines()
-					for line in alldata_lines:
-						data_point = str(line).rstrip("\n")
-						data_in.append(float(data_point))
+				data_in = load_data(extracted_data)
 
 				# Create a new figure
 				# plt.figure()
@@ -146,7 +212,7 @@ def estimate_PDF_with_KDE_single():
 					"#=============================================================================#\n"
 					f"\n Estimating the optimal number of histogram bins for {input_data}\n"
 					)
-				time.sleep(2)
+				pause(2)
 				# Determine the number of bins using the Freedman-Diaconis (1981) method
 				dist = pd.Series(data_in)
 				data_max, data_min = dist.max(), dist.min()
@@ -158,12 +224,13 @@ def estimate_PDF_with_KDE_single():
 				
 				bin_count = int(np.ceil((data_range) / bin_width))
 				print(f'  Number of bins deduced using the Freedman-Diaconis (1981) rule')
-				time.sleep(2)
+				pause(2)
 				print(f'\n    bin_count = {bin_count}')
 
 				def writeOut_parameters():
 					in_par.write(f'{input_data}\n'
 								f'bin_count,{bin_count}\n'
+								"kde_method,fft\n"
 								"bandwidth_method,silverman\n\n\n")					
 
 				# if int(lineNo) == 3 :
@@ -174,8 +241,10 @@ def estimate_PDF_with_KDE_single():
 				# 	with open("CHAP_kde_Par.in", "a") as in_par:
 				# 		writeOut_parameters()
 								
-				with open(f'CHAP_kde_Par_{input_data}.in', "w") as in_par:
-					writeOut_parameters()				
+				# A headless run reads the parameters of an existing file as they are
+				if not (headless and os.path.exists(f'CHAP_kde_Par_{input_data}.in')):
+					with open(f'CHAP_kde_Par_{input_data}.in', "w") as in_par:
+						writeOut_parameters()
 
 				output_and_para_files.append(f'CHAP_kde_Par_{input_data}.in')
 
@@ -183,7 +252,7 @@ def estimate_PDF_with_KDE_single():
 				stdev = dist.std()
 				bin_width_scott = (3.5 * stdev) / (len(dist) ** (1 / 3))
 				bin_count_scott = int(np.ceil((data_range) / bin_width_scott))
-				time.sleep(1)
+				pause(1)
 
 				# Determine the number of bins using the sqrt method
 				num_of_bins_sqrt = int(np.ceil(math.sqrt(len(dist))))
@@ -228,28 +297,26 @@ def estimate_PDF_with_KDE_single():
 						)
 
 					prmpt = "  Enter a response here (1 or 2): "
-					response = int(input(prmpt))
-
-					while response != 1 and response != 2:
-						print(
-							"\n ENTRY REJECTED!"
-							"\n **Please enter the appropriate option (1 or 2)\n"
-							)
-						response = int(input(prmpt))
+					response = confirm_to_proceed(prmpt)
 				
 				elif auto_mode == 'full':
 					response = 1
 					bin_number_series_2x = bin_number_series*2
+					if bin_selection == 'sweep':
+						histo_note = (f'a total of {bin_number_series_2x} histograms will be'
+							"\n   generated for you to identify the best number of bins for your data.")
+					else:
+						histo_note = (f'the cost of {bin_number_series_2x} numbers of bins will be'
+							f"\n   computed and the {top_k} best-ranked histogram(s) generated for your data.")
 					print(
 						"\n   Since CHAPERONg is running in the full-auto mode, the number of bins"
 						"\n   estimated above will be used."
-						f'\n   This is a histogram optimization run, a total of {bin_number_series_2x} histograms will be'
-						"\n   generated for you to identify the best number of bins for your data."
+						f'\n   This is a histogram optimization run, {histo_note}'
 						"\n   To use a different number as the starting point for the number of bins, run "
 						"\n   CHAPERONg in the semi-auto mode."
 						"\n   For more details, see https://www.abeebyekeen.com/post-sim-analysis-2/"
 					)
-					time.sleep(3)
+					pause(3)
 
 				with open(f"kde_bins_estimated_{input_data}.dat", "w") as bin_summary:
 					write_binning_parameters()
@@ -260,12 +327,17 @@ def estimate_PDF_with_KDE_single():
 					sys.exit(0)
 				elif response == 1:
 					print ("\n Updating input parameters for density estimation\n")
-					time.sleep(2)
+					pause(2)
+					kde_method = 'fft'
 					with open(f"CHAP_kde_Par_{input_data}.in" , 'r') as in_par:
 						for parameter in in_par.readlines():
 							if "bin_count" in parameter:
 								para_data = parameter.rstrip('\n').split(",")
 								bin_custom = int(para_data[1].strip())
+							elif "kde_method" in parameter:
+								para_data = parameter.rstrip(' \n').split(",")
+								if para_data[1].strip() in kde_methods:
+									kde_method = para_data[1].strip()
 							elif "bandwidth_method" in parameter:
 								para_data = parameter.rstrip(' \n').split(",")
 								bandwt = para_data[1].strip()
@@ -276,7 +348,7 @@ def estimate_PDF_with_KDE_single():
 					bin_set = bin_custom
 
 				print (f" Generating and plotting the histogram of the {input_data}\n")
-				time.sleep(1)
+				pause(1)
 
 				# Generate and plot the histogram of the data
 				if "RMSD" in input_data: 
@@ -288,105 +360,59 @@ def estimate_PDF_with_KDE_single():
 				elif "SASA" in input_data:
 					XaxisLabelPNG = 'SASA' + r' ($nm^{2}$)'
 				
+				# The density curve does not depend on the number of bins,
+				# so it is estimated only once for the whole sweep
+				print (f" Estimating the probability density function for {input_data}\n")
+				kde_xs = np.linspace(data_in.min(), data_in.max(), 300)
+				kde_ys, kde_error = estimate_density(data_in, bandwidth, kde_xs, kde_method)
+				print (f"  Density evaluated with the {describe_kde_method(kde_method, kde_error)}\n")
+				kdeLabel = input_data + "_PDF"
+
+				# All candidate histograms are counted from one sorted copy of the data
+				sorted_data = np.sort(data_in)
+
 				histo_count = 0
 				bin_number_series_upper = bin_set + bin_number_series
 				bin_number_series_lower = bin_set - bin_number_series
-				for i in range (bin_number_series_lower,bin_number_series_upper,1):
-					plt.close()
-					plt.figure()
-					bin_set = i
+				bins_to_render = np.arange(bin_number_series_lower, bin_number_series_upper)
+				if bin_selection != 'sweep':
+					bins_to_render = rank_bin_counts(
+						sorted_data, bins_to_render, bin_selection, top_k,
+						input_data, dataName, output_and_para_files
+						)
+				for i in bins_to_render:
+					bin_set = int(i)
 					if histo_count == 0 or histo_count % 20 == 0:
 						print (f" Generating histogram with number of bins set to {bin_set}\n  .\n  .\n  .\n")
-					if bin_set ==  bin_number_series_upper - 1 :
+					if bin_set == bins_to_render[-1] :
 						print (f" Generating histogram with number of bins set to {bin_set}\n")
-					try:
-						plt.hist(data_in, bins=bin_set, label=input_data, color='#4CE418', alpha=0.9)
-					except ValueError:
+					if bin_set < 1:
 						print("  The range of test values provided results to a negative number of bins!\n"
-	    					"  Skipping current iteration!!\n"
+							"  Skipping current iteration!!\n"
 							)
-						plt.close()
 						continue
-					plt.xlabel(XaxisLabelPNG) # using Latex expression in matplotlib
-					plt.ylabel('Count')
-					plt.title("Histogram of the "+input_data)
+					bin_counts, bin_edges = histogram_from_sorted(sorted_data, bin_set)
+					bin_densities = bin_counts / (sorted_data.size * np.diff(bin_edges))
+
 					figname = f'{i}_{input_data}_histogram.png'
-					plt.savefig(figname, dpi=600)
-					
+					renderer.submit(figure_spec(
+						figname,
+						[histogram_layer(bin_edges, bin_counts, label=input_data, color='#4CE418', alpha=0.9)],
+						XaxisLabelPNG, 'Count', "Histogram of the "+input_data, legend=False
+						))
+
 					output_and_para_files.append(figname)
-					
+
 					# Create a new figure for the KDE
-					plt.figure()
-
-					# Assign histogram to a value
-					a = plt.hist(data_in, density=True, bins=bin_set,
-								label=input_data, color='#4CE418', alpha=0.9)
-
-				# # The first elements are the ys, the second are the xs.
-				# # ys = a[0]; xs = a[1]
-
-				# # The x-axis values are boundaries, starting with the lower bound of the first 
-				# # and ending with the upper bound of the last.
-				# # So, length of the x-axis > length of the y-axis by 1.
-
-				# # Get the upper bounds and write out the histogram
-				# print (f" Writing out the histogram data of the {input_data}\n")
-				# time.sleep(2)
-
-				# def write_out_plot_files(
-				# 	outfile, Keycontent, title, XaxisLabel, YaxisLabel, graphType, lineSetting
-				# 	):
-				# 	outfile.write(
-				# 		f'# This file contains the {Keycontent} values of the {input_data}'
-				# 		'\n# data calculated by CHAPERONg from the output of GROMACS\n#\n'
-				# 		f'@    title "{title} of {input_data}"\n'
-				# 		f'@    xaxis  label "{XaxisLabel}"\n'
-				# 		f'@    yaxis  label "{YaxisLabel}"\n'
-				# 		f'@TYPE {graphType}\n'
-				# 		f'@ s0 legend "{dataName}_{input_data}"{lineSetting}\n'
-				# 		)
-
-				# with open (out_hist, 'w') as out_his_file:
-				# 	lineSet = '\n@    s0 symbol size 0.200000\n''@    s0 line type 0'					
-				# 	write_out_plot_files(
-				# 		out_his_file, 'histogram', 'Histogram', XaxisLabelXVG, 'Count', 'bar', lineSet
-				# 		)
-				
-				# pd.DataFrame(
-				# 	{'x_upper':a[1][1:], 'y': a[0]}).to_csv(out_hist,
-				# 	header=False, index=False, sep="\t", mode='a'
-				# 	)
-				
-				# output_and_para_files.append(out_hist)
-
-					# print (f" Estimating the PDF for {input_data} with number of bins {bin_set}\n")
-					# time.sleep(2)
-					kde_xs = np.linspace(min(data_in), max(data_in), 300)
-					kde = st.gaussian_kde(data_in, bw_method=bandwidth)
-					kde_ys = kde.pdf(kde_xs)
-				# out_kde = input_data+"_KDEdata.xvg"
-				# with open (out_kde, 'w') as out_kde_file:
-				# 	write_out_plot_files(
-				# 		out_kde_file, 'KDE-estimated PDF', 'KDE-estimated Probability Density',
-				# 		XaxisLabelXVG, 'Density', 'xy', ''
-				# 		)					
-					
-				# pd.DataFrame({'x':kde_xs, 'y': kde_ys}).to_csv(out_kde,
-				# 				header=False, index=False, sep="\t", mode='a')
-				
-				# output_and_para_files.append(out_kde)
-
-					kdeLabel = input_data + "_PDF"
-					plt.plot(kde_xs, kde.pdf(kde_xs), label=kdeLabel, color='r')
-					plt.legend()
-					plt.ylabel("Density")
-					plt.xlabel(XaxisLabelPNG)
-					plt.title(f'Kernel Density Estimation Plot of the {input_data}')
 					figname = f'{i}_{input_data}_KDE_plot.png'
-					plt.savefig(figname, dpi=600)
+					renderer.submit(figure_spec(
+						figname,
+						[histogram_layer(bin_edges, bin_densities, label=input_data, color='#4CE418', alpha=0.9),
+						('plot', (kde_xs, kde_ys), dict(label=kdeLabel, color='r'))],
+						XaxisLabelPNG, "Density", f'Kernel Density Estimation Plot of the {input_data}'
+						))
 
 					output_and_para_files.append(figname)
-					plt.close()
 					histo_count += 1
 
 				print (f"\033[1;92m Estimate probability density function for {input_data}...DONE\033[00m\n"
@@ -395,6 +421,8 @@ def estimate_PDF_with_KDE_single():
 			output_and_para_files.append(extracted_data)
 			dataOutPath=f'Kernel_Density_Estimation_histogram_optimization/{input_data}'
 			# dataOutPath_old=f'{motherDir}/{input_data}'
+			# Figures must be saved before they are moved
+			renderer.wait()
 			make_dir_for_KDE(dataOutPath)
 			for file in output_and_para_files:
 				try: shutil.move(file, dataOutPath)
@@ -435,23 +463,20 @@ output_and_para_files = []
 # def estimate_PDF_with_KDE_multiplot():
 def plot_multidata_hist(dataName, input_data_dict):
 	data_count = 1
-	plt.figure() # Create a new figure
+	hist_layers = []
+	# A headless run reads the parameters of an existing file as they are
+	keep_par_file = headless and os.path.exists("CHAP_kde_Par.in")
 	for key, value in input_data_dict.items():
 		dataLabel = key
 		extracted_data = value
-		data_in = []
-		with open(extracted_data) as alldata:
-			alldata_lines = alldata.readlines()
-			for line in alldata_lines:
-				data_point = str(line).rstrip("\n")
-				data_in.append(float(data_point))
+		data_in = load_data(extracted_data)
 
 		# Determine the number of bins automatically
 		print (
 			"#=============================================================================#\n"
 			f"\n Estimating the optimal number of histogram bins for {dataLabel}\n"
 			)
-		time.sleep(2)
+		pause(2)
 		# Determine the number of bins using the Freedman-Diaconis (1981) method
 		dist = pd.Series(data_in)
 		data_max, data_min = dist.max(), dist.min()
@@ -462,7 +487,7 @@ def plot_multidata_hist(dataName, input_data_dict):
 		bin_width = (2 * iqr) / (len(dist) ** (1 / 3))
 		bin_count = int(np.ceil((data_range) / bin_width))
 		print(f'  Number of bins deduced using the Freedman-Diaconis (1981) rule')
-		time.sleep(2)
+		pause(2)
 		print(f'\n    bin_count = {bin_count}')
 
 		def writeOut_parameters():
@@ -472,12 +497,12 @@ def plot_multidata_hist(dataName, input_data_dict):
 				"bandwidth_method,silverman\n\n"
 				)			
 
-		if data_count == 1 :
+		if data_count == 1 and not keep_par_file :
 			with open("CHAP_kde_Par.in", "w") as in_par:
 				in_par.write(f'=>{dataName}\n')
 				writeOut_parameters()
 
-		elif data_count > 1 :
+		elif data_count > 1 and not keep_par_file :
 			with open("CHAP_kde_Par.in", "a") as in_par:
 				writeOut_parameters()				
 
@@ -487,7 +512,7 @@ def plot_multidata_hist(dataName, input_data_dict):
 		stdev = dist.std()
 		bin_width_scott = (3.5 * stdev) / (len(dist) ** (1 / 3))
 		bin_count_scott = int(np.ceil((data_range) / bin_width_scott))
-		time.sleep(1)
+		pause(1)
 
 		# Determine the number of bins using the sqrt method
 		num_of_bins_sqrt = int(np.ceil(math.sqrt(len(dist))))
@@ -525,14 +550,7 @@ def plot_multidata_hist(dataName, input_data_dict):
 				)
 
 			prmpt = "  Enter a response here (1 or 2): "
-			response = int(input(prmpt))
-
-			while response != 1 and response != 2:
-				print(
-					"\n ENTRY REJECTED!"
-					"\n **Please enter the appropriate option (1 or 2)\n"
-					)
-				response = int(input(prmpt))
+			response = confirm_to_proceed(prmpt)
 
 		elif auto_mode == 'full':
 			response = 1
@@ -542,22 +560,25 @@ def plot_multidata_hist(dataName, input_data_dict):
 				"\n   To use a different number or estimator, run CHAPERONg in the semi-auto mode."
 				"\n   For details, see https://www.abeebyekeen.com/post-sim-analysis-2/"
 			)
-			time.sleep(2)
+			pause(2)
 
 		if response == 2:
 			sys.exit(0)
 		elif response == 1:
 			print ("\n Updating input parameters for density estimation\n")
-			time.sleep(2)
+			pause(2)
+			# The bin counts are listed in the order of the datasets; a kept
+			# (headless) file also holds those of the datasets after this one
+			bin_custom = []
 			with open("CHAP_kde_Par.in" , 'r') as in_par:
 				for parameter in in_par.readlines():
 					if "bin_count" in parameter:
 						para_data = parameter.rstrip('\n').split(",")
-						bin_custom = int(para_data[1].strip())
-			bin_set = bin_custom
+						bin_custom.append(int(para_data[1].strip()))
+			bin_set = bin_custom[data_count - 1]
 
 			print (f" Generating and plotting the histogram of the {dataLabel}\n")
-			time.sleep(2)
+			pause(2)
 		
 			if "RMSD" in dataName: 
 				XaxisLabelXVG = r'RMSD (\cE\C)' 
@@ -573,7 +594,10 @@ def plot_multidata_hist(dataName, input_data_dict):
 				XaxisLabelPNG = 'SASA' + r' ($nm^{2}$)'
 
 			# Generate and plot the histogram of the data
-			histo = plt.hist(data_in, bins=bin_set, label=dataLabel, alpha=0.8)
+			histo_counts, histo_edges = np.histogram(data_in, bins=bin_set)
+			# Counts as floats, as returned by plt.hist
+			histo = (histo_counts.astype(float), histo_edges)
+			hist_layers.append(histogram_layer(histo[1], histo[0], label=dataLabel, alpha=0.8))
 
 			# The first elements are the ys, the second are the xs.
 			# ys = histo[0]; xs = histo[1]
@@ -607,14 +631,12 @@ def plot_multidata_hist(dataName, input_data_dict):
 			data_count += 1
 
 	print (f" Generating the combined histogram plots of the {dataName}\n")
-	time.sleep(2)
+	pause(2)
 	
-	plt.xlabel(XaxisLabelPNG) # using Latex expression in matplotlib
-	plt.ylabel('Count')
-	plt.legend()
-	plt.title("Histogram of the " + dataName)
 	figname = dataName + "_histogram_multi_plot.png"
-	plt.savefig(figname, dpi=600)
+	renderer.submit(figure_spec(
+		figname, hist_layers, XaxisLabelPNG, 'Count', "Histogram of the " + dataName
+		))
 		
 	output_and_para_files.append(figname)
 	return dataName, XaxisLabelXVG, XaxisLabelPNG
@@ -625,7 +647,7 @@ def estimate_PDF_with_KDE_multiplot(dataName, XaxisLabelXVG, XaxisLabelPNG):
 	bandwidth_dict = {}
 	bins_number_count = 1
 	print (f" Extracting pre-calculated number of bins for plotting histogram\n")
-	time.sleep(2)	
+	pause(2)	
 	with open('CHAP_kde_Par.in', 'r') as in_par:
 		for line in in_par.readlines():
 			if "bin_count" in line:
@@ -639,36 +661,30 @@ def estimate_PDF_with_KDE_multiplot(dataName, XaxisLabelXVG, XaxisLabelPNG):
 	# Reset bin count
 	bins_number_count2 = 1
 
-	plt.figure() # Create a new figure for KDE
-
+	kde_layers = []
 	for key, value in input_data_dict.items():
 		dataLabel = key
 		extracted_data = value
-		data_in = []
-		with open(extracted_data, 'r') as alldata:
-			alldata_lines = alldata.readlines()
-			for line in alldata_lines:
-				data_point = str(line).rstrip("\n")
-				data_in.append(float(data_point))
+		data_in = load_data(extracted_data)
 
 		bin_set = int(bins_number_dict[bins_number_count2])
 		bandwidth = bandwidth_dict[bins_number_count2]
 		bins_number_count2 += 1
 		print(f'  Number of bins deduced using the Freedman-Diaconis (1981) rule')
-		time.sleep(2)
+		pause(2)
 		print(f'\n    bin_count = {bin_set}\n    bandwidth = {bandwidth}')
 
 		# Generate and plot the histogram of the data
-		plt.hist(data_in, density=True, bins=bin_set, label=dataLabel, alpha=0.6)
+		histo = np.histogram(data_in, bins=bin_set, density=True)
+		kde_layers.append(histogram_layer(histo[1], histo[0], label=dataLabel, alpha=0.6))
 
 		print (f"\n Estimating the probability density function for {dataLabel}\n")
-		time.sleep(2)
-		kde_xs = np.linspace(min(data_in), max(data_in), 300)
+		pause(2)
+		kde_xs = np.linspace(data_in.min(), data_in.max(), 300)
 		kde = st.gaussian_kde(data_in, bw_method=bandwidth)
 		kde_ys = kde.pdf(kde_xs)
 		kdeLabel = dataLabel + "_PDF"
-		plt.plot(kde_xs, kde.pdf(kde_xs), label=kdeLabel)
-		plt.legend()
+		kde_layers.append(('plot', (kde_xs, kde_ys), dict(label=kdeLabel)))
 
 		out_kde = dataLabel + "_KDEdata.xvg"
 		with open (out_kde, 'w') as out_kde_file:
@@ -689,14 +705,14 @@ def estimate_PDF_with_KDE_multiplot(dataName, XaxisLabelXVG, XaxisLabelPNG):
 		output_and_para_files.append(out_kde)
 		# Increase counter for additional data
 		data_count += 1
-		plt.ylabel("Density")
-		plt.xlabel(XaxisLabelPNG)
 
 		output_and_para_files.append(value)
 
-	plt.title(f'Kernel Density Estimation Plots of {dataName} Data')
 	figname = dataName + "_KDE_multi_plot.png"
-	plt.savefig(figname, dpi=600)
+	renderer.submit(figure_spec(
+		figname, kde_layers, XaxisLabelPNG, "Density",
+		f'Kernel Density Estimation Plots of {dataName} Data'
+		))
 	
 	output_and_para_files.append(figname)
 
@@ -704,6 +720,8 @@ def estimate_PDF_with_KDE_multiplot(dataName, XaxisLabelXVG, XaxisLabelPNG):
 			"#=============================================================================#\n")
 
 	output_and_para_files.append('CHAP_kde_Par.in')
+	# Figures must be saved before they are moved
+	renderer.wait()
 	for file in output_and_para_files:
 		try: shutil.move(file, './Kernel_Density_Estimation_multi_plot')
 		except: pass
@@ -716,6 +734,7 @@ def sort_data(motherDir):
 
 # Call functions
 detect_specified_plot_type()
+renderer = FigureRenderer(args.workers)
 
 # motherDir_out = make_dir_for_KDE(motherDir)
 
@@ -732,3 +751,5 @@ elif plot_type == "multi-data plot" :
 	dataName, XaxisLabelXVG, XaxisLabelPNG = plot_multidata_hist(dataName, input_data_dict)
 	estimate_PDF_with_KDE_multiplot(dataName, XaxisLabelXVG, XaxisLabelPNG)
 	sort_data(motherDir)
+
+renderer.close()
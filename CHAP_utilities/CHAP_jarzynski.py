@@ -0,0 +1,145 @@
+######################################################################
+#  CHAP_jarzynski.py -- A python script to estimate the free energy  #
+#    profile from the work of repeated SMD pulls                     #
+#  CHAP_jarzynski.py is part of the CHAPERONg package                #
+#  Input parameters are generated by GROMACS and read by this script #
+#  CHAPERONg -- An automation program for GROMACS MD simulations and #
+#    trajectory analyses                                             #
+######################################################################
+
+__author__  = 'Abeeb A. Yekeen'
+__email__   = 'contact@abeebyekeen.com'
+__date__    = '2026.10.17'
+__version__ = '1.0'
+__status__  = 'Production'
+
+
+import argparse
+import sys
+
+import numpy as np
+from CHAP_data_loader import (boltzmann, map_in_processes, read_file_list, read_mdp_number, unit_labels,
+	write_xvg)
+
+parser = argparse.ArgumentParser(
+	description="Integrate the work of repeated constant-velocity SMD pulls and estimate the free energy"
+	" profile by the Jarzynski equality and the second-order cumulant expansion")
+parser.add_argument("-ix", dest="pullx_list", default="smd_pullx_files.dat",
+	help="List of the pullx.xvg files of the SMD pulls (default: smd_pullx_files.dat)")
+parser.add_argument("-if", dest="pullf_list", default="smd_pullf_files.dat",
+	help="List of the pullf.xvg files of the SMD pulls, in the same order (default: smd_pullf_files.dat)")
+parser.add_argument("-mdp", default="md_pull.mdp",
+	help="SMD parameters holding pull_coord1_rate and ref_t (default: md_pull.mdp)")
+parser.add_argument("-rate", type=float, default=None,
+	help="Pulling rate in nm/ps (default: pull_coord1_rate of the mdp file)")
+parser.add_argument("-temp", type=float, default=None,
+	help="Temperature in K (default: ref_t of the mdp file, else 300)")
+parser.add_argument("-bins", type=int, default=200,
+	help="Number of points of the common grid of the reaction coordinate (default: 200)")
+parser.add_argument("-unit", choices=("kJ", "kCal", "kT"), default="kCal",
+	help="Energy unit of the outputs (default: kCal)")
+parser.add_argument("-nBootstrap", type=int, default=200,
+	help="Number of bootstrap resamples of the pulls for the errors (default: 200; 0 for none)")
+parser.add_argument("-seed", type=int, default=None,
+	help="Seed of the bootstrap, for reproducible errors (default: random)")
+parser.add_argument("-o", default="SMD_free_energy.xvg",
+	help="Free energy estimates and their errors (default: SMD_free_energy.xvg)")
+parser.add_argument("-ow", default="SMD_work.xvg",
+	help="Work of every pull on the common grid (default: SMD_work.xvg)")
+parser.add_argument("-nw", "--workers", type=int, default=0,
+	help="Number of processes reading the pulls (default: 0, i.e. all cores)")
+args = parser.parse_args()
+
+
+def read_pull(files):
+	# Reference position of the spring along the pull, which starts at the
+	# initial coordinate and moves at the pulling rate, and the cumulative work
+	# done by the spring (trapezoids of the force over the reference position)
+	pullx_file, pullf_file = files
+	pullx = np.loadtxt(pullx_file, comments=('#', '@'), ndmin=2)
+	pullf = np.loadtxt(pullf_file, comments=('#', '@'), ndmin=2)
+	reference = pullx[0, 1] + rate * (pullf[:, 0] - pullx[0, 0])
+	work = np.concatenate(([0.0], np.cumsum(0.5 * (pullf[1:, 1] + pullf[:-1, 1]) * np.diff(reference))))
+	return reference, work
+
+def free_energy_estimates(weights, work):
+	# Jarzynski and cumulant estimates (in kT) of the free energy on the grid
+	# for pulls weighted by the rows of weights (each row sums to one).
+	# Reduced work is shifted by its minimum so the exponentials cannot overflow.
+	shift = work.min(axis=0)
+	jarzynski = shift - np.log(weights @ np.exp(shift - work))
+	mean = weights @ work
+	cumulant = mean - 0.5 * (weights @ work**2 - mean**2)
+	return jarzynski, cumulant
+
+
+pullx_files, pullf_files = read_file_list(args.pullx_list), read_file_list(args.pullf_list)
+if len(pullx_files) != len(pullf_files):
+	print(f" {args.pullx_list} lists {len(pullx_files)} files but {args.pullf_list} lists {len(pullf_files)}!\n")
+	sys.exit(1)
+if len(pullx_files) < 2:
+	print(" At least two SMD pulls are needed for the free energy estimates.\n")
+	sys.exit(1)
+rate = args.rate or read_mdp_number(args.mdp, "pull_coord1_rate", 0)
+if rate == 0:
+	print(f" The pulling rate was not found in {args.mdp}; set it with -rate.")
+	sys.exit(1)
+temperature = args.temp or read_mdp_number(args.mdp, "ref_t", 300)
+kT = boltzmann * temperature
+unit_factor = {'kJ': kT, 'kCal': kT / 4.184, 'kT': 1.0}[args.unit]
+
+pulls = map_in_processes(read_pull, zip(pullx_files, pullf_files), args.workers)
+
+# Common grid over the stretch of the coordinate covered by every pull; the
+# work of each pull (in kT) is interpolated onto it as one row of a matrix
+start = max(min(reference[0], reference[-1]) for reference, _ in pulls)
+end = min(max(reference[0], reference[-1]) for reference, _ in pulls)
+if end <= start:
+	print(" The SMD pulls do not cover a common range of the reaction coordinate!\n")
+	sys.exit(1)
+grid = np.linspace(start, end, args.bins)
+work = np.array([np.interp(grid, reference, pull_work) if reference[-1] > reference[0]
+	else np.interp(grid, reference[::-1], pull_work[::-1]) for reference, pull_work in pulls]) / kT
+pull_count = len(pulls)
+print(f" Integrated the work of {pull_count} SMD pulls over {start:.3f}-{end:.3f} nm"
+	f" (T = {temperature:g} K)\n")
+
+jarzynski, cumulant = free_energy_estimates(np.full((1, pull_count), 1 / pull_count), work)
+jarzynski, cumulant = jarzynski[0], cumulant[0]
+mean_work = work.mean(axis=0)
+columns = [grid, jarzynski * unit_factor, cumulant * unit_factor, mean_work * unit_factor]
+legends = ["Jarzynski", "Cumulant (2nd order)", "Mean work"]
+
+if args.nBootstrap > 0:
+	# Every bootstrap resample of the pulls is a row of pull weights; the
+	# estimates of a batch of resamples are then a few matrix products
+	seed = args.seed if args.seed is not None else np.random.SeedSequence().entropy
+	print(f" Bootstrap errors from {args.nBootstrap} resamples of the pulls (seed {seed})\n")
+	resamples = np.random.default_rng(seed).integers(0, pull_count, size=(args.nBootstrap, pull_count))
+	batch_size = max(1, 2**22 // (pull_count * args.bins))
+	boot_jarzynski, boot_cumulant = [], []
+	for batch in range(0, args.nBootstrap, batch_size):
+		batch_resamples = resamples[batch:batch + batch_size]
+		weights = np.zeros((len(batch_resamples), pull_count))
+		np.add.at(weights, (np.arange(len(batch_resamples))[:, None], batch_resamples), 1 / pull_count)
+		batch_jarzynski, batch_cumulant = free_energy_estimates(weights, work)
+		boot_jarzynski.append(batch_jarzynski)
+		boot_cumulant.append(batch_cumulant)
+	jarzynski_error = np.concatenate(boot_jarzynski).std(axis=0) * unit_factor
+	cumulant_error = np.concatenate(boot_cumulant).std(axis=0) * unit_factor
+	columns[2:2] = [jarzynski_error]
+	columns.insert(4, cumulant_error)
+	legends = ["Jarzynski", "Jarzynski error", "Cumulant (2nd order)", "Cumulant error", "Mean work"]
+
+unit_label = unit_labels[args.unit]
+write_xvg(args.o, "CHAP_jarzynski.py", "Free energy from SMD work", f"\\xD\\f{{}}G ({unit_label})",
+	columns, legends)
+write_xvg(args.ow, "CHAP_jarzynski.py", "Work of the SMD pulls", f"W ({unit_label})", [grid, work.T * unit_factor],
+	pullf_files)
+
+print(f" Free energy change over the pulls ({args.unit}/mol):")
+print(f"  Jarzynski: {columns[1][-1]:.4f}" + (f" +/- {columns[2][-1]:.4f}" if args.nBootstrap > 0 else ""))
+print(f"  Cumulant:  {cumulant[-1] * unit_factor:.4f}"
+	+ (f" +/- {columns[4][-1]:.4f}" if args.nBootstrap > 0 else ""))
+print(f"  Mean work: {mean_work[-1] * unit_factor:.4f}\n")
+print(f" Wrote out the estimates to {args.o} and the work of the pulls to {args.ow}\n")
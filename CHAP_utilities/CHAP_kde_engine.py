@@ -0,0 +1,134 @@
+##########################################################################
+#  CHAP_kde_engine.py -- Density estimation routines shared by the KDE   #
+#    scripts of CHAPERONg                                                #
+#  CHAP_kde_engine.py is part of the CHAPERONg package                   #
+#  The functions are imported by CHAP_generate_kde.py and                #
+#    CHAP_generate_kde_hist_optimize.py                                  #
+#  CHAPERONg -- An automation program for GROMACS MD simulations and     #
+#    trajectory analyses                                                 #
+##########################################################################
+
+__author__  = 'Abeeb A. Yekeen'
+__email__   = 'contact@abeebyekeen.com'
+__date__    = '2026.10.17'
+__version__ = '1.0'
+__status__  = 'Production'
+
+import math
+
+import numpy as np
+
+# Methods accepted for the "kde_method" parameter
+kde_methods = ('fft', 'exact')
+
+# Largest number of grid points used for the binned FFT estimate
+max_grid_size = 2**20
+
+
+def kde_bandwidth(data_in, bw_method):
+	# Standard deviation of the Gaussian kernel, as set by scipy.stats.gaussian_kde
+	n = len(data_in)
+	if bw_method == 'scott':
+		factor = n ** (-1 / 5)
+	elif bw_method == 'silverman':
+		factor = (n * 3 / 4) ** (-1 / 5)
+	else:
+		factor = float(bw_method)
+	return factor * np.std(data_in, ddof=1)
+
+def binned_gaussian_kde(data_in, bw_method, kde_xs, rel_tol=1e-6):
+	# Gaussian KDE by linear binning onto a fine grid and FFT convolution.
+	# Returns the density at kde_xs and an upper bound on its absolute error.
+	data_in = np.asarray(data_in, dtype=float)
+	n = data_in.size
+	sigma = kde_bandwidth(data_in, bw_method)
+	lower = min(data_in.min(), np.min(kde_xs))
+	upper = max(data_in.max(), np.max(kde_xs))
+
+	# Grid spacing for which the error stays below rel_tol of the kernel peak
+	spacing = sigma * math.sqrt(4 * rel_tol)
+	grid_size = int(np.clip(2 ** math.ceil(math.log2((upper - lower) / spacing + 1)),
+		1024, max_grid_size))
+	grid, spacing = np.linspace(lower, upper, grid_size, retstep=True)
+
+	# Linear binning: share each data point between its two nearest grid points
+	position = (data_in - lower) / spacing
+	index = np.clip(np.floor(position).astype(np.int64), 0, grid_size - 2)
+	fraction = position - index
+	counts = np.bincount(index, weights=1 - fraction, minlength=grid_size)
+	counts += np.bincount(index + 1, weights=fraction, minlength=grid_size)
+
+	# Gaussian kernel at every grid offset; zero-padding makes the circular
+	# FFT convolution equal to the linear one, so the kernel is not truncated
+	offsets = np.arange(-(grid_size - 1), grid_size) * spacing
+	kernel = np.exp(-0.5 * (offsets / sigma)**2) / (math.sqrt(2 * math.pi) * sigma)
+	fft_size = 2 ** math.ceil(math.log2(3 * grid_size - 2))
+	density = np.fft.irfft(np.fft.rfft(counts, fft_size) * np.fft.rfft(kernel, fft_size), fft_size)
+	density = np.clip(density[grid_size - 1:2 * grid_size - 1] / n, 0, None)
+
+	# Both the linear binning and the interpolation back onto kde_xs are
+	# bounded by spacing**2/8 times the largest second derivative of the kernel
+	error_bound = spacing**2 / (4 * math.sqrt(2 * math.pi) * sigma**3)
+	return np.interp(kde_xs, grid, density), error_bound
+
+def estimate_density(data_in, bw_method, kde_xs, kde_method='fft'):
+	# Evaluate the Gaussian KDE of data_in at kde_xs with the selected method.
+	# Returns the density and an upper bound on its absolute error.
+	if kde_method == 'fft':
+		data_in = np.asarray(data_in, dtype=float)
+		if data_in.size > 1 and kde_bandwidth(data_in, bw_method) > 0:
+			return binned_gaussian_kde(data_in, bw_method, kde_xs)
+	import scipy.stats as st
+	kde = st.gaussian_kde(data_in, bw_method=bw_method)
+	return kde.pdf(kde_xs), 0.0
+
+def histogram_from_sorted(sorted_data, bin_count):
+	# Counts and edges of numpy.histogram(data, bins=bin_count) taken from a
+	# sorted copy of the data, so that many bin counts share one sort
+	data_min, data_max = sorted_data[0], sorted_data[-1]
+	if data_min == data_max:
+		data_min, data_max = data_min - 0.5, data_max + 0.5
+	bin_edges = np.linspace(data_min, data_max, bin_count + 1)
+	index = np.searchsorted(sorted_data, bin_edges, side='left')
+	# The last bin includes its upper edge
+	index[-1] = sorted_data.size
+	return np.diff(index), bin_edges
+
+def histogram_bin_costs(sorted_data, bin_counts, cost_method='shimazaki'):
+	# Cost of every candidate number of bins in one vectorised pass, from a
+	# sorted copy of the data. 'shimazaki' is the Shimazaki-Shinomoto (2007)
+	# cost (2*mean - variance)/width**2 of the bin counts; 'cv' is the
+	# leave-one-out cross-validation risk of Rudemo (1982). Lower is better.
+	bin_counts = np.asarray(bin_counts, dtype=np.int64)
+	n = sorted_data.size
+	data_min, data_max = sorted_data[0], sorted_data[-1]
+	if data_min == data_max:
+		data_min, data_max = data_min - 0.5, data_max + 0.5
+	bin_width = (data_max - data_min) / bin_counts
+
+	# Edges of all candidate histograms laid end to end, computed as
+	# numpy.linspace does, and located in the data with a single search
+	edge_offsets = np.concatenate(([0], np.cumsum(bin_counts + 1)))
+	edge_rank = np.arange(edge_offsets[-1]) - np.repeat(edge_offsets[:-1], bin_counts + 1)
+	edges = data_min + edge_rank * np.repeat(bin_width, bin_counts + 1)
+	edges[edge_offsets[1:] - 1] = data_max
+	index = np.searchsorted(sorted_data, edges, side='left')
+	index[edge_offsets[1:] - 1] = n
+
+	# Differences across the boundary between two candidates are not bins
+	counts = np.delete(np.diff(index), edge_offsets[1:-1] - 1)
+	bin_offsets = np.concatenate(([0], np.cumsum(bin_counts)[:-1]))
+	sum_squares = np.add.reduceat(counts.astype(float)**2, bin_offsets)
+
+	if cost_method == 'shimazaki':
+		mean = n / bin_counts
+		variance = sum_squares / bin_counts - mean**2
+		return (2 * mean - variance) / bin_width**2
+	elif cost_method == 'cv':
+		return (2 - (n + 1) * sum_squares / n**2) / ((n - 1) * bin_width)
+	raise ValueError(f'Unknown bin cost method: {cost_method}')
+
+def describe_kde_method(kde_method, error_bound):
+	if kde_method == 'fft' and error_bound > 0:
+		return f'binned FFT method (max. absolute error <= {error_bound:.3e})'
+	return 'exact method'
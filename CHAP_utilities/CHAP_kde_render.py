@@ -0,0 +1,92 @@
+##########################################################################
+#  CHAP_kde_render.py -- Parallel rendering of the histogram and KDE     #
+#    figures of CHAPERONg                                                #
+#  CHAP_kde_render.py is part of the CHAPERONg package                   #
+#  The functions are imported by CHAP_generate_kde.py and                #
+#    CHAP_generate_kde_hist_optimize.py                                  #
+#  CHAPERONg -- An automation program for GROMACS MD simulations and     #
+#    trajectory analyses                                                 #
+##########################################################################
+
+__author__  = 'Abeeb A. Yekeen'
+__email__   = 'contact@abeebyekeen.com'
+__date__    = '2026.10.17'
+__version__ = '1.0'
+__status__  = 'Production'
+
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import matplotlib.pyplot as plt
+
+# A figure is described by a dict holding its file name, the pyplot calls
+# that draw it as (function name, args, kwargs) layers with precomputed
+# arrays, and its labels. Such a dict can be shipped to a worker process.
+plot_functions = ('hist', 'plot', 'axvline')
+
+
+def histogram_layer(bin_edges, heights, **kwargs):
+	# Bars of a precomputed histogram, drawn as plt.hist would draw the data
+	return ('hist', (bin_edges[:-1],), dict(bins=bin_edges, weights=heights, **kwargs))
+
+def figure_spec(figname, layers, xlabel, ylabel, title, legend=True, dpi=600):
+	return {'figname': figname, 'layers': layers, 'xlabel': xlabel,
+			'ylabel': ylabel, 'title': title, 'legend': legend, 'dpi': dpi}
+
+def render_figure(spec):
+	# Draw and save one figure; runs in the worker processes
+	fig = plt.figure()
+	for function, args, kwargs in spec['layers']:
+		if function not in plot_functions:
+			raise ValueError(f'Unsupported plot function: {function}')
+		getattr(plt, function)(*args, **kwargs)
+	if spec['legend']:
+		plt.legend()
+	plt.xlabel(spec['xlabel'])
+	plt.ylabel(spec['ylabel'])
+	plt.title(spec['title'])
+	plt.savefig(spec['figname'], dpi=spec['dpi'])
+	plt.close(fig)
+	return spec['figname']
+
+def render_worker_count(workers):
+	# 0 (or a negative number) uses all available cores
+	if workers is None or workers < 1:
+		try:
+			workers = len(os.sched_getaffinity(0))
+		except AttributeError:
+			workers = os.cpu_count() or 1
+	return workers
+
+class FigureRenderer:
+	# Render figures in a pool of worker processes. Figures are submitted as
+	# they are computed; wait() blocks until all of them have been saved and
+	# returns their file names in submission order.
+	def __init__(self, workers=0):
+		self.workers = render_worker_count(workers)
+		self.pool = None
+		self.pending = []
+		# The calling scripts do their work at the top level, so the workers
+		# must be forked rather than spawned (which re-runs the script)
+		if self.workers > 1 and 'fork' in multiprocessing.get_all_start_methods():
+			self.pool = ProcessPoolExecutor(
+				max_workers=self.workers, mp_context=multiprocessing.get_context('fork'))
+
+	def submit(self, spec):
+		if self.pool is None:
+			self.pending.append(render_figure(spec))
+		else:
+			self.pending.append(self.pool.submit(render_figure, spec))
+		return spec['figname']
+
+	def wait(self):
+		done = [item if isinstance(item, str) else item.result() for item in self.pending]
+		self.pending = []
+		return done
+
+	def close(self):
+		self.wait()
+		if self.pool is not None:
+			self.pool.shutdown()
+			self.pool = None
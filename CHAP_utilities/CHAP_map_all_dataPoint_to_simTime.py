@@ -1,4 +1,3 @@
-
 ############################################################################
 #  CHAP_map_all_dataPoint_to_simTime.py -- A python script to map all FES  #
 #    data points to simulation time and order parameters in the trajectory #
@@ -12,172 +11,141 @@
 __author__  = 'Abeeb A. Yekeen'
 __email__   = 'contact@abeebyekeen.com'
 __date__    = '2022.10.18'
-__version__ = '1.0'
+__version__ = '1.1'
 __status__  = 'Production'
 
 
 import os
+import argparse
+import numpy as np
+
+# Create an argument parser
+parser = argparse.ArgumentParser(description="Map all FES data points to simulation time")
+parser.add_argument("--kdtree", action="store_true",
+                    help="Map FES points whose bin holds no frame to their nearest frame(s) using a KD-tree")
+parser.add_argument("--neighbours", type=int, default=1,
+                    help="Number of nearest frames to map to an empty bin with --kdtree (default: 1)")
+parser.add_argument("--fes", default="OrderParameters1_2_dG_nogap-sorted.dat",
+                    help="Energy-sorted FES data points (order_para1, order_para2, dG)")
+parser.add_argument("--frames", default="SimTime_OrderParameters1_2.dat",
+                    help="Simulation time and order parameters of every frame")
+parser.add_argument("--store", default=os.path.join("collect_mappings_extra", "mapped_FES_frames.npz"),
+                    help="Output store of all mappings (default: collect_mappings_extra/mapped_FES_frames.npz)")
+
+
+# Read in a tab-separated table once, as numbers and as the text of its
+# columns (written out unchanged, so no digits are lost to formatting)
+def load_table(table_file):
+    text = np.loadtxt(table_file, delimiter="\t", ndmin=2, dtype=str)
+    return text.astype(float), text
+
+# Recover the histogram2d bin edges used by CHAP_construct_free_en_surface.py.
+# Every bin of the 2D histogram (empty ones included) is written to the FES
+# file at its centre, so the centres form the full regular grid.
+def derive_bin_edges(fes_data):
+    grid_index = []
+    edges = []
+    for axis in (0, 1):
+        centres, index = np.unique(fes_data[:, axis], return_inverse=True)
+        if centres.size > 1:
+            width = (centres[-1] - centres[0]) / (centres.size - 1)
+        else:
+            width = 1.0
+        edges.append(np.linspace(centres[0] - width/2, centres[-1] + width/2, centres.size + 1))
+        grid_index.append(index)
+    fes_bin_id = grid_index[0] * (edges[1].size - 1) + grid_index[1]
+    return edges, fes_bin_id
+
+# Assign every frame to its 2D histogram bin in one vectorised pass
+def assign_frames_to_bins(frame_data, edges):
+    bin_index = []
+    inside = np.ones(len(frame_data), dtype=bool)
+    for axis, axis_edges in enumerate(edges):
+        values = frame_data[:, axis+1]
+        nbins = axis_edges.size - 1
+        # Tolerate the round-off in the edges recovered from the bin centres
+        tolerance = 1e-9 * (axis_edges[-1] - axis_edges[0])
+        inside &= (values >= axis_edges[0] - tolerance) & (values <= axis_edges[-1] + tolerance)
+        # Like numpy.histogram2d, the last bin includes its upper edge
+        index = np.searchsorted(axis_edges, values, side="right") - 1
+        bin_index.append(np.clip(index, 0, nbins - 1))
+    frame_bin_id = bin_index[0] * (edges[1].size - 1) + bin_index[1]
+    frame_bin_id[~inside] = -1
+    return frame_bin_id
+
+# Produce all bin -> frames mappings at once as offsets into a bin-sorted index
+def group_frames_by_bin(frame_bin_id, bin_total):
+    valid = frame_bin_id >= 0
+    # A stable sort keeps the frames of each bin in simulation time order
+    frames_by_bin = np.argsort(frame_bin_id, kind="stable")[np.count_nonzero(~valid):]
+    counts = np.bincount(frame_bin_id[valid], minlength=bin_total)
+    bin_offsets = np.concatenate(([0], np.cumsum(counts)))
+    return frames_by_bin, bin_offsets
+
+# Fallback for empty bins: map the FES point to its nearest frame(s)
+def nearest_frames(frame_data, fes_points, edges, neighbours):
+    try:
+        from scipy.spatial import cKDTree
+    except ModuleNotFoundError:
+        print(" The scipy library has not been installed!\n"
+              " Empty FES bins will not be mapped to their nearest frames.\n")
+        return None
+    # Measure distances in units of bin width so both order parameters weigh equally
+    widths = np.array([edges[0][1] - edges[0][0], edges[1][1] - edges[1][0]])
+    tree = cKDTree(frame_data[:, 1:3] / widths)
+    neighbours = min(neighbours, len(frame_data))
+    _, nearest = tree.query(fes_points / widths, k=neighbours)
+    return nearest.reshape(len(fes_points), neighbours)
+
+# Write every frame's time, order parameters, bin id and free energy, together
+# with the bin, time and energy indexes, into one compressed columnar store
+def write_mapping_store(store_file, frame_data, frame_text, frame_bin_id, frames_by_bin, bin_offsets,
+                        fes_data, fes_text, fes_bin_id, edges, fallback_point, fallback_frame):
+    bin_dG = np.full(bin_offsets.size - 1, np.nan)
+    bin_dG[fes_bin_id] = fes_data[:, 2]
+    frame_dG = np.where(frame_bin_id >= 0, bin_dG[frame_bin_id], np.nan)
+    np.savez_compressed(
+        store_file,
+        time=frame_data[:, 0], order_par1=frame_data[:, 1], order_par2=frame_data[:, 2],
+        frame_text=frame_text[:, :3],
+        bin_id=frame_bin_id, dG=frame_dG,
+        frames_by_bin=frames_by_bin, bin_offsets=bin_offsets,
+        order_by_time=np.argsort(frame_data[:, 0], kind="stable"),
+        order_by_energy=np.lexsort((frame_data[:, 1], frame_dG)),
+        fes_par1=fes_data[:, 0], fes_par2=fes_data[:, 1], fes_dG=fes_data[:, 2],
+        fes_dG_text=fes_text[:, 2],
+        fes_bin_id=fes_bin_id, x_edges=edges[0], y_edges=edges[1],
+        fallback_point=fallback_point, fallback_frame=fallback_frame,
+        )
+
+def map_all_data_points(args):
+    fes_data, fes_text = load_table(args.fes)
+    frame_data, frame_text = load_table(args.frames)
+    print("\n Number of FES data points to map:    "+str(len(fes_data)))
+    print(" Number of frames in the trajectory:   "+str(len(frame_data)))
+
+    edges, fes_bin_id = derive_bin_edges(fes_data)
+    bin_total = (edges[0].size - 1) * (edges[1].size - 1)
+    frame_bin_id = assign_frames_to_bins(frame_data, edges)
+    frames_by_bin, bin_offsets = group_frames_by_bin(frame_bin_id, bin_total)
+    empty = bin_offsets[fes_bin_id + 1] == bin_offsets[fes_bin_id]
+
+    fallback_point = np.empty(0, dtype=np.int64)
+    fallback_frame = np.empty(0, dtype=np.int64)
+    if args.kdtree and np.any(empty):
+        neighbours = max(args.neighbours, 1)
+        nearest = nearest_frames(frame_data, fes_data[empty, :2], edges, neighbours)
+        if nearest is not None:
+            fallback_point = np.repeat(np.flatnonzero(empty), nearest.shape[1])
+            fallback_frame = nearest.ravel()
+
+    write_mapping_store(args.store, frame_data, frame_text, frame_bin_id, frames_by_bin, bin_offsets,
+                        fes_data, fes_text, fes_bin_id, edges, fallback_point, fallback_frame)
+
+    mapped_count = np.count_nonzero(~empty) + np.unique(fallback_point).size
+    print(" Number of data points processed:      "+str(len(fes_data))+" of "+str(len(fes_data)))
+    print(" Number of data points mapped to time: "+str(mapped_count))
+    print(" Mappings written to "+args.store+"\n")
 
-# Function to record matching data points from the time-order_para1-2
-def recordHits():
-    os.chdir('collect_mappings_extra')
-    with open(readinFile , "w") as mapping:
-        for candidate in currentHitList:
-            mapping.write(candidate)
-        os.chdir('../')
-        # if filecount == 1:
-        #     with open("dataPointsRecorded.dat" , "w") as dtpRecorded:
-        #         dtpRecorded.write(readinFile+"\n")
-        # elif filecount > 1:
-        #     with open("dataPointsRecorded.dat" , "a") as dtpRecorded:
-        #         dtpRecorded.write(readinFile+"\n")                
-
-with open("OrderParameters1_2_dG_nogap-sorted.dat", "r") as paramets:
-    filecount=0
-    milestone_factor=0
-    allDataPts=paramets.readlines()
-    for datapt in allDataPts:
-        current_datapt = datapt.strip("\n")
-        filecount+=1
-        if filecount == 2:
-            print("\n Number of data point processed:       1 "+"of "+str(len(allDataPts)))
-        if filecount%200 == 0 and filecount > 0 and filecount < 1000:
-            milestone_factor+=1
-            milestone_count=milestone_factor*200
-            print(" Number of data points processed:    "+str(milestone_count)+" of "+str(len(allDataPts)))
-        if filecount == 1000:
-            milestone_factor+=1
-            milestone_count=milestone_factor*200
-            print(" Number of data points processed:   "+str(milestone_count)+" of "+str(len(allDataPts)))
-            milestone_factor=2
-        if filecount%500 == 0 and filecount > 1000 and filecount <= 9500:
-            milestone_factor+=1
-            milestone_count=milestone_factor*500
-            print(" Number of data points processed:   "+str(milestone_count)+" of "+str(len(allDataPts)))
-        if filecount == 10000:
-            milestone_factor+=1
-            milestone_count=milestone_factor*500
-            print(" Number of data points processed:  "+str(milestone_count)+" of "+str(len(allDataPts)))
-            milestone_factor=10
-        if filecount%1000 == 0 and filecount > 10000:
-            milestone_factor+=1
-            milestone_count=milestone_factor*1000
-            print(" Number of data points processed:  "+str(milestone_count)+" of "+str(len(allDataPts)))
-        spltcurrent_datapt = current_datapt.split("\t")
-        Par1 = spltcurrent_datapt[0]
-        Par1float = float(Par1)
-        Par1float_decimal = float("{:.8f}".format(Par1float))
-        Par2 = spltcurrent_datapt[1]
-        Par2float = float(Par2)
-        Par2float_decimal = float("{:.8f}".format(Par2float))
-        apprxPar1 = float(Par1[:4])
-        apprxPar2 = float(Par2[:4])
-        with open("SimTime_OrderParameters1_2.dat", "r") as timedparamet:
-            timedPairLines = timedparamet.readlines()
-            linecount = 0
-            currentHitList = []
-            for timeddatapair in timedPairLines:
-                spltimeddatapair = timeddatapair.rstrip("\n").split("\t")
-                if (float(spltimeddatapair[1]) <= (apprxPar1+0.004)) and (float(spltimeddatapair[1]) >= (apprxPar1-0.004)) and \
-                    (float(spltimeddatapair[2]) <= (apprxPar2+0.004)) and (float(spltimeddatapair[2]) >= (apprxPar2-0.004)):
-                    headertxt = "Time"+"\t"+"OrderPar1"+"\t"+"OrderPar2"+"\t"+"Energy"+"\n"
-                    fesdat = "----"+"\t"+str(Par1float_decimal)+"\t"+str(Par2float_decimal)+"\t"+str(spltcurrent_datapt[2])+"\n"
-                    candidateHit = str((timeddatapair).rstrip())+"\t"+str(spltcurrent_datapt[2])+"\n"
-                    if linecount == 0:
-                        currentHitList.append(headertxt)
-                        currentHitList.append(fesdat)
-                    currentHitList.append(candidateHit)
-                    linecount+=1
-            # if zero matching data point is found, use a wider search range
-            if linecount == 0:
-                # print("no hit found, looping for the 2nd time")
-                for timeddatapair in timedPairLines:
-                    spltimeddatapair = timeddatapair.rstrip("\n").split("\t")
-                    if (float(spltimeddatapair[1]) <= (apprxPar1+0.006)) and (float(spltimeddatapair[1]) >= (apprxPar1-0.006)) and \
-                        (float(spltimeddatapair[2]) <= (apprxPar2+0.006)) and (float(spltimeddatapair[2]) >= (apprxPar2-0.006)):
-                        headertxt = "Time"+"\t"+"OrderPar1"+"\t"+"OrderPar2"+"\t"+"Energy"+"\n"
-                        fesdat = "----"+"\t"+str(Par1float_decimal)+"\t"+str(Par2float_decimal)+"\t"+str(spltcurrent_datapt[2])+"\n"
-                        candidateHit = str((timeddatapair).rstrip())+"\t"+str(spltcurrent_datapt[2])+"\n"
-                        if linecount == 0:
-                            currentHitList.append(headertxt)
-                            currentHitList.append(fesdat)
-                        currentHitList.append(candidateHit)
-                        linecount+=1
-                # if zero matching data point is found, use even a wider search range
-                if linecount == 0:
-                    # print("no hit found, looping for the 3rd time")
-                    for timeddatapair in timedPairLines:
-                        spltimeddatapair = timeddatapair.rstrip("\n").split("\t")
-                        if (float(spltimeddatapair[1]) <= (apprxPar1+0.008)) and (float(spltimeddatapair[1]) >= (apprxPar1-0.008)) and \
-                            (float(spltimeddatapair[2]) <= (apprxPar2+0.008)) and (float(spltimeddatapair[2]) >= (apprxPar2-0.008)):
-                            headertxt = "Time"+"\t"+"OrderPar1"+"\t"+"OrderPar2"+"\t"+"Energy"+"\n"
-                            fesdat = "----"+"\t"+str(Par1float_decimal)+"\t"+str(Par2float_decimal)+"\t"+str(spltcurrent_datapt[2])+"\n"
-                            candidateHit = str((timeddatapair).rstrip())+"\t"+str(spltcurrent_datapt[2])+"\n"
-                            if linecount == 0:
-                                currentHitList.append(headertxt)
-                                currentHitList.append(fesdat)
-                            currentHitList.append(candidateHit)
-                            linecount+=1
-                    # if zero matching data point is found, use even a wider search range
-                    # continue this cycle for a couple more times as found below
-                    if linecount == 0:
-                        # print("no hit found, looping for the 4th time")
-                        for timeddatapair in timedPairLines:
-                            spltimeddatapair = timeddatapair.rstrip("\n").split("\t")
-                            if (float(spltimeddatapair[1]) <= (apprxPar1+0.01)) and (float(spltimeddatapair[1]) >= (apprxPar1-0.01)) and \
-                                (float(spltimeddatapair[2]) <= (apprxPar2+0.01)) and (float(spltimeddatapair[2]) >= (apprxPar2-0.01)):
-                                headertxt = "Time"+"\t"+"OrderPar1"+"\t"+"OrderPar2"+"\t"+"Energy"+"\n"
-                                fesdat = "----"+"\t"+str(Par1float_decimal)+"\t"+str(Par2float_decimal)+"\t"+str(spltcurrent_datapt[2])+"\n"
-                                candidateHit = str((timeddatapair).rstrip())+"\t"+str(spltcurrent_datapt[2])+"\n"
-                                if linecount == 0:
-                                    currentHitList.append(headertxt)
-                                    currentHitList.append(fesdat)
-                                currentHitList.append(candidateHit)
-                                linecount+=1
-                        # if zero matching data point is found, use even a wider search range and
-                        if linecount == 0:
-                            # print("no hit found, looping for the 5th time")
-                            for timeddatapair in timedPairLines:
-                                spltimeddatapair = timeddatapair.rstrip("\n").split("\t")
-                                if (float(spltimeddatapair[1]) <= (apprxPar1+0.013)) and (float(spltimeddatapair[1]) >= (apprxPar1-0.013)) and \
-                                    (float(spltimeddatapair[2]) <= (apprxPar2+0.013)) and (float(spltimeddatapair[2]) >= (apprxPar2-0.013)):
-                                    headertxt = "Time"+"\t"+"OrderPar1"+"\t"+"OrderPar2"+"\t"+"Energy"+"\n"
-                                    fesdat = "----"+"\t"+str(Par1float_decimal)+"\t"+str(Par2float_decimal)+"\t"+str(spltcurrent_datapt[2])+"\n"
-                                    candidateHit = str((timeddatapair).rstrip())+"\t"+str(spltcurrent_datapt[2])+"\n"
-                                    if linecount == 0:
-                                        currentHitList.append(headertxt)
-                                        currentHitList.append(fesdat)
-                                    currentHitList.append(candidateHit)
-                                    linecount+=1
-                            if linecount == 0:
-                                # print("no hit found, looping for the 6th time")
-                                for timeddatapair in timedPairLines:
-                                    spltimeddatapair = timeddatapair.rstrip("\n").split("\t")
-                                    if (float(spltimeddatapair[1]) <= (apprxPar1+0.015)) and (float(spltimeddatapair[1]) >= (apprxPar1-0.015)) and \
-                                        (float(spltimeddatapair[2]) <= (apprxPar2+0.015)) and (float(spltimeddatapair[2]) >= (apprxPar2-0.015)):
-                                        headertxt = "Time"+"\t"+"OrderPar1"+"\t"+"OrderPar2"+"\t"+"Energy"+"\n"
-                                        fesdat = "----"+"\t"+str(Par1float_decimal)+"\t"+str(Par2float_decimal)+"\t"+str(spltcurrent_datapt[2])+"\n"
-                                        candidateHit = str((timeddatapair).rstrip())+"\t"+str(spltcurrent_datapt[2])+"\n"
-                                        if linecount == 0:
-                                            currentHitList.append(headertxt)
-                                            currentHitList.append(fesdat)
-                                        currentHitList.append(candidateHit)
-                                        linecount+=1
-                                # if linecount == 0:
-                                #     # print("no hit found, looping for the 7th and final time\n")
-                                #     for timeddatapair in timedPairLines:
-                                #         spltimeddatapair = timeddatapair.rstrip("\n").split("\t")
-                                #         if (float(spltimeddatapair[1]) <= (apprxPar1+0.017)) and (float(spltimeddatapair[1]) >= (apprxPar1-0.017)) and \
-                                #             (float(spltimeddatapair[2]) <= (apprxPar2+0.017)) and (float(spltimeddatapair[2]) >= (apprxPar2-0.017)):
-                                #             headertxt = "Time"+"\t"+"OrderPar1"+"\t"+"OrderPar2"+"\t"+"Energy"+"\n"
-                                #             fesdat = "----"+"\t"+str(Par1float_decimal)+"\t"+str(Par2float_decimal)+"\t"+str(spltcurrent_datapt[2])+"\n"
-                                #             candidateHit = str((timeddatapair).rstrip())+"\t"+str(spltcurrent_datapt[2])+"\n"
-                                #             if linecount == 0:
-                                #                 currentHitList.append(headertxt)
-                                #                 currentHitList.append(fesdat)
-                                #             currentHitList.append(candidateHit)
-                                #             linecount+=1
-            if linecount > 0:
-                readinFile = "DataPt_"+str(filecount)+".txt"
-                recordHits()
-    print(" Number of data points processed:  "+str(filecount)+" of "+str(len(allDataPts)))
\ No newline at end of file
+if __name__ == "__main__":
+    map_all_data_points(parser.parse_args())
@@ -0,0 +1,149 @@
+######################################################################
+#  CHAP_plan_US_windows.py -- A python script to predict the overlap #
+#    of the umbrella sampling windows and propose extra windows      #
+#  CHAP_plan_US_windows.py is part of the CHAPERONg package          #
+#  Input parameters are generated by other scripts in CHAPERONg and  #
+#    are read by this script                                         #
+#  CHAPERONg -- An automation program for GROMACS MD simulations and #
+#    trajectory analyses                                             #
+######################################################################
+
+__author__  = 'Abeeb A. Yekeen'
+__email__   = 'contact@abeebyekeen.com'
+__date__    = '2026.10.17'
+__version__ = '1.0'
+__status__  = 'Production'
+
+
+import argparse
+import math
+import sys
+from statistics import NormalDist
+
+import numpy as np
+from CHAP_data_loader import boltzmann, read_mdp_number
+
+parser = argparse.ArgumentParser(
+	description="Predict the histogram overlap of neighbouring umbrella windows before they are run,"
+	" and propose the fewest extra SMD frames that close the gaps")
+parser.add_argument("-l", "--config_list", default="configuratns_list.txt",
+	help="Chosen windows (default: configuratns_list.txt)")
+parser.add_argument("-d", "--distances", default="distances_summary.txt",
+	help="COM distance of every SMD frame, i.e. the SMD pulling trace at the extracted frames"
+	" (default: distances_summary.txt)")
+parser.add_argument("-m", "--mdp", default="md_umbrella.mdp",
+	help="Umbrella sampling parameters holding pull_coord1_k and ref_t (default: md_umbrella.mdp)")
+parser.add_argument("-k", "--force_constant", type=float, default=None,
+	help="Umbrella force constant in kJ mol-1 nm-2 (default: pull_coord1_k of the mdp file)")
+parser.add_argument("-t", "--temperature", type=float, default=None,
+	help="Temperature in K (default: ref_t of the mdp file, else 300)")
+parser.add_argument("-ov", "--min_overlap", type=float, default=0.03,
+	help="Smallest acceptable overlap (shared area) of the histograms of neighbouring windows"
+	" (default: 0.03)")
+parser.add_argument("--apply", action="store_true",
+	help="Also add the proposed frames to the list of chosen windows")
+args = parser.parse_args()
+
+
+def read_windows(config_list):
+	# Frame and distance of the chosen windows, in order of distance
+	frames, dists = [], []
+	with open(config_list) as configs:
+		for line in configs:
+			fields = line.split()
+			if len(fields) > 1 and fields[0].isdigit():
+				frames.append(int(fields[0]))
+				dists.append(float(fields[1]))
+	frames, order = np.unique(frames, return_index=True)
+	dists = np.array(dists)[order]
+	order = np.argsort(dists, kind='stable')
+	return frames[order], dists[order]
+
+def predicted_overlap(spacings, width):
+	# Shared area of two Gaussian histograms of equal width whose centres are
+	# spacings apart: 2*Phi(-spacing/(2*width))
+	return np.array([math.erfc(spacing / (2 * math.sqrt(2) * width)) for spacing in np.atleast_1d(spacings)])
+
+def fill_gap(start, end, max_spacing, trace_frames, trace_dists):
+	# Fewest frames between two windows so that no spacing exceeds max_spacing:
+	# from each window, the frame of the largest distance still within reach.
+	# The trace is sorted by distance, so every step is one searchsorted.
+	added = []
+	position = start
+	while end - position > max_spacing:
+		reach = np.searchsorted(trace_dists, position + max_spacing, side="right") - 1
+		if reach < 0 or trace_dists[reach] <= position:
+			# No SMD frame within reach: take the nearest one beyond the gap
+			reach = np.searchsorted(trace_dists, position, side="right")
+			if reach >= len(trace_dists) or trace_dists[reach] >= end:
+				break
+		added.append((int(trace_frames[reach]), float(trace_dists[reach])))
+		position = trace_dists[reach]
+	return added
+
+
+frames, dists = read_windows(args.config_list)
+if len(frames) < 2:
+	print(f" At least two windows are needed in {args.config_list} to plan the windows.")
+	sys.exit(1)
+
+force_constant = args.force_constant or read_mdp_number(args.mdp, "pull_coord1_k", 0)
+if force_constant <= 0:
+	print(f" The umbrella force constant was not found in {args.mdp}; set it with -k.")
+	sys.exit(1)
+temperature = args.temperature or read_mdp_number(args.mdp, "ref_t", 300)
+
+# A harmonic restraint of force constant k holds the coordinate in a Gaussian
+# of width sqrt(kT/k); windows are predicted to overlap enough as long as
+# they are no more than max_spacing apart
+width = math.sqrt(boltzmann * temperature / force_constant)
+max_spacing = -2 * width * NormalDist().inv_cdf(args.min_overlap / 2)
+
+spacings = np.diff(dists)
+overlaps = predicted_overlap(spacings, width)
+gaps = np.flatnonzero(overlaps < args.min_overlap)
+
+trace = np.loadtxt(args.distances, ndmin=2)
+order = np.argsort(trace[:, 1], kind='stable')
+trace_frames, trace_dists = trace[order, 0].astype(int), trace[order, 1]
+proposals = {gap: fill_gap(dists[gap], dists[gap + 1], max_spacing, trace_frames, trace_dists) for gap in gaps}
+extra = sorted({frame_dist for added in proposals.values() for frame_dist in added}, key=lambda fd: fd[1])
+
+with open("US_window_plan.dat", "w") as plan:
+	plan.write(f"# Predicted histogram width: {width:.4f} nm (k = {force_constant:g} kJ mol-1 nm-2,"
+		f" T = {temperature:g} K)\n")
+	plan.write(f"# Largest spacing for an overlap of {args.min_overlap:g}: {max_spacing:.4f} nm\n")
+	plan.write("frame1\tdist1\tframe2\tdist2\tspacing\toverlap\tstatus\tproposed_frames\n")
+	for pair, (spacing, overlap) in enumerate(zip(spacings, overlaps)):
+		added = proposals.get(pair, [])
+		status = "gap" if pair in proposals else "ok"
+		plan.write(f"{frames[pair]}\t{dists[pair]}\t{frames[pair + 1]}\t{dists[pair + 1]}\t{spacing:.3f}\t"
+			f"{overlap:.4f}\t{status}\t" + (",".join(str(frame) for frame, _ in added) or "-") + "\n")
+
+# The proposed frames, one per line, for umbre_s19_MoreWin
+with open("US_extra_frames.txt", "w") as extra_frames:
+	extra_frames.write("frame#\tdist\n")
+	extra_frames.write("".join(f"{frame}\t{dist}\n" for frame, dist in extra))
+
+print(f" Predicted histogram width of the windows: {width:.4f} nm;"
+	f" neighbouring windows should be at most {max_spacing:.4f} nm apart\n")
+if len(gaps) == 0:
+	print(f" All {len(spacings)} neighbouring windows are predicted to overlap\n")
+else:
+	print(f" {len(gaps)} of {len(spacings)} neighbouring windows are predicted not to overlap enough;"
+		f" {len(extra)} extra frame(s) proposed in US_extra_frames.txt\n")
+	for gap in gaps:
+		added = ", ".join(str(frame) for frame, _ in proposals[gap]) or "none available"
+		print(f"  {dists[gap]:.3f}-{dists[gap + 1]:.3f} nm (overlap {overlaps[gap]:.4f}): frames {added}")
+	print("")
+print(" Wrote out the window plan to US_window_plan.dat\n")
+
+if args.apply and extra:
+	# Rewrite the list of windows in order of distance with the extra frames
+	windows = sorted(set(zip(frames.tolist(), dists.tolist())) | set(extra), key=lambda fd: fd[1])
+	with open(args.config_list, "w") as config:
+		config.write("frame#"+"\t"+"dist"+"\t"+"d_dist"+"\n")
+		config.write(f"{windows[0][0]}\t{windows[0][1]}\tnil\n")
+		config.write("".join(f"{frame}\t{dist}\t{float('{:.3f}'.format(dist - previous))}\n"
+			for (_, previous), (frame, dist) in zip(windows[:-1], windows[1:])))
+	print(f" Added the {len(extra)} proposed frame(s) to {args.config_list}\n")
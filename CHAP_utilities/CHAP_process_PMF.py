@@ -0,0 +1,118 @@
+######################################################################
+#  CHAP_process_PMF.py -- A python script to post-process the PMF    #
+#    profile from WHAM and plot the results of the analysis          #
+#  CHAP_process_PMF.py is part of the CHAPERONg package              #
+#  Input parameters are generated by GROMACS (gmx wham) or           #
+#    CHAP_wham.py and are read by this script                        #
+#  CHAPERONg -- An automation program for GROMACS MD simulations and #
+#    trajectory analyses                                             #
+######################################################################
+
+__author__  = 'Abeeb A. Yekeen'
+__email__   = 'contact@abeebyekeen.com'
+__date__    = '2026.10.17'
+__version__ = '1.0'
+__status__  = 'Production'
+
+
+import argparse
+import re
+import sys
+
+import numpy as np
+from CHAP_kde_render import figure_spec, render_figure
+
+parser = argparse.ArgumentParser(
+	description="Find the minimum and dG of the PMF, shift its displacement axis and plot the WHAM results")
+parser.add_argument("-p", "--profile", default="PMF_profile.xvg",
+	help="PMF profile from WHAM (default: PMF_profile.xvg)")
+parser.add_argument("-y", "--ymin_profile", default="PMF_profile_YminAdjusted.xvg",
+	help="PMF profile set to zero at its minimum (default: PMF_profile_YminAdjusted.xvg)")
+parser.add_argument("-hi", "--histograms", default="umbrella_sampling_histograms.xvg",
+	help="Histograms of the umbrella sampling windows (default: umbrella_sampling_histograms.xvg)")
+parser.add_argument("-z", "--zero_point", action="store_true",
+	help="Only print the displacement at the minimum of the PMF (for gmx wham -zprof0)")
+args = parser.parse_args()
+
+
+def read_xvg(xvg_file):
+	# Header lines, title, axis labels, legends and data of an xvg file. The
+	# text of the data is kept too, so that values are written out unchanged.
+	header, rows = [], []
+	labels = {'title': '', 'xaxis': '', 'yaxis': ''}
+	legends = []
+	with open(xvg_file) as xvg:
+		for line in xvg:
+			if line.startswith(("@", "#")):
+				header.append(line)
+				match = re.match(r'@\s+(title|xaxis|yaxis)\s+(?:label\s+)?"(.*)"', line)
+				if match:
+					labels[match.group(1)] = match.group(2)
+				match = re.match(r'@\s*s\d+\s+legend\s+"(.*)"', line)
+				if match:
+					legends.append(match.group(1))
+			elif line.strip():
+				rows.append(line.split())
+	return header, labels, legends, rows
+
+def plot_label(label):
+	# Grace markup of the xvg labels to matplotlib mathtext: \xx is the Greek
+	# xi of the coordinate, \S...\N a superscript and \s...\N a subscript
+	label = label.replace("\\xx\\f{}", "\u03be").replace("\\xx", "\u03be")
+	label = re.sub(r"\\S(.*?)\\N", r"$^{\1}$", label)
+	label = re.sub(r"\\s(.*?)\\N", r"$_{\1}$", label)
+	return re.sub(r"\\f\{.*?\}", "", label)
+
+def awk_number(value):
+	# Numbers as awk prints them (%.6g), as in the summary of earlier versions
+	return f"{value:.6g}"
+
+def profile_figure(figname, labels, legends, data):
+	layers = [('plot', (data[:, 0], data[:, column]), {'label': legends[column - 1]
+		if column - 1 < len(legends) else None}) for column in range(1, data.shape[1])]
+	return figure_spec(figname, layers, plot_label(labels['xaxis']), plot_label(labels['yaxis']),
+		plot_label(labels['title']), legend=len(legends) > 0)
+
+
+header, labels, legends, rows = read_xvg(args.profile)
+if not rows:
+	print(f" No data was found in {args.profile}!\n")
+	sys.exit(1)
+profile = np.array(rows, dtype=float)
+minimum, maximum = np.argmin(profile[:, 1]), np.argmax(profile[:, 1])
+if args.zero_point:
+	print(rows[minimum][0])
+	sys.exit(0)
+
+# Binding free energy from the minimum and maximum of the PMF
+dG = profile[minimum, 1] - profile[maximum, 1]
+with open("summary_dG.dat", "w") as summary:
+	summary.write(f"Binding Free Energy (dG) = {awk_number(dG)} kCal/mol\n")
+print(f" Binding Free Energy (dG) = {awk_number(dG)} kCal/mol\n")
+
+# Shift the displacement axis of the minimum-adjusted PMF to start at zero
+ymin_header, ymin_labels, ymin_legends, ymin_rows = read_xvg(args.ymin_profile)
+ymin_profile = np.array(ymin_rows, dtype=float)
+shifted = ymin_profile[:, 0] - ymin_profile[0, 0]
+with open("PMF_profile_XminYminAdjusted.xvg", "w") as xvg:
+	xvg.write("".join(ymin_header))
+	xvg.write("".join(f"{awk_number(displacement)}\t{row[1]}\n" for displacement, row in zip(shifted, ymin_rows)))
+print(" Wrote out the shifted PMF profile to PMF_profile_XminYminAdjusted.xvg\n")
+
+# The four figures of the WHAM results, drawn in this one process
+hist_header, hist_labels, _, hist_rows = read_xvg(args.histograms)
+histograms = np.array(hist_rows, dtype=float)
+figures = [
+	figure_spec("umbrella_sampling_histograms.png",
+		[('plot', (histograms[:, 0], histograms[:, 1:]), {'linewidth': 0.8})],
+		plot_label(hist_labels['xaxis']), plot_label(hist_labels['yaxis']),
+		plot_label(hist_labels['title']), legend=False),
+	profile_figure("PMF_profile.png", labels, legends, profile),
+	profile_figure("PMF_profile_YminAdjusted.png", ymin_labels, ymin_legends, ymin_profile),
+	profile_figure("PMF_profile_XminYminAdjusted.png", ymin_labels, ymin_legends,
+		np.column_stack((shifted, ymin_profile[:, 1:2]))),
+	]
+for spec in figures:
+	render_figure(spec)
+	print(f" Saved {spec['figname']}")
+print("")
@@ -12,73 +12,142 @@
 __author__  = 'Abeeb A. Yekeen'
 __email__   = 'contact@abeebyekeen.com'
 __date__    = '2022.02.11'
-__version__ = '1.0'
+__version__ = '1.1'
 __status__  = 'Production'
 
 
+import argparse
+import sys
+
+import numpy as np
+
 ## lines with ## are actual comments
-def get_spaced_frame_dist(phrase='us_window_spacing'):
+## window selection modes: 'greedy' walks the frames as in version 1.0,
+## 'envelope' picks the frame closest to each next target distance, and
+## 'optimal' chooses the frame set that minimises the total squared
+## deviation of the spacings from the target
+selection_modes = ('greedy', 'envelope', 'optimal')
+
+def read_parameter(phrase, default=None):
+	value = default
 	with open("paraFile.par") as par:
 		for parameter in par.readlines():
-			if phrase in parameter:
-				paraData=[]
-				paraData_temp = str(parameter).strip().split(" ")
-				for paraTemp in paraData_temp:
-					if paraTemp != ' ' and paraTemp != '' and paraTemp != '\t' and paraTemp != '\n':
-						paraData.append(paraTemp)
-				spacing = float(paraData[2])
-	with open("distances_summary.txt") as alldata:
-		alldataLines = alldata.readlines()
-		for lineNo, line in enumerate(alldataLines):
-			## using enumerate to map each line of the file to
-			## its line_number, with line number starting from zero
-			datalist = str(line).split("\t")
-			frame = int(datalist[0])
-			dist = float(datalist[1])
-			#bkup_dst = dist 
-			if int(lineNo) == 0:
-				## register and write out the distance for frame zero
-				#regFrame = frame
-				regDist = dist
-				with open("configuratns_list.txt", "w") as config:
-					capture1 = "frame#"+"\t"+"dist"+"\t"+"d_dist"+"\n"
-					capture2 = str(frame)+"\t"+str(regDist)+"\t"+"nil"+"\n"
-					config.write(capture1)
-					config.write(capture2)
-					#print ("lineNo "+str(frame)+" "+str(dist))	
-				continue
-
-			elif int(lineNo) > 0:
-				## this condition applies to other frames after frame zero
-				diff = float("{:.3f}".format(dist - regDist))
-				## setting a range for configurations to save
-				spacing_upper = float(spacing) + float(spacing/16)
-				spacing_lower = float(spacing) - float(spacing/16)
-				#print ("lineNo "+str(frame)+" "+str(dist))			
-				if diff > spacing_upper:
-					## if the distance for the current frame jumps too higher--higher
-					## than the interval--use the distance for the frame just before it
-					diff = float("{:.3f}".format(bkup_dst - regDist))
-					with open("configuratns_list.txt", "a") as config:
-						capture = str(bkup_frame)+"\t"+str(bkup_dst)+"\t"+str(diff)+"\n"
-						config.write(capture)
-						## now use the bkup as the new regDist
-						regDist = bkup_dst
-					diff = float("{:.3f}".format(dist - regDist))
-
-				if diff <= spacing_upper and diff >= spacing_lower:
-					with open("configuratns_list.txt", "a") as config:
-						capture = str(frame)+"\t"+str(dist)+"\t"+str(diff)+"\n"
-						config.write(capture)
-						regDist = dist
-						#print ("lineNo "+str(frame)+" "+str(dist)+" "+str(diff))
-						
-				if diff < spacing_upper and int(lineNo)+1 == len(alldataLines):
-					##write the last frame and the difference with the last regDist
-					with open("configuratns_list.txt", "a") as config:
-						config.write(str(frame)+"\t"+str(dist)+"\t"+str(diff)+"\n")
-			bkup_dst = dist
-			bkup_frame = frame
-					
-get_spaced_frame_dist()
+			if phrase in parameter and not parameter.strip().startswith(('#', ';')):
+				paraData = parameter.split()
+				value = paraData[2]
+	return value
+
+def load_distance_series():
+	## frame numbers and COM distances of distances_summary.txt as arrays
+	data = np.loadtxt("distances_summary.txt", ndmin=2)
+	return data[:, 0].astype(int), data[:, 1]
+
+def rounded_diff(dist, regDist):
+	return float("{:.3f}".format(dist - regDist))
+
+def select_windows_greedy(frames, dists, spacing):
+	## the frame-by-frame walk of version 1.0, collecting (frame, dist, diff) rows
+	frames, dists = frames.tolist(), dists.tolist()
+	## setting a range for configurations to save
+	spacing_upper = float(spacing) + float(spacing/16)
+	spacing_lower = float(spacing) - float(spacing/16)
+	regDist = dists[0]
+	windows = [(frames[0], regDist, "nil")]
+	for lineNo in range(1, len(frames)):
+		frame, dist = frames[lineNo], dists[lineNo]
+		bkup_frame, bkup_dst = frames[lineNo - 1], dists[lineNo - 1]
+		diff = rounded_diff(dist, regDist)
+		if diff > spacing_upper:
+			## if the distance for the current frame jumps too higher--higher
+			## than the interval--use the distance for the frame just before it
+			windows.append((bkup_frame, bkup_dst, rounded_diff(bkup_dst, regDist)))
+			## now use the bkup as the new regDist
+			regDist = bkup_dst
+			diff = rounded_diff(dist, regDist)
+		if diff <= spacing_upper and diff >= spacing_lower:
+			windows.append((frame, dist, diff))
+			regDist = dist
+		if diff < spacing_upper and lineNo + 1 == len(frames):
+			##write the last frame and the difference with the last regDist
+			windows.append((frame, dist, diff))
+	return windows
+
+def envelopes(dists):
+	## monotone envelopes of the distance series: the running maximum and the
+	## running minimum of the later frames. The frames whose distance can lie
+	## in a range [low, high] are found by searchsorted on the two envelopes.
+	return np.maximum.accumulate(dists), np.minimum.accumulate(dists[::-1])[::-1]
+
+def select_windows_envelope(frames, dists, spacing):
+	## the frame closest to each next target distance, searched only between
+	## the frames where the envelopes cross the target (+/- half a spacing)
+	upper, lower = envelopes(dists)
+	tolerance = spacing / 2
+	chosen = [0]
+	while True:
+		target = dists[chosen[-1]] + spacing
+		first = max(np.searchsorted(upper, target - tolerance), chosen[-1] + 1)
+		if first >= len(dists) - 1:
+			break
+		last = max(np.searchsorted(lower, target + tolerance, side='right'), first + 1)
+		nearest = first + np.argmin(np.abs(dists[first:last] - target))
+		## stop where the remaining frames do not reach the target
+		if dists[nearest] - dists[chosen[-1]] < tolerance:
+			break
+		chosen.append(nearest)
+	if chosen[-1] != len(dists) - 1:
+		chosen.append(len(dists) - 1)
+	return window_rows(frames, dists, chosen)
+
+def select_windows_optimal(frames, dists, spacing):
+	## dynamic programming from the first to the last frame over windows of
+	## increasing distance. Spacings of up to twice the target are considered
+	## (the envelope gives the first frame that can be that close), or the
+	## frame just before where the series jumps further.
+	upper, lower = envelopes(dists)
+	first = np.searchsorted(upper, dists - 2 * spacing)
+	cost = np.full(len(dists), np.inf)
+	previous = np.zeros(len(dists), dtype=int)
+	cost[0] = 0.0
+	for frame in range(1, len(dists)):
+		candidates = np.arange(min(first[frame], frame - 1), frame)
+		gaps = dists[frame] - dists[candidates]
+		valid = (gaps > 0) & (gaps <= 2 * spacing) & np.isfinite(cost[candidates])
+		if not valid.any():
+			valid = candidates == frame - 1
+		total = np.where(valid, cost[candidates] + (gaps - spacing)**2, np.inf)
+		best = np.argmin(total)
+		cost[frame], previous[frame] = total[best], candidates[best]
+	chosen = [len(dists) - 1]
+	while chosen[-1] != 0:
+		chosen.append(previous[chosen[-1]])
+	return window_rows(frames, dists, chosen[::-1])
+
+def window_rows(frames, dists, selected):
+	windows = [(frames[selected[0]], dists[selected[0]], "nil")]
+	for before, after in zip(selected[:-1], selected[1:]):
+		windows.append((frames[after], dists[after], rounded_diff(dists[after], dists[before])))
+	return [(int(frame), float(dist), diff) for frame, dist, diff in windows]
+
+def get_spaced_frame_dist(mode):
+	spacing = float(read_parameter('us_window_spacing'))
+	frames, dists = load_distance_series()
+	windows = {'greedy': select_windows_greedy, 'envelope': select_windows_envelope,
+		'optimal': select_windows_optimal}[mode](frames, dists, spacing)
+	## write out all selected windows at once
+	with open("configuratns_list.txt", "w") as config:
+		config.write("frame#"+"\t"+"dist"+"\t"+"d_dist"+"\n")
+		config.write("".join(str(frame)+"\t"+str(dist)+"\t"+str(diff)+"\n" for frame, dist, diff in windows))
+	print(f" Selected {len(windows)} umbrella sampling windows ({mode} selection)")
+
+parser = argparse.ArgumentParser(description="Identify initial configurations for umbrella sampling")
+parser.add_argument("-m", "--mode", choices=selection_modes, default=None,
+	help="Window selection: greedy, envelope or optimal "
+	"(default: us_window_selection in paraFile.par, else envelope)")
+args = parser.parse_args()
 
+mode = args.mode or read_parameter('us_window_selection', 'envelope')
+if mode not in selection_modes:
+	print(f" Unknown window selection {mode}; use one of: {', '.join(selection_modes)}")
+	sys.exit(1)
+get_spaced_frame_dist(mode)
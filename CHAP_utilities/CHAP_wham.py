@@ -0,0 +1,258 @@
+######################################################################
+#  CHAP_wham.py -- A python script to calculate the PMF from the     #
+#    umbrella sampling windows by WHAM or MBAR                       #
+#  CHAP_wham.py is part of the CHAPERONg package                     #
+#  Input parameters are generated by other scripts in CHAPERONg and  #
+#    are read by this script                                         #
+#  CHAPERONg -- An automation program for GROMACS MD simulations and #
+#    trajectory analyses                                             #
+######################################################################
+
+__author__  = 'Abeeb A. Yekeen'
+__email__   = 'contact@abeebyekeen.com'
+__date__    = '2026.10.17'
+__version__ = '1.0'
+__status__  = 'Production'
+
+
+import argparse
+import sys
+import warnings
+
+import numpy as np
+from CHAP_data_loader import (boltzmann, map_in_processes, read_file_list, read_mdp_number, unit_labels,
+	write_xvg)
+
+# The options follow those of gmx wham where they have one
+parser = argparse.ArgumentParser(
+	description="Calculate the PMF of the umbrella sampling windows by WHAM or MBAR, with bootstrap errors")
+parser.add_argument("-ix", dest="pullx_list", default="pullx_files.dat",
+	help="List of the pullx.xvg files of the windows (default: pullx_files.dat)")
+parser.add_argument("-if", dest="pullf_list", default="pullf_files.dat",
+	help="List of the pullf.xvg files of the windows, which give the window centres (default: pullf_files.dat)")
+parser.add_argument("-mdp", default="md_umbrella.mdp",
+	help="Umbrella sampling parameters holding pull_coord1_k and ref_t (default: md_umbrella.mdp)")
+parser.add_argument("-k", type=float, default=None,
+	help="Umbrella force constant in kJ mol-1 nm-2 (default: pull_coord1_k of the mdp file)")
+parser.add_argument("-temp", type=float, default=None,
+	help="Temperature in K (default: ref_t of the mdp file, else 298 as gmx wham)")
+parser.add_argument("-method", choices=("wham", "mbar"), default="wham",
+	help="wham (default; binned samples, as gmx wham) or mbar (every distinct sample)")
+parser.add_argument("-o", default="PMF_profile.xvg",
+	help="PMF, zero at the first bin or at -zprof0 (default: PMF_profile.xvg)")
+parser.add_argument("-oymin", default="PMF_profile_YminAdjusted.xvg",
+	help="PMF, zero at its minimum (default: PMF_profile_YminAdjusted.xvg)")
+parser.add_argument("-hist", default="umbrella_sampling_histograms.xvg",
+	help="Histograms of the windows (default: umbrella_sampling_histograms.xvg)")
+parser.add_argument("-bsres", default="bsResult.xvg",
+	help="Bootstrap mean and standard deviation of the PMF, zero at its minimum (default: bsResult.xvg)")
+parser.add_argument("-b", type=float, default=50,
+	help="First time to analyse in ps (default: 50, as gmx wham)")
+parser.add_argument("-e", type=float, default=None,
+	help="Last time to analyse in ps (default: all)")
+parser.add_argument("-bins", type=int, default=200,
+	help="Number of bins of the profile (default: 200)")
+parser.add_argument("-min", type=float, default=None,
+	help="Minimum coordinate of the profile (default: smallest sample)")
+parser.add_argument("-max", type=float, default=None,
+	help="Maximum coordinate of the profile (default: largest sample)")
+parser.add_argument("-zprof0", type=float, default=None,
+	help="Set the PMF of -o to zero at this coordinate (default: the first bin)")
+parser.add_argument("-unit", choices=("kJ", "kCal", "kT"), default="kCal",
+	help="Energy unit of the PMF (default: kCal)")
+parser.add_argument("-tol", type=float, default=1e-6,
+	help="Convergence of the window free energies, in kT (default: 1e-6)")
+parser.add_argument("-nBootstrap", type=int, default=0,
+	help="Number of bootstraps for the errors of the PMF (default: 0, i.e. no bootstrap)")
+parser.add_argument("-bs-method", dest="bs_method", choices=("b-hist", "hist"), default="b-hist",
+	help="b-hist (default; random weights for the windows) or hist (windows drawn with replacement)")
+parser.add_argument("-seed", type=int, default=None,
+	help="Seed of the bootstrap, for reproducible errors (default: random)")
+parser.add_argument("-nw", "--workers", type=int, default=0,
+	help="Number of processes reading the windows and running the bootstraps (default: 0, i.e. all cores)")
+args = parser.parse_args()
+
+# Passes of the self-consistent equations before giving up
+max_iterations = 10000
+
+
+def read_window(files):
+	# Samples of the coordinate of a window and the centre of its restraint.
+	# The centre is not in the pullx file, but the restraint force is -k(x - centre),
+	# so every pullf sample gives it back as x + f/k.
+	pullx_file, pullf_file = files
+	pullx = np.loadtxt(pullx_file, comments=('#', '@'), ndmin=2)
+	pullf = np.loadtxt(pullf_file, comments=('#', '@'), ndmin=2)
+	centre = np.mean(np.interp(pullf[:, 0], pullx[:, 0], pullx[:, 1]) + pullf[:, 1] / force_constant)
+	in_time = pullx[:, 0] >= args.b
+	if args.e is not None:
+		in_time &= pullx[:, 0] <= args.e
+	return pullx[in_time, 1], centre
+
+def iterate(free_energies, point_counts, log_window_counts):
+	# One pass of the self-consistent equations over windows x points:
+	# the unbiased weight of every point given the free energies of the windows,
+	# then the free energies given the weights. Both are matrix-vector products
+	# with the bias factors, which are scaled per point (the scale cancels out).
+	# Also returns the (convex) MBAR objective at the free energies passed in,
+	# which the passes decrease.
+	log_window_weights = log_window_counts + free_energies
+	top = np.max(log_window_weights)
+	denominators = np.exp(log_window_weights - top) @ bias_factors
+	sampled = point_counts > 0
+	with np.errstate(divide='ignore'):
+		log_denominators = np.log(denominators) - point_shifts + top
+		log_weights = np.log(point_counts) - log_denominators
+	objective = point_counts[sampled] @ log_denominators[sampled] - np.exp(log_window_counts) @ free_energies
+	ratios = np.zeros(len(point_counts))
+	ratios[sampled] = point_counts[sampled] / denominators[sampled]
+	free_energies = -np.log(bias_factors @ ratios)
+	return free_energies - free_energies[0], log_weights, objective
+
+def solve(multiplicity, free_energies=None):
+	# Solve the equations for windows counted multiplicity times. The plain
+	# iteration converges slowly, so it is extrapolated by SQUAREM (two passes
+	# give a step direction and length); the step is shortened until it does
+	# not raise the objective, down to the plain two passes.
+	point_counts = np.bincount(pair_points, weights=multiplicity[pair_windows] * pair_counts, minlength=len(points))
+	with np.errstate(divide='ignore'):
+		log_window_counts = np.log(multiplicity * window_counts)
+	if free_energies is None:
+		free_energies = np.zeros(len(window_counts))
+	for iteration in range(max_iterations):
+		step1, _, objective = iterate(free_energies, point_counts, log_window_counts)
+		change = step1 - free_energies
+		if np.max(np.abs(change)) < args.tol:
+			break
+		step2 = iterate(step1, point_counts, log_window_counts)[0]
+		curvature = step2 - step1 - change
+		length = -np.sqrt(change @ change / (curvature @ curvature)) if curvature @ curvature > 0 else -1
+		length = min(length, -1)
+		while True:
+			extrapolated = free_energies - 2 * length * change + length**2 * curvature
+			accelerated, _, accelerated_objective = iterate(extrapolated, point_counts, log_window_counts)
+			if length == -1 or (np.all(np.isfinite(accelerated)) and accelerated_objective <= objective):
+				break
+			length = max((length - 1) / 2, -1)
+		free_energies = accelerated
+	free_energies, log_weights, _ = iterate(free_energies, point_counts, log_window_counts)
+	return free_energies, log_weights, iteration + 1
+
+def profile(log_weights):
+	# Free energy (in kT) of each bin from the unbiased weights of its points;
+	# bins without samples are left out (nan)
+	top = np.max(log_weights[np.isfinite(log_weights)])
+	density = np.bincount(point_bins, weights=np.exp(log_weights - top), minlength=args.bins)
+	with np.errstate(divide='ignore'):
+		return np.where(density > 0, -np.log(density), np.nan)
+
+def bootstrap_profile(seed):
+	rng = np.random.default_rng(seed)
+	window_count = len(window_counts)
+	if args.bs_method == "hist":
+		multiplicity = np.bincount(rng.integers(0, window_count, window_count), minlength=window_count).astype(float)
+	else:
+		multiplicity = rng.dirichlet(np.ones(window_count)) * window_count
+	_, log_weights, _ = solve(multiplicity, free_energies)
+	pmf = profile(log_weights)
+	return pmf - np.nanmin(pmf)
+
+
+pullx_files, pullf_files = read_file_list(args.pullx_list), read_file_list(args.pullf_list)
+if len(pullx_files) != len(pullf_files):
+	print(f" {args.pullx_list} lists {len(pullx_files)} files but {args.pullf_list} lists {len(pullf_files)}!\n")
+	sys.exit(1)
+force_constant = args.k or read_mdp_number(args.mdp, "pull_coord1_k", 0)
+if force_constant <= 0:
+	print(f" The umbrella force constant was not found in {args.mdp}; set it with -k.")
+	sys.exit(1)
+temperature = args.temp or read_mdp_number(args.mdp, "ref_t", 298)
+kT = boltzmann * temperature
+unit_factor = {'kJ': kT, 'kCal': kT / 4.184, 'kT': 1.0}[args.unit]
+
+windows = map_in_processes(read_window, zip(pullx_files, pullf_files), args.workers)
+samples = [window_samples for window_samples, _ in windows]
+centres = np.array([centre for _, centre in windows])
+window_counts = np.array([len(window_samples) for window_samples in samples], dtype=float)
+if np.any(window_counts == 0):
+	print(f" No samples after {args.b} ps in {', '.join(np.array(pullx_files)[window_counts == 0])}!\n")
+	sys.exit(1)
+print(f" Read {int(window_counts.sum())} samples of {len(samples)} windows"
+	f" (k = {force_constant:g} kJ mol-1 nm-2, T = {temperature:g} K)\n")
+
+all_samples = np.concatenate(samples)
+low = args.min if args.min is not None else all_samples.min()
+high = args.max if args.max is not None else all_samples.max()
+edges = np.linspace(low, high, args.bins + 1)
+bin_centres = (edges[:-1] + edges[1:]) / 2
+sample_windows = np.repeat(np.arange(len(samples)), window_counts.astype(int))
+in_range = (all_samples >= low) & (all_samples <= high)
+sample_bins = np.clip(np.searchsorted(edges, all_samples, side="right") - 1, 0, args.bins - 1)
+histograms = np.zeros((len(samples), args.bins))
+np.add.at(histograms, (sample_windows[in_range], sample_bins[in_range]), 1)
+window_counts = histograms.sum(axis=1)
+
+# The equations run over points: the bin centres for WHAM, the distinct
+# sample values for MBAR. Each window is kept as (window, point, count) pairs,
+# so that bootstrapped windows only change the weights of the pairs.
+if args.method == "wham":
+	points, point_bins = bin_centres, np.arange(args.bins)
+	pair_windows, pair_points = np.nonzero(histograms)
+	pair_counts = histograms[pair_windows, pair_points]
+else:
+	points, point_index = np.unique(all_samples[in_range], return_inverse=True)
+	point_bins = np.clip(np.searchsorted(edges, points, side="right") - 1, 0, args.bins - 1)
+	pairs, pair_counts = np.unique(np.column_stack((sample_windows[in_range], point_index.ravel())),
+		axis=0, return_counts=True)
+	pair_windows, pair_points = pairs[:, 0], pairs[:, 1]
+	pair_counts = pair_counts.astype(float)
+
+# Boltzmann factors of the bias of every window at every point, scaled so
+# that the largest one of each point is one
+bias = 0.5 * force_constant * (points[None, :] - centres[:, None])**2 / kT
+point_shifts = bias.min(axis=0)
+bias_factors = np.exp(point_shifts - bias)
+del bias
+
+free_energies, log_weights, iterations = solve(np.ones(len(samples)))
+if iterations < max_iterations:
+	print(f" {args.method.upper()} converged in {iterations} iterations over {len(samples)} windows"
+		f" x {len(points)} points\n")
+else:
+	print(f" {args.method.upper()} did not converge to {args.tol} kT in {iterations} iterations;"
+		" check the overlap of the windows in the histograms\n")
+
+# Zero points of the profiles, shifted in memory rather than by a second run
+pmf = profile(log_weights) * unit_factor
+minimum_bin = int(np.nanargmin(pmf))
+if args.zprof0 is not None:
+	zero_bin = int(np.clip(np.searchsorted(edges, args.zprof0, side="right") - 1, 0, args.bins - 1))
+else:
+	zero_bin = int(np.flatnonzero(~np.isnan(pmf))[0])
+if np.isnan(pmf[zero_bin]):
+	print(f" The PMF has no value at {args.zprof0}; it is set to zero at its minimum instead.\n")
+	zero_bin = minimum_bin
+unit_label = unit_labels[args.unit]
+creator = f"CHAP_wham.py ({args.method.upper()})"
+write_xvg(args.o, creator, "Umbrella potential", f"E ({unit_label})", (bin_centres, pmf - pmf[zero_bin]))
+write_xvg(args.oymin, creator, "Umbrella potential", f"E ({unit_label})", (bin_centres, pmf - pmf[minimum_bin]))
+write_xvg(args.hist, creator, "Umbrella histograms", "count", (bin_centres, histograms.T))
+print(f" Wrote out the PMF to {args.o} and {args.oymin}, and the histograms to {args.hist}\n")
+print(f" Minimum of the PMF at {bin_centres[minimum_bin]:.4f} nm;"
+	f" dG = {np.nanmin(pmf) - np.nanmax(pmf):.4f} {args.unit}/mol\n")
+
+if args.nBootstrap > 0:
+	seed = args.seed if args.seed is not None else np.random.SeedSequence().entropy
+	print(f" Bootstrapping the PMF {args.nBootstrap} times ({args.bs_method}, seed {seed})\n")
+	seeds = np.random.SeedSequence(seed).spawn(args.nBootstrap)
+	profiles = np.array(map_in_processes(bootstrap_profile, seeds, args.workers))
+	profiles *= unit_factor
+	# A bin left without samples by a bootstrap only counts in the others
+	with warnings.catch_warnings():
+		warnings.simplefilter('ignore', RuntimeWarning)
+		mean, std = np.nanmean(profiles, axis=0), np.nanstd(profiles, axis=0)
+		dG = np.nanmin(profiles, axis=1) - np.nanmax(profiles, axis=1)
+	write_xvg(args.bsres, creator, "Umbrella potential", f"E ({unit_label})", (bin_centres, mean, std),
+		legends=("mean of the bootstraps", "standard deviation"))
+	print(f" Wrote out the bootstrap mean and standard deviation of the PMF to {args.bsres};"
+		f" dG = {np.nanmin(pmf) - np.nanmax(pmf):.4f} +/- {np.std(dG):.4f} {args.unit}/mol\n")
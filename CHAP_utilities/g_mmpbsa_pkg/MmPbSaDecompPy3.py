@@ -39,6 +39,7 @@ import argparse
 import sys
 import os
 import math
+from MmPbSaStatPy3 import BootStrapMeans
 
 def main():
 	args = ParseOptions()
@@ -48,86 +49,71 @@ def main():
 	apolEnData,resnameC = ReadData(args.apolar)
 	resname = CheckResname(resnameA,resnameB,resnameC)
 	print('Total number of Residue: {0}\n' .format(len(resname)+1))
-	Residues = []
-	for i in range(len(resname)):
-		CheckEnData(MMEnData[i],polEnData[i],apolEnData[i])
-		r = Residue()
-		r.CalcEnergy(MMEnData[i],polEnData[i],apolEnData[i],args)
-		Residues.append(r)
-		print((' %8s %8.4f %8.4f' % (resname[i], r.TotalEn[0], r.TotalEn[1])))
+	CheckEnData(MMEnData,polEnData,apolEnData)
+	r = Residues()
+	r.CalcEnergy(MMEnData,polEnData,apolEnData,args)
+	print(''.join([' %8s %8.4f %8.4f\n' % (resname[i], r.TotalEn[i,0], r.TotalEn[i,1]) for i in range(len(resname))]), end='')
+	# All residues (or those beyond the cutoff) are formatted and written at once
+	if (args.cutoff == 999):
+		selected = np.arange(len(resname))
+	else:
+		selected = np.flatnonzero((args.cutoff <= r.TotalEn[:,0]) | ((-1 *args.cutoff) >= r.TotalEn[:,0]))
+	table = np.hstack((r.FinalMM, r.FinalPol, r.FinalAPol, r.TotalEn))
 	fout = open(args.output,'w')
-	fmap = open(args.outmap,'w')
 	fout.write('#Residues  MM Energy(+/-)dev/error  Polar Energy(+/-)dev/error APolar Energy(+/-)dev/error Total Energy(+/-)dev/error\n')
-	for i in range(len(resname)):
-		if (args.cutoff == 999):
-			fout.write("%-8s  %4.4f  %4.4f    %4.4f  %4.4f    %4.4f  %4.4f    %4.4f  %4.4f \n" %(resname[i],Residues[i].FinalMM[0],Residues[i].FinalMM[1], 
-                                      Residues[i].FinalPol[0], Residues[i].FinalPol[1], Residues[i].FinalAPol[0], Residues[i].FinalAPol[1], Residues[i].TotalEn[0],Residues[i].TotalEn[1] ))
-		elif (args.cutoff <= Residues[i].TotalEn[0]) or ( (-1 *args.cutoff) >= Residues[i].TotalEn[0]):
-			fout.write("%-8s  %4.4f  %4.4f    %4.4f  %4.4f    %4.4f  %4.4f    %4.4f  %4.4f \n" % (resname[i],Residues[i].FinalMM[0],Residues[i].FinalMM[1], 
-                                  Residues[i].FinalPol[0], Residues[i].FinalPol[1], Residues[i].FinalAPol[0], Residues[i].FinalAPol[1], Residues[i].TotalEn[0],Residues[i].TotalEn[1] ))
-			
-		fmap.write("%-8d     %4.4f \n" %((i+1), Residues[i].TotalEn[0]))
+	fout.write(''.join(["%-8s  %4.4f  %4.4f    %4.4f  %4.4f    %4.4f  %4.4f    %4.4f  %4.4f \n" % ((resname[i],) + tuple(table[i].tolist()))
+		for i in selected]))
+	fout.close()
+	fmap = open(args.outmap,'w')
+	fmap.write(''.join(["%-8d     %4.4f \n" % (i+1, energy) for i, energy in enumerate(r.TotalEn[:,0].tolist())]))
+	fmap.close()
 
 
-class Residue():
+class Residues():
+	# Energies of all residues held as (residues x frames) arrays
 	def __init__(self):
 		self.FinalMM, self.FinalPol, self.FinalAPol, self.TotalEn = [], [], [], []
-		
-	def BootStrap(self,x,step):
-		avg =[]
-		x = np.array(x)
-		n = len(x)
-		idx = np.random.randint(0,n,(step,n))
-		sample_x = x[idx]
-		avg = np.sort(np.mean(sample_x,1))
-		return np.mean(avg), np.std(avg)
 
 	def CalcEnergy(self,MM,Pol,APol,args):
-		TotalEn = np.sum([MM,Pol,APol],axis=0)
+		TotalEn = MM + Pol + APol
+		components = np.vstack((MM, Pol, APol, TotalEn))
 		if(args.bootstrap):
-			self.FinalMM = self.BootStrap(MM,args.nbstep)
-			self.FinalPol = self.BootStrap(Pol,args.nbstep)
-			if (np.mean(APol) == 0):
-				self.FinalAPol = [0.0,0.0]
-			else:
-				self.FinalAPol = self.BootStrap(APol,args.nbstep)
-			self.TotalEn = self.BootStrap(TotalEn,args.nbstep)
+			avg = BootStrapMeans(components,args.nbstep,np.random.default_rng(args.seed),memory=args.bsmem)
+			final = np.column_stack((np.mean(avg,1), np.std(avg,1)))
 		else:
-			self.FinalMM = [np.mean(MM),np.std(MM)]
-			self.FinalPol = [np.mean(Pol),np.std(Pol)]
-			if (np.mean(APol) == 0):
-				self.FinalAPol = [0.0,0.0]
-			else:
-				self.FinalAPol = [np.mean(APol),np.std(APol)]
-			self.TotalEn = [np.mean(TotalEn),np.std(TotalEn)]
+			final = np.column_stack((np.mean(components,1), np.std(components,1)))
+		self.FinalMM, self.FinalPol, self.FinalAPol, self.TotalEn = np.split(final, 4)
+		self.FinalAPol[np.mean(APol,1) == 0] = 0.0
 		self.FinalMM = np.round(self.FinalMM,4)
 		self.FinalPol = np.round(self.FinalPol,4)
 		self.FinalAPol = np.round(self.FinalAPol,4)
 		self.TotalEn = np.round(self.TotalEn,4)
 
 def CheckEnData(MM,Pol,APol):
-	if(len(Pol) != len(MM)):
+	if(Pol.shape[1] != MM.shape[1]):
 		print("Times or Frames Mismatch between files")
 		exit(1)
-	if(len(APol) != len(Pol)):
+	if(APol.shape[1] != Pol.shape[1]):
 		print("Times or Frames Mismatch between files")
 		exit(1)
-	if(len(APol) != len(MM)):
+	if(APol.shape[1] != MM.shape[1]):
 		print("Times or Frames Mismatch between files")
 		exit(1)
 
 
 def ParseOptions():
-        parser = argparse.ArgumentParser()
-        parser.add_argument("-m", "--molmech", help='Molecular Mechanics energy file',action="store", default='contrib_MM.dat', metavar='contrib_MM.dat')
-        parser.add_argument("-p", "--polar", help='Polar solvation energy file',action="store",default='contrib_pol.dat', metavar='contrib_pol.dat')
-        parser.add_argument("-a", "--apolar", help='Non-Polar solvation energy file',action="store",default='contrib_apol.dat',metavar='contrib_apol.dat')
-        parser.add_argument("-bs", "--bootstrap", help='Switch for Error by Boot Strap analysis',action="store_true")
-        parser.add_argument("-nbs", "--nbstep", help='Number of boot strap steps',action="store", type=int,default=500, metavar=500)
+	parser = argparse.ArgumentParser()
+	parser.add_argument("-m", "--molmech", help='Molecular Mechanics energy file',action="store", default='contrib_MM.dat', metavar='contrib_MM.dat')
+	parser.add_argument("-p", "--polar", help='Polar solvation energy file',action="store",default='contrib_pol.dat', metavar='contrib_pol.dat')
+	parser.add_argument("-a", "--apolar", help='Non-Polar solvation energy file',action="store",default='contrib_apol.dat',metavar='contrib_apol.dat')
+	parser.add_argument("-bs", "--bootstrap", help='Switch for Error by Boot Strap analysis',action="store_true")
+	parser.add_argument("-nbs", "--nbstep", help='Number of boot strap steps',action="store", type=int,default=500, metavar=500)
 	parser.add_argument("-ct", "--cutoff", help='Absolute Cutoff: energy output above and below this value',action="store",type=float,default=999, metavar=999)
-        parser.add_argument("-o", "--output", help='Final Decomposed Energy File',action="store",default='final_contrib_energy.dat', metavar='final_contrib_energy.dat')
+	parser.add_argument("-o", "--output", help='Final Decomposed Energy File',action="store",default='final_contrib_energy.dat', metavar='final_contrib_energy.dat')
 	parser.add_argument("-om", "--outmap", help='energy2bfac input file: to map energy on structure for visualization',action="store",default='energyMapIn.dat', metavar='energyMapIn.dat')
-        return parser.parse_args()
+	parser.add_argument("-seed", "--seed", help='Seed of the boot strap resamples, for reproducible errors',action="store", type=int, default=None, metavar='seed')
+	parser.add_argument("-bsmem", "--bsmem", help='Memory (MB) for the boot strap resamples drawn at a time',action="store", type=float, default=64, metavar=64)
+	return parser.parse_args()
 
 def CheckResname(resA,resB,resC):
 	if(len(resA) != len(resB)):
@@ -166,24 +152,17 @@ def CheckInput(args):
 
 
 def ReadData(FileName):
-        infile = open(FileName,'r')
-        x, data,resname = [],[],[]
+	# Residue names from the last "#" line, then the energies of all residues
+	# parsed at once into a (residues x frames) float64 matrix
+	resname = []
+	infile = open(FileName,'r')
 	for line in infile:
-                line = line.rstrip('\n')
-                if not line.strip():
-                        continue
-                if(re.match('#|@',line)==None):
-                        temp = line.split()
-                        data.append(np.array(temp))
 		if(re.match('#',line)):
 			resname = line.split()
+	infile.close()
 	n = len(resname[1:])
-        for j in range(1,n):
-                x_temp =[]
-                for i in range(len(data)):
-                        x_temp.append(float(data[i][j]))
-                x.append(x_temp)
-        return x, resname[2:]
+	x = np.loadtxt(FileName, comments=('#','@'), usecols=range(1,n), ndmin=2).T
+	return x, resname[2:]
 
 if __name__=="__main__":
-        main()
+	main()
@@ -80,66 +80,47 @@ class Complex():
 		apolEn = ReadData(self.APolFile,n=10)
 		CheckEnData(mmEn,polEn,apolEn)
 	
-		time, MM, Vdw, Elec, Pol, Apol, Sas, Sav, Wca = [], [], [], [], [], [], [], [], []	
-		for i in range(len(mmEn[0])):
-			#Vacuum MM
-			Energy = mmEn[5][i] + mmEn[6][i] - (mmEn[1][i] + mmEn[2][i] + mmEn[3][i] + mmEn[4][i])
-			MM.append(Energy)
-			Energy = mmEn[5][i] - (mmEn[1][i] + mmEn[3][i])
-			Vdw.append(Energy)
-			Energy = mmEn[6][i] - (mmEn[2][i] + mmEn[4][i])
-			Elec.append(Energy)
-			# Polar
-			Energy = polEn[3][i] - (polEn[1][i] + polEn[2][i])
-			Pol.append(Energy)
-			#Non-polar
-			Energy = apolEn[3][i] + apolEn[6][i] + apolEn[9][i] - (apolEn[1][i] + apolEn[2][i] + apolEn[4][i] + apolEn[5][i] + apolEn[7][i] + apolEn[8][i])
-			Apol.append(Energy)
-			Energy = apolEn[3][i] - (apolEn[1][i] + apolEn[2][i])
-			Sas.append(Energy)
-			Energy = apolEn[6][i] - (apolEn[4][i] + apolEn[5][i])
-			Sav.append(Energy)
-			Energy = apolEn[9][i] - (apolEn[7][i] + apolEn[8][i])
-			Wca.append(Energy)
-			#Final Energy
-			time.append(mmEn[0][i])
-			Energy = MM[i] + Pol[i] + Apol[i]
-			self.TotalEn.append(Energy)
+		# Component energies of all frames at once, as expressions of the columns
+		time = mmEn[0]
+		#Vacuum MM
+		MM = mmEn[5] + mmEn[6] - (mmEn[1] + mmEn[2] + mmEn[3] + mmEn[4])
+		Vdw = mmEn[5] - (mmEn[1] + mmEn[3])
+		Elec = mmEn[6] - (mmEn[2] + mmEn[4])
+		# Polar
+		Pol = polEn[3] - (polEn[1] + polEn[2])
+		#Non-polar
+		Apol = apolEn[3] + apolEn[6] + apolEn[9] - (apolEn[1] + apolEn[2] + apolEn[4] + apolEn[5] + apolEn[7] + apolEn[8])
+		Sas = apolEn[3] - (apolEn[1] + apolEn[2])
+		Sav = apolEn[6] - (apolEn[4] + apolEn[5])
+		Wca = apolEn[9] - (apolEn[7] + apolEn[8])
+		#Final Energy
+		self.TotalEn = MM + Pol + Apol
 
-		# Writing frame wise component energy to file
+		# Writing frame wise component energy to file, all frames in one write
 		frame_wise.write('\n#Complex %d\n' % ( (idx+1)))
-		for i in range(len(time)):
-			frame_wise.write('%15.3lf %15.3lf %15.3lf %15.3lf %15.3lf' % (time[i], mmEn[1][i], mmEn[2][i], polEn[1][i], (apolEn[1][i] + apolEn[4][i] + apolEn[7][i])))
-			frame_wise.write('%15.3lf %15.3lf %15.3lf %15.3lf'         %          (mmEn[3][i], mmEn[4][i], polEn[2][i], (apolEn[2][i] + apolEn[5][i] + apolEn[8][i])))
-			frame_wise.write('%15.3lf %15.3lf %15.3lf %15.3lf'         %          (mmEn[5][i], mmEn[6][i], polEn[3][i], (apolEn[3][i] + apolEn[6][i] + apolEn[9][i])))
-			frame_wise.write('%15.3lf %15.3lf %15.3lf %15.3lf\n'         % (MM[i], Pol[i], Apol[i], self.TotalEn[i]))
+		columns = np.column_stack((time, mmEn[1], mmEn[2], polEn[1], (apolEn[1] + apolEn[4] + apolEn[7]),
+			mmEn[3], mmEn[4], polEn[2], (apolEn[2] + apolEn[5] + apolEn[8]),
+			mmEn[5], mmEn[6], polEn[3], (apolEn[3] + apolEn[6] + apolEn[9]),
+			MM, Pol, Apol, self.TotalEn))
+		row_format = ('%15.3lf %15.3lf %15.3lf %15.3lf %15.3lf' + '%15.3lf %15.3lf %15.3lf %15.3lf' * 2
+			+ '%15.3lf %15.3lf %15.3lf %15.3lf\n')
+		frame_wise.write((row_format * len(time)) % tuple(columns.ravel().tolist()))
 
 		#Bootstrap analysis energy components
 		if(args.bootstrap):
 			bsteps = args.nbstep
-			avg_energy, error = BootStrap(Vdw,bsteps)
-			self.Vdw.append(avg_energy)
-			self.Vdw.append(error)
-			avg_energy, error = BootStrap(Elec,bsteps)
-			self.Elec.append(avg_energy)
-			self.Elec.append(error)
-			avg_energy, error = BootStrap(Pol,bsteps)
-			self.Pol.append(avg_energy)
-			self.Pol.append(error)	
-			avg_energy, error = BootStrap(Sas,bsteps)
-			self.Sas.append(avg_energy)
-			self.Sas.append(error)
-			avg_energy, error = BootStrap(Sav,bsteps)
-			self.Sav.append(avg_energy)
-			self.Sav.append(error)
-			avg_energy, error = BootStrap(Wca,bsteps)
-			self.Wca.append(avg_energy)
-			self.Wca.append(error)
+			# All components (and the total) are averaged over the same resamples
+			components = np.vstack((Vdw, Elec, Pol, Sas, Sav, Wca, self.TotalEn))
+			avg = BootStrapMeans(components, bsteps, args.rng, args.multinomial, args.bsmem)
+			for energy, x, avg_x in zip((self.Vdw, self.Elec, self.Pol, self.Sas, self.Sav, self.Wca), components, avg):
+				avg_energy, error = BootStrap(x, avg_x)
+				energy.append(avg_energy)
+				energy.append(error)
 			#Bootstrap => Final Average Energy
-			self.AvgEnBS, AvgEn, EnErr, CI = ComplexBootStrap(self.TotalEn,bsteps)
-                        self.FinalAvgEnergy = AvgEn
-                        self.StdErr = EnErr
-                        self.CI = CI
+			self.AvgEnBS, AvgEn, EnErr, CI = ComplexBootStrap(avg[-1],bsteps)
+			self.FinalAvgEnergy = AvgEn
+			self.StdErr = EnErr
+			self.CI = CI
 		#If not bootstrap then average and standard deviation
 		else:
 			self.Vdw.append(np.mean(Vdw))
@@ -159,7 +140,7 @@ class Complex():
 				
 
 def Summary_Output_File(AllComplex,args):
-        fs = open(args.outsum,'w')
+	fs = open(args.outsum,'w')
 
 	if args.multiple:
 		fm = open(args.outmeta,'w')
@@ -224,48 +205,53 @@ def ParseOptions():
 	parser.add_argument("-of", "--outfr", help='Energy File: All energy components frame wise',action="store",default='full_energy.dat', metavar='full_energy.dat')
 	parser.add_argument("-os", "--outsum", help='Final Energy File: Full Summary of energy components',action="store",default='summary_energy.dat', metavar='summary_energy.dat')
 	parser.add_argument("-om", "--outmeta", help='Final Energy File for Multiple Complexes: Complex wise final binding nergy',action="store",default='meta_energy.dat',metavar='meta_energy.dat')
+	parser.add_argument("-bsm", "--multinomial", help='If given, draw the boot strap resamples as multinomial frame counts',action="store_true")
+	parser.add_argument("-seed", "--seed", help='Seed of the boot strap resamples, for reproducible errors',action="store", type=int, default=None, metavar='seed')
+	parser.add_argument("-bsmem", "--bsmem", help='Memory (MB) for the boot strap resamples drawn at a time',action="store", type=float, default=64, metavar=64)
 	args = parser.parse_args()
+	args.rng = np.random.default_rng(args.seed)
 	return args
 
 def ReadData(FileName,n=2):
-	infile = open(FileName,'r')
-	x, data = [],[]
-	for line in infile:
-		line = line.rstrip('\n')
-		if not line.strip():
-			continue
-		if(re.match('#|@',line)==None):
-			temp = line.split()
-			data.append(np.array(temp))
-	for j in range(0,n):
-		x_temp =[]
-		for i in range(len(data)):
-			x_temp.append(float(data[i][j]))
-		x.append(x_temp)
-	return x
+	# Columnar parse of the first n columns into a float64 matrix (one row per column)
+	return np.loadtxt(FileName, comments=('#','@'), usecols=range(n), ndmin=2).T
+
+def BootStrapMeans(x, step=1000, rng=None, multinomial=False, memory=64):
+	# Bootstrap means of every row of x (components x frames) from one shared set
+	# of resamples. Each resample is a vector of frame counts, either drawn as
+	# indices and counted or drawn directly from the multinomial distribution, so
+	# the means of all components are one matrix product. Resamples are drawn in
+	# chunks that keep within memory (MB) the (resamples x frames) matrices alive
+	# at a time, at most three: the counts of the last chunk, the drawn indices and
+	# their counts, or the counts and their floating-point copy for the product.
+	x = np.asarray(x, dtype=float)
+	rng = rng if rng is not None else np.random.default_rng()
+	n = x.shape[1]
+	chunk = max(1, int(memory * 2**20) // (3 * 8 * n))
+	avg = np.empty((len(x), step))
+	for start in range(0, step, chunk):
+		rows = min(chunk, step - start)
+		if multinomial:
+			counts = rng.multinomial(n, np.full(n, 1.0 / n), size=rows)
+		else:
+			idx = rng.integers(0, n, (rows, n))
+			idx += n * np.arange(rows)[:, None]
+			counts = np.bincount(idx.ravel(), minlength=rows * n).reshape(rows, n)
+			del idx
+		avg[:, start:start + rows] = x @ counts.T / n
+	return avg
 
-def ComplexBootStrap(x,step=1000):
-	avg =[]
-	x = np.array(x)
-	n = len(x)
-	idx = np.random.randint(0,n,(step,n))
-	sample_x = x[idx]
-	avg = np.sort(np.mean(sample_x,1))
+def ComplexBootStrap(avg,step=1000):
+	avg = np.sort(avg)
 	CI_min = avg[int(0.005*step)]
 	CI_max = avg[int(0.995*step)]
 	#print('Energy = %13.3f; Confidance Interval = (-%-5.3f / +%-5.3f)\n' % (np.mean(avg), (np.mean(avg)-CI_min), (CI_max-np.mean(avg))))
 	return avg, np.mean(avg), np.std(avg), [(np.mean(avg)-CI_min), (CI_max-np.mean(avg))]
 
-def BootStrap (x,step=1000):
+def BootStrap (x,avg):
 	if(np.mean(x)) == 0:
 		return 0.000, 0.000
 	else:
-		avg =[]
-		x = np.array(x)
-		n = len(x)
-		idx = np.random.randint(0,n,(step,n))
-		sample_x = x[idx]
-		avg = np.sort(np.mean(sample_x,1))
 		return np.mean(avg),np.std(avg)
 
 def find_nearest_index(array,value):